@@ -0,0 +1,191 @@
+"""
+Sound effects played through a pool of voices
+
+Mixer channels are reserved for categories of sounds, like the player or
+enemies, so one busy category cannot take every channel.  Each sound can
+have a priority and a limit of how many copies may play at once.  When a
+category has no free channel, a voice of the same or lower priority is
+stolen: the lowest priority first, then the quietest, then the oldest.
+If there is nothing to steal, the sound is not played.
+
+Sounds with a position are quieter the farther they are from the
+listener, which is usually the center of the camera.  Sounds too far
+away to hear do not use a voice.
+
+    from castlebats.audio import voices
+    voices.play('sword', position=sprite.position)
+
+Categories and sound rules are read from the config the first time a
+sound is played; the mixer must be initialized by then.
+"""
+import logging
+from time import perf_counter
+
+import pygame
+
+from castlebats import config
+from castlebats import resources
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['VoicePool', 'voices']
+
+
+class Voice:
+    """ A sound playing on a channel
+    """
+    __slots__ = ('name', 'priority', 'volume', 'started')
+
+    def __init__(self, name, priority, volume, started):
+        self.name = name
+        self.priority = priority
+        self.volume = volume
+        self.started = started
+
+
+class VoicePool:
+    """ Plays sounds on reserved channels with priorities and limits
+    """
+    default_rule = None, 0, 0     # category, priority, max voices (0 = any)
+
+    def __init__(self):
+        self.categories = dict()   # name: list of pygame.mixer.Channel
+        self.rules = dict()        # sound name: (category, priority, limit)
+        self.voices = dict()       # pygame.mixer.Channel: Voice
+        self.default_category = None
+        self.listener = None       # position sounds are heard from
+        self.near = 0              # sounds are not attenuated within
+        self.far = 0               # sounds are silent beyond
+        self.played = 0
+        self.stolen = 0
+        self.dropped = 0
+        self._configured = False
+
+    def configure(self):
+        """ Reserve channels and read sound rules from the config
+        """
+        sizes = [(name, int(count))
+                 for name, count in config.items('sound-categories')]
+        total = sum(count for name, count in sizes)
+        if pygame.mixer.get_num_channels() < total:
+            pygame.mixer.set_num_channels(total)
+
+        # reserved channels are not used by Sound.play
+        pygame.mixer.set_reserved(total)
+
+        index = 0
+        self.categories = dict()
+        for name, count in sizes:
+            channels = [pygame.mixer.Channel(i)
+                        for i in range(index, index + count)]
+            self.categories[name] = channels
+            index += count
+        self.default_category = sizes[0][0]
+
+        self.rules = dict()
+        for name, value in config.items('sound-rules'):
+            category, priority, limit = [i.strip() for i in value.split(',')]
+            if category not in self.categories:
+                logger.warning('sound %s has unknown category %s',
+                               name, category)
+                category = self.default_category
+            self.rules[name] = category, int(priority), int(limit)
+
+        self.near = config.getfloat('sound', 'attenuation-near')
+        self.far = config.getfloat('sound', 'attenuation-far')
+        self._configured = True
+
+    def attenuate(self, position):
+        """ Return the volume of a sound at a position, 0-1
+        """
+        if position is None or self.listener is None:
+            return 1.0
+
+        dx = position[0] - self.listener[0]
+        dy = position[1] - self.listener[1]
+        distance = (dx * dx + dy * dy) ** .5
+        if distance <= self.near:
+            return 1.0
+        if distance >= self.far:
+            return 0.0
+        return 1.0 - (distance - self.near) / (self.far - self.near)
+
+    def find_channel(self, name, category, priority, limit):
+        """ Return a channel to play a sound on, or None
+        """
+        voices = self.voices
+        channels = self.categories[category]
+
+        # forget voices that have finished
+        for channel in channels:
+            if channel in voices and not channel.get_busy():
+                del voices[channel]
+
+        # too many of this sound; replace the oldest copy
+        if limit:
+            copies = [c for c in channels
+                      if c in voices and voices[c].name == name]
+            if len(copies) >= limit:
+                return min(copies, key=lambda c: voices[c].started)
+
+        for channel in channels:
+            if channel not in voices:
+                return channel
+
+        candidates = [c for c in channels if voices[c].priority <= priority]
+        if candidates:
+            self.stolen += 1
+            return min(candidates, key=lambda c: (voices[c].priority,
+                                                  voices[c].volume,
+                                                  voices[c].started))
+
+    def play(self, name, position=None, category=None, priority=None):
+        """ Play a sound effect
+
+        :param name: name of the sound in resources.sounds
+        :param position: where the sound is, in the same space as listener
+        :param category: use instead of the category in the rules
+        :param priority: use instead of the priority in the rules
+        :return: the channel the sound is playing on, or None
+        """
+        if not self._configured:
+            self.configure()
+
+        volume = self.attenuate(position)
+        if volume <= 0:
+            return None
+
+        rule_category, rule_priority, limit = self.rules.get(name, self.default_rule)
+        if category is None:
+            category = rule_category or self.default_category
+        if priority is None:
+            priority = rule_priority
+
+        channel = self.find_channel(name, category, priority, limit)
+        if channel is None:
+            self.dropped += 1
+            logger.debug('no voice for %s', name)
+            return None
+
+        channel.play(resources.sounds[name])
+        channel.set_volume(volume)
+        self.voices[channel] = Voice(name, priority, volume, perf_counter())
+        self.played += 1
+        return channel
+
+    def stop(self, name=None):
+        """ Stop all sounds, or all copies of one sound
+        """
+        for channel, voice in list(self.voices.items()):
+            if name is None or voice.name == name:
+                channel.stop()
+                del self.voices[channel]
+
+    def stats(self):
+        return {'voices': sum(1 for c in self.voices if c.get_busy()),
+                'played': self.played,
+                'stolen': self.stolen,
+                'dropped': self.dropped}
+
+
+voices = VoicePool()
@@ -0,0 +1,427 @@
+"""
+Headless benchmarks
+
+These run the game without a window or sound card, using the SDL dummy
+drivers, so they can be used on build machines.  Times are reported in
+milliseconds.
+
+    python run_benchmark.py render --frames 2000
+    python run_benchmark.py replay session.rec
+    python run_benchmark.py sim --zombies 50 --input random --json -
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import time
+
+import pygame
+import pymunk
+from pymunk.vec2d import Vec2d
+
+from castlebats import config
+from castlebats import resources
+from castlebats.buttons import *
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['bench_render', 'bench_replay', 'bench_sim', 'ScriptedInput',
+           'RandomInput', 'summarize', 'main']
+
+
+def init_headless(size):
+    """ Start pygame and load the resources, without a window
+
+    SDL_VIDEODRIVER and SDL_AUDIODRIVER should be set to 'dummy' before
+    pygame is imported.
+    """
+    pygame.mixer.init(frequency=config.getint('sound', 'frequency'))
+    screen = pygame.display.set_mode(size)
+    pygame.init()
+    pygame.font.init()
+
+    for thing in resources.load():
+        pass
+
+    return screen
+
+
+def summarize(samples):
+    """ Return the mean and percentiles of a list of times
+
+    :param samples: list of times in seconds
+    :return: dict of times in milliseconds
+    """
+    if not samples:
+        return dict()
+
+    ordered = sorted(samples)
+    last = len(ordered) - 1
+
+    def percentile(p):
+        return ordered[int(round(p / 100. * last))] * 1000
+
+    return {'mean': sum(ordered) / len(ordered) * 1000,
+            'p50': percentile(50),
+            'p95': percentile(95),
+            'p99': percentile(99),
+            'max': ordered[-1] * 1000}
+
+
+def camera_path(map_rect, view_size, frames, speed):
+    """ Sweep the camera across the map and back again
+
+    The camera also bobs up and down, so vertical scrolling is tested.
+
+    :return: generator of camera centers in map pixel coordinates
+    """
+    half_width = view_size[0] // 2
+    left = map_rect.left + half_width
+    right = max(left + 1, map_rect.right - half_width)
+    span = right - left
+    y = map_rect.centery
+    amplitude = max(0, (map_rect.height - view_size[1]) // 2)
+
+    for frame in range(frames):
+        distance = (frame * speed) % (span * 2)
+        if distance > span:
+            distance = span * 2 - distance
+        bob = amplitude * math.sin(frame / 60.)
+        yield Vec2d(left + distance, y + bob)
+
+
+def bench_render(frames, size, speed=4, overlay=False):
+    """ Draw the level along a camera path
+
+    Stages:
+        sprites  => ViewPort sprite update and culling
+        map      => parallax and map layers, with sprites interlaced
+        lighting => lightmap and dynamic lights
+        overlay  => physics overlay
+        upscale  => scaling to the display, as in Game.run
+    """
+    if overlay:
+        config.set('display', 'draw-physics-overlay', '1')
+
+    screen = init_headless(size)
+
+    from castlebats.game import Game
+    from castlebats.level_state import Level
+    from castlebats.upscale import Upscaler
+
+    level = Level()
+    upscaler = Upscaler(screen, 2,
+                        config.get('display', 'upscale-filter'),
+                        config.getboolean('display', 'upscale-smooth'))
+    surface = upscaler.source
+    level_rect = Game.get_level_rect(surface)
+
+    # draw once so the viewport is sized, then take the camera from the hero
+    level.draw(surface, level_rect)
+    vp = level.vp
+    vp.follow(None)
+
+    stages = {'sprites': list(), 'map': list(), 'lighting': list(),
+              'overlay': list(), 'upscale': list()}
+    frame_times = list()
+    timings = vp.timings
+    map_rect = vp.map_layer.cache.map_rect
+
+    start = time.perf_counter()
+    for camera in camera_path(map_rect, level_rect.size, frames, speed):
+        frame_start = time.perf_counter()
+        vp.camera_vector = camera
+        level.draw(surface, level_rect)
+        stages['upscale'].append(upscaler.scale())
+        frame_times.append(time.perf_counter() - frame_start)
+
+        for name in ('sprites', 'map', 'lighting', 'overlay'):
+            stages[name].append(timings[name])
+
+    elapsed = time.perf_counter() - start
+
+    return {'benchmark': 'render',
+            'frames': frames,
+            'size': list(size),
+            'fps': frames / elapsed,
+            'frame': summarize(frame_times),
+            'stages': {k: summarize(v) for k, v in stages.items()},
+            'tile_cache': level.vpgroup.tile_cache.stats()}
+
+
+def bench_replay(path, size, draw=False):
+    """ Step the level through a recording of player input
+
+    The simulation is stepped on the timestep of the recording, as fast
+    as it can go.  If draw is true, the level is also drawn each frame.
+    """
+    from castlebats import replay
+    from castlebats.game import Game
+    from castlebats.level_state import Level
+
+    recording = replay.Replay.load(path)
+    screen = init_headless(size)
+    level = Level()
+    level_rect = Game.get_level_rect(screen)
+
+    frame_times = list()
+    perf_counter = time.perf_counter
+    last = [perf_counter()]
+
+    def frame_hook():
+        if draw:
+            level.draw(screen, level_rect)
+        now = perf_counter()
+        frame_times.append(now - last[0])
+        last[0] = now
+
+    start = perf_counter()
+    frames = replay.play(level, recording, frame_hook)
+    elapsed = perf_counter() - start
+
+    return {'benchmark': 'replay',
+            'recording': path,
+            'frames': frames,
+            'timestep': recording.timestep,
+            'simulated': frames * recording.timestep,
+            'fps': frames / elapsed,
+            'frame': summarize(frame_times)}
+
+
+class ScriptedInput:
+    """ Input that plays the same script of buttons over and over
+
+    Iterating gives the commands of each frame, like replay.Replay.
+
+    :param frames: number of frames
+    :param timestep: seconds per frame
+    """
+    # (frames, buttons held)
+    script = ((60, ()),
+              (120, (P1_RIGHT, )),
+              (10, (P1_RIGHT, P1_ACTION2)),
+              (50, (P1_RIGHT, )),
+              (20, (P1_ACTION1, )),
+              (120, (P1_LEFT, )),
+              (10, (P1_ACTION2, )),
+              (30, (P1_DOWN, )),
+              (20, ()))
+
+    def __init__(self, frames, timestep):
+        self.frames = frames
+        self.timestep = timestep
+
+    def __len__(self):
+        return self.frames
+
+    def held(self):
+        """ Return a generator of the buttons held each frame
+        """
+        while True:
+            for length, buttons in self.script:
+                for i in range(length):
+                    yield set(buttons)
+
+    def __iter__(self):
+        cls = self.__class__
+        last = set()
+        held = self.held()
+        for frame in range(self.frames):
+            buttons = next(held)
+            commands = [(cls, b, BUTTONUP) for b in sorted(last - buttons)]
+            for b in sorted(buttons):
+                state = BUTTONHELD if b in last else BUTTONDOWN
+                commands.append((cls, b, state))
+            last = buttons
+            yield commands
+
+
+class RandomInput(ScriptedInput):
+    """ Input that mashes buttons at random, the same way for each seed
+    """
+    buttons = (P1_UP, P1_DOWN, P1_LEFT, P1_RIGHT, P1_ACTION1, P1_ACTION2)
+
+    def __init__(self, frames, timestep, seed=0):
+        super().__init__(frames, timestep)
+        self.seed = seed
+
+    def held(self):
+        rng = random.Random(self.seed)
+        buttons = set()
+        while True:
+            # hold a few buttons for a while, like a player would
+            for i in range(rng.randint(5, 60)):
+                yield buttons
+            buttons = set(rng.sample(self.buttons, rng.randint(0, 2)))
+
+
+def spawn_hanging(level, position, size=(16, 32)):
+    """ Add a box hanging from a point to the level, like in the maps
+
+    :param position: physics coordinates
+    """
+    name = 'hanging_bench_{}'.format(len(level.shapes))
+    w, h = size[0] / 2., size[1] / 2.
+    description = {'geometry': ('poly', [(-w, -h), (-w, h), (w, h), (w, -h)]),
+                   'static': False,
+                   'position': position,
+                   'angle': 0.0,
+                   'mass': 1,
+                   'moment': pymunk.moment_for_box(1, size[0], size[1]),
+                   'friction': 1,
+                   'elasticity': 0,
+                   'collision_type': 0,
+                   'layers': 3,
+                   'group': 0,
+                   'sensor': False}
+    level.load_shapes({name: description})
+
+
+def bench_sim(frames, zombies=20, hanging=20, input_mode='scripted', seed=0,
+              tiers=True):
+    """ Step the level with many actors, without drawing
+
+    Zombies and hanging boxes are spread out in a row from where the hero
+    starts.  The hero is driven by a script or by random buttons.
+
+    Stages, from Level.simulate:
+        input     => commands given to the hero
+        streaming => loading and unloading chunks
+        step      => space.step
+        models    => model physics hooks
+        queues    => adds and removes kept while models were updated
+        snapshots => rewind snapshots
+
+    Hooks of models far from the camera are called less often, in the
+    models stage.  Pass tiers=False to call every hook every frame, to
+    compare.
+    """
+    from castlebats import replay
+    from castlebats.level_state import Level
+
+    config.set('ai', 'enabled', '1' if tiers else '0')
+
+    init_headless((config.getint('display', 'width'),
+                   config.getint('display', 'height')))
+
+    level = Level()
+    timestep = level.timestep
+
+    rng = random.Random(seed)
+    x, y = level.get_hero_coords()
+    for i in range(zombies):
+        level.spawn('zombie', (x + 64 + i * 32, y + rng.randint(0, 32)))
+    for i in range(hanging):
+        spawn_hanging(level, (x + 48 + i * 40, y + 96))
+
+    if input_mode == 'random':
+        source = RandomInput(frames, timestep, seed)
+    else:
+        source = ScriptedInput(frames, timestep)
+
+    names = sorted(level.timings)
+    stages = {name: list() for name in names}
+    frame_times = list()
+    timings = level.timings
+    perf_counter = time.perf_counter
+    last = [perf_counter()]
+
+    def frame_hook():
+        now = perf_counter()
+        frame_times.append(now - last[0])
+        last[0] = now
+        for name in names:
+            stages[name].append(timings[name])
+
+    start = perf_counter()
+    frames = replay.play(level, source, frame_hook)
+    elapsed = perf_counter() - start
+
+    return {'benchmark': 'sim',
+            'frames': frames,
+            'timestep': timestep,
+            'zombies': zombies,
+            'hanging': hanging,
+            'input': input_mode,
+            'seed': seed,
+            'bodies': len(level.space.bodies),
+            'models': level.models.stats(),
+            'grid': level.grid.stats(),
+            'tiers': level.tiers.stats() if level.tiers else None,
+            'fps': frames / elapsed,
+            'frame': summarize(frame_times),
+            'stages': {k: summarize(v) for k, v in stages.items()}}
+
+
+def print_results(results):
+    print('{benchmark}: {frames} frames, {fps:.1f} fps'.format(**results))
+    rows = [('frame', results['frame'])]
+    rows.extend(sorted(results.get('stages', dict()).items()))
+    print('{:<12} {:>8} {:>8} {:>8} {:>8} {:>8}'.format(
+        'ms', 'mean', 'p50', 'p95', 'p99', 'max'))
+    for name, s in rows:
+        if s:
+            print('{:<12} {mean:8.3f} {p50:8.3f} {p95:8.3f} {p99:8.3f} '
+                  '{max:8.3f}'.format(name, **s))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='castlebats benchmarks')
+    parser.add_argument('--json', metavar='FILE',
+                        help='also write results as json.  "-" for stdout')
+    commands = parser.add_subparsers(dest='command')
+
+    render = commands.add_parser('render', help='map and sprite drawing')
+    render.add_argument('--frames', type=int, default=1000)
+    render.add_argument('--width', type=int,
+                        default=config.getint('display', 'width'))
+    render.add_argument('--height', type=int,
+                        default=config.getint('display', 'height'))
+    render.add_argument('--speed', type=float, default=4,
+                        help='camera speed in pixels per frame')
+    render.add_argument('--overlay', action='store_true',
+                        help='draw the physics overlay')
+
+    play = commands.add_parser('replay', help='simulate recorded input')
+    play.add_argument('recording', help='file recorded with --record')
+    play.add_argument('--draw', action='store_true',
+                      help='draw the level each frame')
+
+    sim = commands.add_parser('sim', help='simulate many actors')
+    sim.add_argument('--frames', type=int, default=2000)
+    sim.add_argument('--zombies', type=int, default=20)
+    sim.add_argument('--hanging', type=int, default=20,
+                     help='number of hanging boxes')
+    sim.add_argument('--input', choices=('scripted', 'random'),
+                     default='scripted')
+    sim.add_argument('--seed', type=int, default=0,
+                     help='seed for random input and placement')
+    sim.add_argument('--no-tiers', action='store_true',
+                     help='call the hook of every model every frame')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'render':
+        results = bench_render(args.frames, (args.width, args.height),
+                               args.speed, args.overlay)
+    elif args.command == 'replay':
+        size = (config.getint('display', 'width'),
+                config.getint('display', 'height'))
+        results = bench_replay(args.recording, size, args.draw)
+    elif args.command == 'sim':
+        results = bench_sim(args.frames, args.zombies, args.hanging,
+                            args.input, args.seed, not args.no_tiers)
+    else:
+        parser.print_help()
+        return 1
+
+    if args.json == '-':
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_results(results)
+        if args.json:
+            with open(args.json, 'w') as fp:
+                json.dump(results, fp, indent=2, sort_keys=True)
+
+    return 0
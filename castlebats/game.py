@@ -1,9 +1,13 @@
 import logging
 
 import pygame
+from pygame.constants import VIDEORESIZE
+from castlebats import config
+from castlebats import resources
 from castlebats import scheduler
 from castlebats import state_manager
-from . import ui
+from .hud import build_hud
+from .upscale import Upscaler
 
 logger = logging.getLogger(__name__)
 
@@ -16,26 +20,65 @@ class Game:
         self.magic = 0
         self.time = 0
         self.item = None
+        self.max_health = 100
+        self.max_magic = 100
+        self.hud = None
+        self.running = False
+        self.on_first_frame = None   # called once, after the first flip
+        self.upscaler = None
+        self.level_rect = None
+        self._resize_to = None
+
+    @staticmethod
+    def get_level_rect(surface):
+        level_rect = surface.get_rect()
+        level_rect.inflate_ip(0, -level_rect.height * .20)
+        level_rect.bottom = surface.get_rect().bottom
+        return level_rect
+
+    @classmethod
+    def get_hud_rect(cls, surface):
+        hud_rect = surface.get_rect()
+        hud_rect.height = cls.get_level_rect(surface).top
+        return hud_rect
+
+    def on_resize(self, size):
+        """ Resize the display after the window has stopped changing size
+
+        Dragging the window edge sends many events, and resizing the
+        buffers for each would cause the game to stutter.
+        """
+        self._resize_to = size
+        scheduler.unschedule(self.apply_resize)
+        scheduler.schedule(self.apply_resize,
+                           config.getfloat('display', 'resize-delay'))
+
+    def apply_resize(self, dt):
+        logger.info('resizing display to %s', self._resize_to)
+        screen = pygame.display.set_mode(self._resize_to, pygame.RESIZABLE)
+        self.upscaler.set_dest(screen)
+        self.level_rect = self.get_level_rect(self.upscaler.source)
+        self.hud = build_hud(self, self.get_hud_rect(self.upscaler.source))
 
     def run(self):
         screen = pygame.display.get_surface()
-        screen_size = screen.get_size()
-        surface = pygame.Surface([int(i / 2) for i in screen_size])
-        scale = pygame.transform.scale
+        upscaler = Upscaler(screen, 2,
+                            config.get('display', 'upscale-filter'),
+                            config.getboolean('display', 'upscale-smooth'))
+        self.upscaler = upscaler
+        scale = upscaler.scale
         flip = pygame.display.flip
+        get_events = pygame.event.get
 
-        level_rect = surface.get_rect()
-        level_rect.inflate_ip(0, -level_rect.height * .20)
-        level_rect.bottom = surface.get_rect().bottom
+        report_interval = config.getfloat('general', 'report-interval')
+        if report_interval > 0:
+            scheduler.schedule(upscaler.report, report_interval, repeat=True)
+            scheduler.schedule(resources.report, report_interval, repeat=True)
 
-        hud_group = pygame.sprite.RenderUpdates()
+        self.level_rect = self.get_level_rect(upscaler.source)
 
-        # add stuff to the hud
-        c = (255, 255, 255)
-        bg = (0, 0, 0)
-        s = ui.TextSprite(self.score, c, bg)
-        s.rect.topleft = (0, 0)
-        hud_group.add(s)
+        # the hud is composed in its own layer, and only when it changes
+        self.hud = build_hud(self, self.get_hud_rect(upscaler.source))
 
         # do not remove!
         import castlebats.level_state
@@ -44,24 +87,37 @@ class Game:
         state_manager.push_state("Level")
         # state_manager.push_state("Pause")
 
-        running = True
+        self.running = True
+        first_frame = True
         try:
-            while running:
+            while self.running:
                 dt = scheduler.tick()
 
                 state = state_manager.current_state
 
                 if state is None:
-                    running = False
+                    self.running = False
                     break
 
+                for event in get_events(VIDEORESIZE):
+                    self.on_resize(event.size)
+
+                surface = upscaler.source
                 state.update(dt)
-                state.draw(surface, level_rect)
+                state.draw(surface, self.level_rect)
+                if state.draws_outside_rect:
+                    self.hud.cover()
 
-                hud_group.draw(surface)
-                scale(surface, screen_size, screen)
+                self.hud.update()
+                self.hud.draw(surface)
+                scale()
 
                 flip()
 
+                if first_frame:
+                    first_frame = False
+                    if self.on_first_frame is not None:
+                        self.on_first_frame()
+
         except KeyboardInterrupt:
-            running = False
+            self.running = False
@@ -1,6 +1,8 @@
 from itertools import product
-from pygame import Rect, RLEACCEL
-import pygame
+from pygame import Rect, RLEACCEL, Surface
+
+from castlebats.lib2.cache import LRUCache
+from .text import get_atlas, get_font
 
 __all__ = ('GraphicBox', 'draw_text')
 
@@ -13,12 +15,24 @@ class GraphicBox:
 
     The border graphic must contain 9 tiles laid out in a box.
     Each tile must be the same size
+
+    Boxes are composed once for each size and kept, so drawing a box is
+    one blit.  Sizes can be quantized when the box size is animated, so
+    fewer boxes are composed.  The box is centered on the rect.
+
+    Composed boxes use a colorkey for the empty middle, which is much
+    faster to blit than per-pixel alpha, so the border graphic should not
+    have partially transparent pixels.
     """
-    def __init__(self, image, hollow=False):
+    colorkey = (255, 0, 255)
+
+    def __init__(self, image, hollow=False, cache_size=32, quantize=1):
         iw, ih = image.get_size()
         tw, th = iw // 3, ih // 3
         self.tile_size = tw, th
         self.hollow = hollow
+        self.quantize = quantize
+        self.boxes = LRUCache(cache_size)
 
         tiles = [image.subsurface((x, y, tw, th))
                  for x, y in product(range(0, iw, tw), range(0, ih, th))]
@@ -30,10 +44,36 @@ class GraphicBox:
             ck = self.tiles['c'].get_at((0, 0))
             [t.set_colorkey(ck, RLEACCEL) for t in self.tiles.values()]
 
+    def get_box(self, size):
+        """ Return a surface with a box of a size
+
+        :param size: (width, height)
+        """
+        try:
+            return self.boxes[size]
+        except KeyError:
+            box = Surface(size)
+            box.fill(self.colorkey)
+            self.draw_tiles(box, box.get_rect())
+            box.set_colorkey(self.colorkey, RLEACCEL)
+            self.boxes[size] = box
+            return box
+
     def draw(self, surface, rect=None):
         if rect is None:
             rect = surface.get_rect()
 
+        rect = Rect(rect)
+        q = self.quantize
+        if q > 1:
+            center = rect.center
+            rect.size = rect.width // q * q, rect.height // q * q
+            rect.center = center
+
+        if rect.width > 0 and rect.height > 0:
+            return surface.blit(self.get_box(rect.size), rect)
+
+    def draw_tiles(self, surface, rect):
         ox, oy, w, h = Rect(rect)
         surface_blit = surface.blit
         tiles = self.tiles
@@ -74,8 +114,7 @@ def draw_text(surface, text, rect, font=None, fg_color=None, bg_color=None, aa=F
     line_spacing = -2
 
     if font is None:
-        full_path = pygame.font.get_default_font()
-        font = pygame.font.Font(full_path, 16)
+        font = get_font(None, 16)
 
     # get the height of the font
     font_height = font.size("Tg")[1]
@@ -85,41 +124,23 @@ def draw_text(surface, text, rect, font=None, fg_color=None, bg_color=None, aa=F
         aa = 0
         bg_color = None
 
-    while text:
-        char_index = 1
-
+    # the background is only used to blend antialiased edges
+    atlas = get_atlas(font, fg_color, bg_color, aa, colorkey=True)
+    end = 0
+    for start, end in atlas.wrap(text, rect.width):
         # determine if the row of text will be outside our area
         if y + font_height > rect.bottom:
+            end = start
             break
 
-        # determine maximum width of line
-        line_width = font.size(text[:char_index])[0]
-        while line_width < rect.width and char_index < len(text):
-            if text[char_index] == "\n":
-                text = text[:char_index] + text[char_index + 1:]
-                break
-
-            char_index += 1
-            line_width = font.size(text[:char_index])[0]
-            total_width = max(total_width, line_width)
-        else:
-            # if we've wrapped the text, then adjust the wrap to the last word
-            if char_index < len(text):
-                char_index = text.rfind(" ", 0, char_index) + 1
-
+        line = text[start:end]
+        total_width = max(total_width, atlas.width(line))
         if surface:
-            # render the line and blit it to the surface
-            if bg_color:
-                image = font.render(text[:char_index], 1, fg_color, bg_color)
-                image.set_colorkey(bg_color)
-            else:
-                image = font.render(text[:char_index], aa, fg_color)
-
-            surface.blit(image, (rect.left, y))
+            atlas.draw(surface, line, (rect.left, y))
 
         y += font_height + line_spacing
 
-        # remove the text we just blitted
-        text = text[char_index:]
+    else:
+        end = len(text)
 
-    return total_width, text
+    return total_width, text[end:]
@@ -8,6 +8,7 @@ from . import collisions
 from . import config
 from . import models
 from . import resources
+from .audio import voices
 from .sprite import ShapeSprite
 from .sprite import make_body
 from .sprite import make_feet
@@ -39,6 +40,7 @@ class Model(models.UprightModel):
     CBS contain animations, a simple state machine, and references to the pymunk
     objects that they represent.
     """
+    kind = 'hero'
 
     def __init__(self):
         super().__init__()
@@ -175,6 +177,12 @@ class Model(models.UprightModel):
     def on_collision(self, space, arbiter):
         shape0, shape1 = arbiter.shapes
 
+        # a dead hero may be kept until the level restarts.  it does not
+        # die again or touch enemies, but still rests on traps and the
+        # edges of the map, so it stays where the camera can see it
+        if not self.alive:
+            return not shape1.collision_type == collisions.enemy
+
         logger.info('hero collision %s, %s, %s, %s, %s, %s',
                     shape0.collision_type,
                     shape1.collision_type,
@@ -259,7 +267,7 @@ class Model(models.UprightModel):
                     arbiter.is_first_contact,
                     arbiter.total_impulse)
 
-        if 'attacking' in self.sprite.state:
+        if self.alive and 'attacking' in self.sprite.state:
             shape1.model.alive = False
 
         return False
@@ -292,11 +300,13 @@ class Model(models.UprightModel):
         new_shape.layers = old_shape.layers
         new_shape.collision_type = old_shape.collision_type
         self.sprite.shape = new_shape
+        self.replace_thing(old_shape, new_shape)
 
         space.remove(self.joint)
         space.remove(old_shape)
         space.add(new_shape)
 
+        self.disconnect(self.joint)
         self.joint = None
 
         if self.on_stairs:
@@ -304,7 +314,7 @@ class Model(models.UprightModel):
 
     def uncrouch(self):
         pymunk_body = self.sprite.shape.body
-        pymunk_feet = self.feet.shape.body
+        pymunk_feet = self.feet
         space = pymunk_body._space
 
         # copy the old body shape
@@ -324,7 +334,7 @@ class Model(models.UprightModel):
         # set the feet to the right spot
         pymunk_feet.position = self.normal_feet_position(
                 pymunk_body.position,
-                self.feet.shape)
+                self.feet_shape)
 
         diff = pymunk.Vec2d(pymunk_feet.position)
 
@@ -341,7 +351,8 @@ class Model(models.UprightModel):
         space.add(joint)
 
         self.sprite.shape = new_shape
-        self.joint = joint
+        self.replace_thing(old_shape, new_shape)
+        self.connect_bodies(joint, pymunk_body, pymunk_feet, name='joint')
 
     def physics_hook(self):
         super().physics_hook()
@@ -360,6 +371,31 @@ class Model(models.UprightModel):
     def attack(self):
         pass
 
+    def get_state(self):
+        state = super().get_state()
+        state['air_move'] = self.air_move
+        state['wants_stairs'] = self.wants_stairs
+        state['jump_mod'] = self.jump_mod
+        state['ignore_buttons'] = frozenset(self.ignore_buttons)
+        state['crouched'] = self.joint is None
+        return state
+
+    def set_state(self, state):
+        # change the hitbox before the snapshot moves the bodies
+        if state['crouched'] and self.joint is not None:
+            self.crouch()
+        elif not state['crouched'] and self.joint is None:
+            self.uncrouch()
+
+        if self.on_stairs:
+            self.drop_from_stairs()
+
+        super().set_state(state)
+        self.air_move = state['air_move']
+        self.wants_stairs = state['wants_stairs']
+        self.jump_mod = state['jump_mod']
+        self.ignore_buttons = set(state['ignore_buttons'])
+
 
 class Sprite(ShapeSprite):
     sprite_sheet = 'hero-spritesheet'
@@ -409,8 +445,7 @@ class Sprite(ShapeSprite):
             self.state = ['idle']
 
         if 'hurt' in self.state:
-            resources.sounds['hurt'].stop()
-            resources.sounds['hurt'].play()
+            voices.play('hurt', self.position)
             self.set_animation('hurt')
             self.state.remove('hurt')
 
@@ -423,8 +458,7 @@ class Sprite(ShapeSprite):
             self.set_animation('standup')
 
         elif 'attacking' in self.state:
-            resources.sounds['sword'].stop()
-            resources.sounds['sword'].play()
+            voices.play('sword', self.position)
             self.set_animation('attacking')
 
         elif 'jumping' in self.state:
@@ -466,7 +500,7 @@ def build(space):
     feet_shape.friction = pymunk.inf
 
     model.attach_thing(feet_body, name='feet')
-    model.attach_thing(feet_shape)
+    model.attach_thing(feet_shape, name='feet_shape')
 
     # adjust the position of the feet and body
     feet_body.position = Model.normal_feet_position(
@@ -477,7 +511,7 @@ def build(space):
     model.connect_bodies(motor, body_body, feet_body, name='motor')
 
     joint = pymunk.PivotJoint(body_body, feet_body, feet_body.position, (0, 0))
-    model.connect_bodies(joint, body_body, feet_body)
+    model.connect_bodies(joint, body_body, feet_body, name='joint')
 
     # jump/collision sensor
     #layers = 2
@@ -0,0 +1,194 @@
+"""
+Heads up display
+
+Widgets are composed into a layer that is kept between frames.  The layer
+is only composed again when a widget is dirty, so drawing the hud is one
+blit no matter how many widgets it has.  If nothing changed and nothing
+was drawn over the hud since, the blit is skipped too.  Widgets read
+their values from an object, like the Game, each frame and only redraw
+when it changes.
+"""
+import pygame
+
+from .ui import TextSprite
+
+__all__ = ['HUD', 'ValueText', 'Bar', 'build_hud']
+
+
+class ValueText(TextSprite):
+    """ Text that shows an attribute of an object
+
+        ValueText(game, 'lives', 'LIVES {}')
+    """
+
+    def __init__(self, source, attr, fmt='{}', color=(255, 255, 255),
+                 bgcolor=(0, 0, 0), size=8):
+        self.source = source
+        self.attr = attr
+        self.fmt = fmt
+        super().__init__(self.get_text(), color, bgcolor, size=size)
+
+    def get_text(self):
+        value = getattr(self.source, self.attr)
+        if value is None:
+            value = '-'
+        return self.fmt.format(value)
+
+    def update(self, *args):
+        self.text = self.get_text()
+
+
+class Bar(pygame.sprite.DirtySprite):
+    """ A bar that fills with an attribute of an object
+
+        Bar(game, 'health', 'max_health', (160, 8, 64, 6), (200, 0, 0))
+    """
+    border_color = (255, 255, 255)
+    empty_color = (0, 0, 0)
+
+    def __init__(self, source, attr, max_attr, rect, color):
+        super().__init__()
+        self.source = source
+        self.attr = attr
+        self.max_attr = max_attr
+        self.color = color
+        self.rect = pygame.Rect(rect)
+        self.image = pygame.Surface(self.rect.size)
+        self._filled = None
+        self.update()
+
+    def update(self, *args):
+        value = getattr(self.source, self.attr)
+        maximum = getattr(self.source, self.max_attr)
+        inner = self.rect.width - 2
+        if maximum > 0:
+            filled = int(inner * min(1, max(0, value / maximum)))
+        else:
+            filled = 0
+
+        if not filled == self._filled:
+            self._filled = filled
+            self.image.fill(self.border_color)
+            self.image.fill(self.empty_color, (1, 1, inner, self.rect.height - 2))
+            if filled:
+                self.image.fill(self.color, (1, 1, filled, self.rect.height - 2))
+            self.dirty = 1
+
+
+class HUD:
+    """ Keeps the widgets of the hud composed into one surface
+
+    Only dirty widgets are drawn again, over the area they last covered,
+    so widgets should not overlap.
+    """
+
+    def __init__(self, rect, bgcolor=(0, 0, 0)):
+        self.rect = None
+        self.bgcolor = bgcolor
+        self.image = None
+        self.widgets = pygame.sprite.OrderedUpdates()
+        self._drawn = dict()     # widget: rect it was last drawn to
+        self._stale = True
+        self._covered = True     # True if the hud must be blitted again
+        self._surface = None     # surface the hud was last blitted to
+        self.set_rect(rect)
+
+    def add(self, *widgets):
+        self.widgets.add(*widgets)
+        self._stale = True
+
+    def remove(self, *widgets):
+        self.widgets.remove(*widgets)
+        self._stale = True
+
+    def set_rect(self, rect):
+        """ Set the area of the destination the hud is drawn to
+        """
+        self.rect = pygame.Rect(rect)
+        if self.image is None or not self.image.get_size() == self.rect.size:
+            self.image = pygame.Surface(self.rect.size)
+        self._stale = True
+        self._covered = True
+
+    def cover(self):
+        """ Tell the hud something was drawn over it, so it is blitted again
+        """
+        self._covered = True
+
+    def update(self):
+        """ Let the widgets check their values
+        """
+        self.widgets.update()
+
+    def compose(self):
+        """ Draw every widget into the layer
+        """
+        image = self.image
+        blit = image.blit
+        drawn = dict()
+        image.fill(self.bgcolor)
+        for widget in self.widgets:
+            drawn[widget] = blit(widget.image, widget.rect)
+            widget.dirty = 0
+        self._drawn = drawn
+        self._stale = False
+
+    def draw(self, surface):
+        """ Draw the hud, drawing dirty widgets into the layer first
+
+        The layer is only blitted if it changed, was covered, or the
+        surface is not the one it was last blitted to.
+
+        :return: rect of the hud if it was blitted, or None
+        """
+        if self._stale:
+            self.compose()
+            changed = True
+
+        else:
+            changed = False
+            image = self.image
+            drawn = self._drawn
+            for widget in self.widgets:
+                if widget.dirty:
+                    image.fill(self.bgcolor, drawn[widget])
+                    drawn[widget] = image.blit(widget.image, widget.rect)
+                    widget.dirty = 0
+                    changed = True
+
+        if changed or self._covered or surface is not self._surface:
+            surface.blit(self.image, self.rect)
+            self._covered = False
+            self._surface = surface
+            return self.rect
+
+
+def build_hud(game, rect):
+    """ Make the hud for the fields of a castlebats.game.Game
+    """
+    hud = HUD(rect)
+    width = hud.rect.width
+
+    score = ValueText(game, 'score', '{:06d}', size=12)
+    score.rect.topleft = 8, 8
+
+    lives = ValueText(game, 'lives', 'LIVES {}')
+    lives.rect.topleft = 8, 28
+
+    item = ValueText(game, 'item', 'ITEM {}')
+    item.rect.topleft = 8, 40
+
+    left = width // 2
+    white, black = (255, 255, 255), (0, 0, 0)
+    health_label = TextSprite('HP', white, black, size=8)
+    health_label.rect.topleft = left, 8
+    health = Bar(game, 'health', 'max_health', (left + 24, 8, 96, 8),
+                 (200, 32, 32))
+
+    magic_label = TextSprite('MP', white, black, size=8)
+    magic_label.rect.topleft = left, 24
+    magic = Bar(game, 'magic', 'max_magic', (left + 24, 24, 96, 8),
+                (32, 96, 220))
+
+    hud.add(score, lives, item, health_label, health, magic_label, magic)
+    return hud
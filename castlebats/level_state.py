@@ -1,17 +1,30 @@
 import logging
-import threading
+import os
+from time import perf_counter
 import pygame
 import pymunk
 import pyscroll
-from pygame.constants import QUIT, KEYDOWN, K_ESCAPE
-from pymunktmx import load_shapes
-
-from castlebats import config, resources, playerinput, sprite, collisions, models, hero
+from pygame.constants import QUIT, KEYDOWN, K_ESCAPE, K_BACKSPACE
+from castlebats.shapecache import load_descriptions, build_shapes, get_bounds
+from castlebats.replay import Recorder, SimulationClock
+from castlebats.snapshot import Snapshot, SnapshotRing
+from castlebats.streaming import ChunkStreamer
+from castlebats.tiers import TickTiers
+
+from castlebats import config, resources, playerinput, sprite, collisions, models, hero, zombie
+from castlebats.audio import voices
+from castlebats.music import jukebox
+from castlebats.lighting import Light, parse_color
+from castlebats.lib2.grid import SpatialGrid
+from castlebats.lib2.registry import Registry
 from castlebats.lib2.state import State
-from castlebats import state_manager
+from castlebats import scheduler, state_manager
 
 logger = logging.getLogger(__name__)
 
+# functions to make models for objects in the actors layer, by type
+actor_builders = {'zombie': zombie.build}
+
 
 def ignore_gravity(body, gravity, damping, dt):
     gravity.x = 0
@@ -28,6 +41,9 @@ def get_shape_rect(shape):
 
 
 class Level(State):
+    # the viewports are clipped to the level rect
+    draws_outside_rect = False
+
     def __init__(self):
         self.time = 0
         self.death_reset = 0
@@ -35,15 +51,65 @@ class Level(State):
         self.hero = None
         self.keyboard_input = playerinput.KeyboardPlayerInput()
 
-        self.models = set()
-        self.models_lock = threading.Lock()
-        self._add_queue = set()
-        self._remove_queue = set()
+        # adds and removes while models are updated wait for the frame end
+        self.models = Registry(self.model_added, self.model_removed)
+
+        # snapshots of the simulation, to rewind and to restart the hero
+        self.snapshots = None
+        self.checkpoint = None
+        self.hero_died = None
+        if config.getboolean('snapshots', 'enabled'):
+            capacity = config.getint('snapshots', 'capacity')
+            self.snapshots = SnapshotRing(capacity)
+            self.snapshot_interval = config.getfloat('snapshots', 'interval')
+            self.rewind_seconds = config.getfloat('snapshots', 'rewind')
+            self.last_snapshot = 0
+
+        # recorded play is stepped on a fixed timestep, see castlebats.replay
+        self.recorder = None
+        self.timestep = config.getfloat('world', 'timestep')
+        self.accumulator = 0.0
+        self.pending_commands = list()
+
+        # seconds spent in each stage of the last simulation frame
+        self.timings = {'input': 0.0, 'streaming': 0.0, 'step': 0.0,
+                        'models': 0.0, 'queues': 0.0, 'snapshots': 0.0}
+
+        record_path = config.get('replay', 'record')
+        if record_path:
+            self.recorder = Recorder(record_path, self.timestep)
+
+        # the scheduler runs on the simulation clock while the level runs,
+        # from before any sprite is animated, so animations move with the
+        # simulation and a replay runs them on the same frames
+        self.clock = None
+        self.wall_clock = None      # time function of the scheduler before
+        self.wall_time = 0.0
+        self.start_clock()
+
+        # read the music while the level loads, so it is ready to play
+        jukebox.prefetch('dungeon')
 
         self.tmx_data = resources.maps['level0']
         self.map_data = pyscroll.TiledMapData(self.tmx_data)
         self.map_height = self.map_data.map_size[1] * self.map_data.tile_size[1]
 
+        # models by position, for finding models near something
+        cell_size = self.tmx_data.tilewidth * config.getint('grid', 'cell-tiles')
+        self.grid = SpatialGrid(cell_size)
+        self._nearby = list()
+
+        # models far from the camera think less often
+        self.tiers = None
+        if config.getboolean('ai', 'enabled'):
+            self.tiers = TickTiers(
+                self,
+                config.getint('ai', 'near-distance'),
+                config.getint('ai', 'mid-distance'),
+                (config.getint('ai', 'mid-frames'),
+                 config.getint('ai', 'far-frames')),
+                config.getint('ai', 'tier-frames'))
+
         for layer in self.tmx_data.objectgroups:
             # manually set all objects in the traps layer to trap collision type
             if layer.name == 'Traps':
@@ -66,30 +132,199 @@ class Level(State):
         self.space = pymunk.Space()
         self.space.gravity = (0, config.getfloat('world', 'gravity'))
 
+        # when streaming, only the parts of the level near the camera are
+        # in the space, and lights are rendered as they come near
+        self.streamer = None
+        streaming = config.getboolean('streaming', 'enabled')
+
         # load the vp group and the single vp for level drawing
-        self.vpgroup = sprite.ViewPortGroup(self.space, self.map_data)
+        self.vpgroup = sprite.ViewPortGroup(self.space, self.map_data,
+                                            prerender_lights=not streaming)
         self.vp = sprite.ViewPort()
         self.vpgroup.add(self.vp)
 
-        # set collision types for custom objects
-        # and add platforms
-        shapes = load_shapes(self.tmx_data, self.space, resources.level_xml)
+        # platforms are described once, and cached after prepare_shape
+        cache_path = os.path.abspath(config.get('paths', 'cache-path'))
+        self.shape_descriptions = load_descriptions(
+            self.tmx_data, resources.level_xml, cache_path, self.prepare_shape)
+        self.shapes = dict()            # name: shape in the space
+        self.hanging_joints = dict()    # name: joint holding a hanging shape
+
+        self.actor_objects = dict()     # object id: tiled object
+        self.actors = dict()            # object id: model handle
+        self.dead_actors = set()        # object ids not to build again
+        for layer in self.tmx_data.objectgroups:
+            if layer.name == 'Actors':
+                for obj in layer:
+                    if obj.type and obj.type.lower() in actor_builders:
+                        self.actor_objects[obj.id] = obj
+
+        if streaming:
+            self.start_streaming()
+        else:
+            self.load_shapes(self.shape_descriptions)
+            for obj_id in self.actor_objects:
+                self.load_actor(obj_id)
+
+        self.new_hero()
+
+    def start_streaming(self):
+        chunk_width = config.getint('streaming', 'chunk-width')
+        self.streamer = ChunkStreamer(
+            chunk_width,
+            config.getint('streaming', 'load-distance'),
+            config.getint('streaming', 'unload-distance'),
+            self.load_things, self.unload_things)
+
+        add = self.streamer.add
+        for name, description in self.shape_descriptions.items():
+            add(('shape', name), *get_bounds(description))
+
+        for obj_id, obj in self.actor_objects.items():
+            add(('actor', obj_id), obj.x, obj.x + obj.width)
+
+        map_width = self.map_data.map_size[0] * self.map_data.tile_size[0]
+        for index in range((map_width + chunk_width - 1) // chunk_width):
+            left = index * chunk_width
+            add(('area', index), left, left + chunk_width - 1)
+
+    def load_things(self, keys):
+        """ Add things the streamer has loaded to the level
+        """
+        names = [name for kind, name in keys if kind == 'shape']
+        if names:
+            self.load_shapes({name: self.shape_descriptions[name]
+                              for name in names})
+
+        for kind, name in keys:
+            if kind == 'actor':
+                self.load_actor(name)
+            elif kind == 'area':
+                lightmap = self.vpgroup.lightmap
+                if lightmap is not None:
+                    lightmap.prerender(self.get_area_rect(name))
+
+    def unload_things(self, keys):
+        """ Remove things the streamer has unloaded from the level
+        """
+        for kind, name in keys:
+            if kind == 'shape':
+                self.unload_shape(name)
+            elif kind == 'actor':
+                self.unload_actor(name)
+            elif kind == 'area':
+                lightmap = self.vpgroup.lightmap
+                if lightmap is not None:
+                    lightmap.forget(self.get_area_rect(name))
+
+    def get_area_rect(self, index):
+        width = self.streamer.chunk_width
+        return pygame.Rect(index * width, 0, width, self.map_height)
+
+    def invalidate_overlay(self, shapes):
+        """ Redraw the static shapes of the physics overlay near shapes
+        """
+        overlay = self.vp.overlay
+        if overlay is None:
+            return
+
+        for shape in shapes:
+            if shape.body.is_static:
+                rect = get_shape_rect(shape)
+                rect.top = self.map_height - rect.top
+                overlay.invalidate(rect.inflate(2, 2))
+
+    def load_shapes(self, descriptions):
+        shapes = build_shapes(descriptions, self.space)
+        self.invalidate_overlay(shapes.values())
         for name, shape in shapes.items():
-            print(name, shape.friction)
-            shape.friction = 1
             logger.info("loaded shape: %s", name)
-            if name.startswith('trap'):
-                shape.collision_type = collisions.trap
-            elif name.startswith('boundary'):
-                shape.collision_type = collisions.boundary
-            # elif name.startswith('moving'):
+            # if name.startswith('moving'):
             #     self.handle_moving_platform(shape)
-            elif name.startswith('stairs'):
-                self.handle_stairs(shape)
-            elif name.startswith('hanging'):
-                self.handle_hanging(shape)
+            if name.startswith('hanging'):
+                self.hanging_joints[name] = self.handle_hanging(shape)
+        self.shapes.update(shapes)
+
+    def unload_shape(self, name):
+        shape = self.shapes.pop(name)
+        joint = self.hanging_joints.pop(name, None)
+        if joint is not None:
+            self.space.remove(joint)
+        self.space.remove(shape)
+        if not shape.body.is_static:
+            self.space.remove(shape.body)
+        self.invalidate_overlay((shape, ))
+
+    def load_actor(self, obj_id):
+        if obj_id in self.dead_actors:
+            return
+
+        obj = self.actor_objects[obj_id]
+        position = self.translate((obj.x, obj.y))
+        self.actors[obj_id] = self.spawn(obj.type.lower(), position).handle
+
+    def models_near(self, position, radius, kind=None, out=None):
+        """ Find models within a distance of a position
+
+        Positions are updated once each simulation frame.  Without a list
+        to fill, a list kept by the level is filled and returned, so it
+        changes on the next call.
+
+        :param position: physics coordinates
+        :param kind: optional kind of model to find, like 'enemy'
+        :param out: optional list to fill
+        :return: list of models
+        """
+        if out is None:
+            out = self._nearby
+        x, y = position
+        self.grid.query_radius(x, y, radius, out)
+        if kind is not None:
+            found = 0
+            for model in out:
+                if model.kind == kind:
+                    out[found] = model
+                    found += 1
+            del out[found:]
+        return out
+
+    def spawn(self, kind, position):
+        """ Build an actor and add it to the level
+
+        :param kind: name in actor_builders
+        :param position: physics coordinates
+        :return: the model
+        """
+        model = actor_builders[kind](self.space)
+        model.position = position
+        self.add_model(model)
+        return model
 
-        self.new_hero()
+    def unload_actor(self, obj_id):
+        handle = self.actors.pop(obj_id, None)
+        if handle is None:
+            return
+
+        # actors that died are not built again
+        model = self.models.get(handle)
+        if model is not None and model.alive:
+            self.remove_model(model)
+        else:
+            self.dead_actors.add(obj_id)
+
+    def prepare_shape(self, name, shape):
+        """ Set collision types for custom objects
+
+        Only set attributes of the shape here.  The result is cached, so
+        delete the cache folder after changing this.
+        """
+        shape.friction = 1
+        if name.startswith('trap'):
+            shape.collision_type = collisions.trap
+        elif name.startswith('boundary'):
+            shape.collision_type = collisions.boundary
+        elif name.startswith('stairs'):
+            self.handle_stairs(shape)
 
     def handle_stairs(self, shape):
         logger.info('loading stairs %s', shape)
@@ -177,60 +412,174 @@ class Level(State):
         m = models.BasicModel()
         m.sprite = spr
 
-    def new_hero(self):
+        return joint
+
+    def get_hero_coords(self):
+        """ Return where the hero starts, in physics coordinates, or None
+        """
         typed_objects = [obj for obj in self.tmx_data.objects
                          if obj.type is not None]
 
-        # find the hero and position her
         hero_coords = None
         for obj in typed_objects:
             if obj.type.lower() == 'hero':
                 hero_coords = self.translate((obj.x, obj.y))
+        return hero_coords
+
+    def new_hero(self):
+        hero_coords = self.get_hero_coords()
+        if hero_coords is None:
+            raise ValueError('map {} has no object of type "hero"'.format(
+                self.tmx_data.filename))
+
+        # the level around the hero must be in the space before she lands
+        if self.streamer is not None:
+            self.streamer.update(hero_coords.x)
 
         self.keyboard_input.reset()
         self.hero = hero.build(self.space)
         self.hero.position = hero_coords
         self.add_model(self.hero)
         self.vp.follow(self.hero.sprite)
-        resources.sounds['hero-spawn'].play()
+        self.add_torch(self.hero.sprite)
+        voices.play('hero-spawn')
+
+        # the hero is restarted from here, instead of being built again
+        if self.snapshots is not None:
+            self.checkpoint = self.take_snapshot()
+
+    def take_snapshot(self):
+        return Snapshot.capture(self.time, self.space, self.models)
+
+    def restore_snapshot(self, snapshot, only=None):
+        snapshot.restore(self.space, self.models, only)
+        self.keyboard_input.reset()
+        if self.hero is not None and self.hero.alive:
+            self.hero_died = None
+
+    def restart_from_checkpoint(self):
+        # only the hero goes back; enemies stay where they are
+        logger.info('restarting from checkpoint')
+        self.restore_snapshot(self.checkpoint, self.hero)
+        self.snapshots.clear()
+        voices.play('hero-spawn')
+
+    def rewind(self):
+        """ Go back to the state of some seconds ago
+
+        Not done while recording, since a replay cannot rewind.
+        """
+        if self.recorder is not None:
+            logger.info('cannot rewind while recording')
+            return
+
+        snapshot = self.snapshots.rewind(self.rewind_seconds)
+        if snapshot is not None:
+            logger.info('rewinding to %.2f', snapshot.time)
+            self.restore_snapshot(snapshot)
+
+    def add_torch(self, spr):
+        """ Give a sprite a light that follows it
+        """
+        lightmap = self.vpgroup.lightmap
+        if lightmap is None:
+            return
+
+        radius = config.getint('lighting', 'torch-radius')
+        color = parse_color(config.get('lighting', 'torch-color'))
+        torch = Light(radius, color)
+        torch.follow(spr, self.map_height)
+        lightmap.add_light(torch)
+
+    def get_time(self):
+        return self.time
 
     def add_model(self, model):
-        if self.models_lock.acquire(False):
-            self.models.add(model)
-            for spr in model.sprites:
-                self.vpgroup.add(spr)
-            self.models_lock.release()
-        else:
-            self._add_queue.add(model)
+        """ Add a model to the level
+
+        :return: the handle of the model
+        """
+        # models keep time with the level, so replays are repeatable
+        model.clock = self.get_time
+        return self.models.add(model)
 
     def remove_model(self, model):
-        if self.models_lock.acquire(False):
-            self.models.remove(model)
-            for spr in model.sprites:
-                self.vpgroup.remove(spr)
-            if model is self.hero:
-                self.hero = None
-                self.death_reset = self.time
-            model.kill()
-            self.models_lock.release()
-        else:
-            self._remove_queue.add(model)
+        self.models.remove(model)
+
+    def model_added(self, model):
+        for spr in model.sprites:
+            self.vpgroup.add(spr)
+        x, y = model.position
+        self.grid.insert(model, x, y)
+        if self.tiers is not None:
+            self.tiers.add(model)
+
+    def model_removed(self, model):
+        self.grid.remove(model)
+        if self.tiers is not None:
+            self.tiers.remove(model)
+        for spr in model.sprites:
+            self.vpgroup.remove(spr)
+        if model is self.hero:
+            self.hero = None
+            self.death_reset = self.time
+        model.kill()
+
+    def get_camera_position(self):
+        """ Return the center of the camera, or the hero, in physics coordinates
+
+        :return: Vec2d, or None if there is neither
+        """
+        if self.vp.camera_vector is not None:
+            return self.translate(self.vp.camera_vector)
+        if self.hero is not None:
+            return self.hero.position
 
     def translate(self, coords):
         return pymunk.Vec2d(coords[0], self.map_height - coords[1])
 
+    def start_clock(self):
+        """ Run the scheduler on the simulation clock
+        """
+        if self.wall_clock is None:
+            if self.clock is None:
+                self.clock = SimulationClock(scheduler.get_time())
+            self.wall_clock = scheduler.set_time_function(self.clock)
+            self.wall_time = self.wall_clock()
+
+    def stop_clock(self):
+        """ Run the scheduler on the time function it had before
+        """
+        if self.wall_clock is not None:
+            scheduler.set_time_function(self.wall_clock)
+            self.wall_clock = None
+
     def resume(self):
         self.running = True
-        resources.play_music('dungeon')
+        self.start_clock()
+        # do not count the time spent loading or paused
+        self.wall_time = self.wall_clock()
+        jukebox.play('dungeon')
+
+    def pause(self):
+        self.stop_clock()
 
     def shutdown(self):
         self.running = False
-        pygame.mixer.music.stop()
+        self.stop_clock()
+        jukebox.stop_now()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.streamer is not None:
+            logger.info('streaming: %s', self.streamer.stats())
 
     def draw(self, surface, rect):
         self.vpgroup.draw(surface, rect)
 
     def handle_input(self):
+        """ Handle events, and return the commands they make for the hero
+        """
+        commands = list()
         for event in pygame.event.get():
             if event.type == QUIT:
                 self.running = False
@@ -241,47 +590,145 @@ class Level(State):
                     self.running = False
                     break
 
-            if self.hero:
-                cmd = self.keyboard_input.get_command(event)
-                if cmd is not None:
-                    self.hero.process(cmd)
+                elif event.key == K_BACKSPACE and self.snapshots is not None:
+                    self.rewind()
+                    continue
 
-        if self.hero:
-            for cmd in self.keyboard_input.get_held():
-                self.hero.process(cmd)
+            cmd = self.keyboard_input.get_command(event)
+            if cmd is not None:
+                commands.append(cmd)
+
+        return commands
 
     def update(self, seconds):
-        self.handle_input()
+        """ Handle input and simulate the time since the last update
+
+        The scheduler runs on the simulation clock, so the seconds given by
+        the game are not wall time.  Wall time is measured here instead.
+        """
+        now = self.wall_clock()
+        seconds = now - self.wall_time
+        self.wall_time = now
+
+        commands = self.handle_input()
+
+        if self.recorder is None:
+            commands.extend(self.keyboard_input.get_held())
+            self.step(seconds, commands)
+
+        else:
+            # recorded play runs on a fixed timestep, as the replay will
+            self.pending_commands.extend(commands)
+            self.accumulator = min(self.accumulator + seconds, .25)
+            while self.accumulator >= self.timestep:
+                self.accumulator -= self.timestep
+                commands = self.pending_commands
+                commands.extend(self.keyboard_input.get_held())
+                self.pending_commands = list()
+                self.recorder.record(commands)
+                self.step(self.timestep, commands)
+
+        if not self.running:
+            state_manager.pop_state()
+
+    def step(self, seconds, commands):
+        """ Advance the simulation clock, run the scheduler, then simulate
+
+        Recorded play and replays are stepped here, so both run the
+        scheduled functions at the same times between the same frames.
+        """
+        self.clock.advance(seconds)
+        scheduler.tick()
+        self.simulate(seconds, commands)
+
+    def simulate(self, seconds, commands):
+        """ Run one frame of the simulation
+
+        :param commands: list of commands for the hero
+        """
+        timings = self.timings
+        start = perf_counter()
+
+        if self.hero and self.hero.alive:
+            for cmd in commands:
+                self.hero.process(cmd)
+
+        # sounds are heard from the center of the camera
+        if self.vp.camera_vector is not None:
+            voices.listener = self.translate(self.vp.camera_vector)
 
         self.time += seconds
 
+        now = perf_counter()
+        timings['input'] = now - start
+        start = now
+
+        # bring in the level near the camera, and let go of what is far
+        if self.streamer is not None and self.vp.camera_vector is not None:
+            self.streamer.update(self.vp.camera_vector.x)
+
+        now = perf_counter()
+        timings['streaming'] = now - start
+        start = now
+
         step_amt = seconds / 3.
         step = self.space.step
         step(step_amt)
         step(step_amt)
         step(step_amt)
 
+        now = perf_counter()
+        timings['step'] = now - start
+        start = now
+
         if self.time - self.death_reset >= 5 and not self.hero:
             self.new_hero()
 
-        with self.models_lock:
-            for model in self.models:
+        if self.hero_died is not None and self.time - self.hero_died >= 5:
+            self.restart_from_checkpoint()
+
+        models = self.models
+        models.defer()
+        move = self.grid.move
+        tiers = self.tiers
+        every_frame = None
+        if tiers is not None:
+            # the others are called by the tiers, after these
+            every_frame = tiers.every_frame
+
+        for model in models:
+            x, y = model.position
+            move(model, x, y)
+            if every_frame is None or model in every_frame:
                 model.physics_hook()
 
-                if not model.alive:
+            if not model.alive:
+                # with a checkpoint the hero is kept, to be restored
+                if model is self.hero and self.checkpoint is not None:
+                    if self.hero_died is None:
+                        self.hero_died = self.time
+                else:
                     self.remove_model(model)
 
-        for model in self._remove_queue:
-            self.remove_model(model)
+        if tiers is not None:
+            tiers.update()
 
-        for model in self._add_queue:
-            self.add_model(model)
+        now = perf_counter()
+        timings['models'] = now - start
+        start = now
 
-        self._remove_queue.clear()
-        self._add_queue.clear()
+        models.flush()
 
-        if not self.running:
-            state_manager.pop_state()
+        now = perf_counter()
+        timings['queues'] = now - start
+        start = now
+
+        if self.snapshots is not None and self.hero_died is None:
+            if self.time - self.last_snapshot >= self.snapshot_interval:
+                self.last_snapshot = self.time
+                self.snapshots.push(self.take_snapshot())
+
+        timings['snapshots'] = perf_counter() - start
 
 
 # add this level to the global state manager
@@ -0,0 +1,169 @@
+from collections import OrderedDict
+
+import pygame
+
+__all__ = ('LRUCache', 'SurfacePool', 'sizeof_surface')
+
+
+def sizeof_surface(surface):
+    """ Number of bytes used by the pixels of a pygame surface
+    """
+    w, h = surface.get_size()
+    return w * h * surface.get_bytesize()
+
+
+class LRUCache:
+    """ Mapping that forgets the least recently used items
+
+    The capacity is the limit of the sum of the size of each value.
+    By default every value has a size of 1, so the capacity is the
+    number of items.  Pass a 'sizeof' function to limit by something
+    else, like bytes:
+
+        cache = LRUCache(1024 * 1024, sizeof_surface)
+
+    The most recently set item is never evicted, even if it alone is
+    larger than the capacity.
+    """
+
+    def __init__(self, capacity, sizeof=None):
+        self.capacity = capacity
+        self.sizeof = sizeof
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._sizes = dict()
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def __iter__(self):
+        return iter(list(self._items.keys()))
+
+    def __getitem__(self, key):
+        try:
+            value = self._items[key]
+        except KeyError:
+            self.misses += 1
+            raise
+
+        self.hits += 1
+        self._items.move_to_end(key)
+        return value
+
+    def __setitem__(self, key, value):
+        if key in self._items:
+            self._discard(key)
+
+        size = 1 if self.sizeof is None else self.sizeof(value)
+        self._items[key] = value
+        self._sizes[key] = size
+        self.size += size
+        self.trim()
+
+    def __delitem__(self, key):
+        if key not in self._items:
+            raise KeyError(key)
+        self._discard(key)
+
+    def _discard(self, key):
+        del self._items[key]
+        self.size -= self._sizes.pop(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def trim(self, capacity=None):
+        """ Evict the least recently used items until under capacity
+        """
+        if capacity is None:
+            capacity = self.capacity
+
+        items = self._items
+        while self.size > capacity and len(items) > 1:
+            key = next(iter(items))
+            self._discard(key)
+            self.evictions += 1
+
+    def clear(self):
+        self._items.clear()
+        self._sizes.clear()
+        self.size = 0
+
+    def stats(self):
+        """ Return a dict of the cache usage
+
+        :return: dict
+        """
+        return {'items': len(self._items),
+                'size': self.size,
+                'capacity': self.capacity,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions}
+
+
+class SurfacePool:
+    """ Keeps released surfaces so they can be used again
+
+    Useful when buffers are resized often, for example when the window
+    is being resized, and sizes are likely to repeat:
+
+        buffer = pool.acquire((320, 240), pygame.SRCALPHA)
+        ...
+        pool.release(buffer)
+
+    Flags can be 0 or pygame.SRCALPHA.  Surfaces from the pool are not
+    cleared and may have a colorkey or alpha set by their previous user.
+    Only 'capacity' surfaces are kept; the ones that were released first
+    are dropped first.
+    """
+
+    def __init__(self, capacity=8):
+        self.capacity = capacity
+        self.hits = 0
+        self.misses = 0
+        self._free = OrderedDict()
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def acquire(self, size, flags=0):
+        key = (int(size[0]), int(size[1])), flags
+        try:
+            surfaces = self._free[key]
+        except KeyError:
+            self.misses += 1
+            return pygame.Surface(key[0], flags)
+
+        self.hits += 1
+        self._count -= 1
+        surface = surfaces.pop()
+        if not surfaces:
+            del self._free[key]
+        return surface
+
+    def release(self, surface):
+        if surface is None:
+            return
+
+        key = surface.get_size(), surface.get_flags() & pygame.SRCALPHA
+        self._free.setdefault(key, list()).append(surface)
+        self._free.move_to_end(key)
+        self._count += 1
+
+        while self._count > self.capacity:
+            key, surfaces = next(iter(self._free.items()))
+            surfaces.pop(0)
+            self._count -= 1
+            if not surfaces:
+                del self._free[key]
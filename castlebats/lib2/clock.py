@@ -55,6 +55,20 @@ class Scheduler:
         self._current_executing_item_wants_to_remove = False
         self.cumulative_time = 0.0
 
+    def get_time(self):
+        """Return the time from the time function of the scheduler.
+        """
+        return self._time()
+
+    def set_time_function(self, time_function):
+        """Change the function used to get the time, and return the old one.
+
+        Useful to run scheduled functions on simulated time.
+        """
+        previous = self._time
+        self._time = time_function
+        return previous
+
     def _get_nearest_ts(self):
         """Schedule from now, unless now is sufficiently close to last_ts, in
         which case use last_ts.  This clusters together scheduled items that
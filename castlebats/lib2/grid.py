@@ -0,0 +1,215 @@
+"""
+Uniform grid for finding things near a point
+
+Things are kept in square cells.  When a thing moves, it only changes
+cells if it moved into another cell, so updating every thing each frame
+is cheap.  Queries only look at the cells near the query, so they cost
+about the same however many things are far away.
+
+Queries fill a list given by the caller, so a list can be kept and used
+again each frame instead of making a new one:
+
+    found = list()
+    grid.query_radius(x, y, 200, found)
+"""
+from math import sqrt
+
+__all__ = ('SpatialGrid', )
+
+
+def distance_key(item):
+    return item[0]
+
+
+class SpatialGrid:
+    """ Things in square cells, by position
+
+    Things can be any hashable object.
+
+    :param cell_size: width and height of each cell
+    """
+
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = dict()     # (column, row): list of things
+        self.places = dict()    # thing: [x, y, column, row]
+        self._distances = list()
+
+    def __len__(self):
+        return len(self.places)
+
+    def __contains__(self, thing):
+        return thing in self.places
+
+    def insert(self, thing, x, y):
+        size = self.cell_size
+        column, row = int(x // size), int(y // size)
+        self.places[thing] = [x, y, column, row]
+        try:
+            self.cells[column, row].append(thing)
+        except KeyError:
+            self.cells[column, row] = [thing]
+
+    def move(self, thing, x, y):
+        place = self.places[thing]
+        place[0] = x
+        place[1] = y
+        size = self.cell_size
+        column, row = int(x // size), int(y // size)
+        if column == place[2] and row == place[3]:
+            return
+
+        self._leave(thing, place[2], place[3])
+        place[2] = column
+        place[3] = row
+        try:
+            self.cells[column, row].append(thing)
+        except KeyError:
+            self.cells[column, row] = [thing]
+
+    def remove(self, thing):
+        x, y, column, row = self.places.pop(thing)
+        self._leave(thing, column, row)
+
+    def _leave(self, thing, column, row):
+        cell = self.cells[column, row]
+        cell.remove(thing)
+        if not cell:
+            del self.cells[column, row]
+
+    def clear(self):
+        self.cells.clear()
+        self.places.clear()
+
+    def query_rect(self, x1, y1, x2, y2, out):
+        """ Find things in a rectangle, edges included
+
+        :param x1, y1: smallest corner
+        :param x2, y2: largest corner
+        :param out: list to fill; it is cleared first
+        :return: out
+        """
+        out.clear()
+        size = self.cell_size
+        cells = self.cells
+        places = self.places
+        for column in range(int(x1 // size), int(x2 // size) + 1):
+            for row in range(int(y1 // size), int(y2 // size) + 1):
+                cell = cells.get((column, row))
+                if cell is None:
+                    continue
+                for thing in cell:
+                    place = places[thing]
+                    if x1 <= place[0] <= x2 and y1 <= place[1] <= y2:
+                        out.append(thing)
+        return out
+
+    def query_radius(self, x, y, radius, out):
+        """ Find things within a distance of a point
+
+        :param out: list to fill; it is cleared first
+        :return: out
+        """
+        out.clear()
+        size = self.cell_size
+        cells = self.cells
+        places = self.places
+        limit = radius * radius
+        for column in range(int((x - radius) // size),
+                            int((x + radius) // size) + 1):
+            for row in range(int((y - radius) // size),
+                             int((y + radius) // size) + 1):
+                cell = cells.get((column, row))
+                if cell is None:
+                    continue
+                for thing in cell:
+                    place = places[thing]
+                    dx = place[0] - x
+                    dy = place[1] - y
+                    if dx * dx + dy * dy <= limit:
+                        out.append(thing)
+        return out
+
+    def nearest(self, x, y, k, out, radius=None):
+        """ Find the nearest things to a point, nearest first
+
+        Cells are searched in rings around the point, until the k nearest
+        things found cannot be nearer than anything in the next ring.
+
+        :param k: most things to find
+        :param out: list to fill; it is cleared first
+        :param radius: optional limit of the distance to things
+        :return: out
+        """
+        out.clear()
+        distances = self._distances
+        distances.clear()
+        if k <= 0 or not self.places:
+            return out
+
+        size = self.cell_size
+        cells = self.cells
+        places = self.places
+        limit = None if radius is None else radius * radius
+        center_column, center_row = int(x // size), int(y // size)
+        remaining = len(places)
+        ring = 0
+        while remaining:
+            for column, row in self._ring(center_column, center_row, ring):
+                cell = cells.get((column, row))
+                if cell is None:
+                    continue
+                remaining -= len(cell)
+                for thing in cell:
+                    place = places[thing]
+                    dx = place[0] - x
+                    dy = place[1] - y
+                    d = dx * dx + dy * dy
+                    if limit is None or d <= limit:
+                        distances.append((d, thing))
+
+            # things in the next ring are at least this far away
+            reach = ring * size
+            if radius is not None and reach > radius:
+                break
+            if len(distances) >= k:
+                distances.sort(key=distance_key)
+                if distances[k - 1][0] <= reach * reach:
+                    break
+            ring += 1
+
+        distances.sort(key=distance_key)
+        for d, thing in distances[:k]:
+            out.append(thing)
+        distances.clear()
+        return out
+
+    @staticmethod
+    def _ring(column, row, ring):
+        """ Return cells in a square ring around a cell
+        """
+        if not ring:
+            yield column, row
+            return
+
+        left, right = column - ring, column + ring
+        for c in range(left, right + 1):
+            yield c, row - ring
+            yield c, row + ring
+        for r in range(row - ring + 1, row + ring):
+            yield left, r
+            yield right, r
+
+    def distance(self, thing, x, y):
+        """ Return the distance from a thing to a point
+        """
+        place = self.places[thing]
+        dx = place[0] - x
+        dy = place[1] - y
+        return sqrt(dx * dx + dy * dy)
+
+    def stats(self):
+        cells = self.cells
+        return {'things': len(self.places),
+                'cells': len(cells),
+                'most': max((len(i) for i in cells.values()), default=0)}
@@ -0,0 +1,215 @@
+"""
+Registry of entities, with generational handles
+
+Each entity added to the registry is given a handle: an int made from a
+slot index and the generation of the slot.  When an entity is removed,
+the generation of its slot goes up, so old handles to the slot no longer
+find anything, even after the slot is used again.
+
+Entities are kept in dense lists, one for all entities and one for each
+kind, so iterating over them or over one kind does not make a copy or
+look at anything else.  Lists are kept dense by moving the last entity
+into the place of a removed one, so the order is not kept.
+
+While deferred, adds and removes are kept in command buffers and done
+when flushed, so the lists can be iterated while entities are added and
+removed:
+
+    registry.defer()
+    for entity in registry:
+        if entity.dead:
+            registry.remove(entity)     # done at flush
+    registry.flush()
+"""
+
+__all__ = ('Registry', 'handle_index', 'handle_generation')
+
+index_bits = 24
+index_mask = (1 << index_bits) - 1
+
+
+def make_handle(index, generation):
+    return generation << index_bits | index
+
+
+def handle_index(handle):
+    return handle & index_mask
+
+
+def handle_generation(handle):
+    return handle >> index_bits
+
+
+class Registry:
+    """ Dense lists of entities by kind, with generational handles
+
+    Entities are given a 'handle' attribute.  The kind of an entity is
+    taken from its 'kind' attribute, if it has one.
+
+    :param on_add: optional function called with an entity when added
+    :param on_remove: optional function called with an entity when removed
+    """
+
+    def __init__(self, on_add=None, on_remove=None):
+        self.on_add = on_add
+        self.on_remove = on_remove
+        self._entities = list()       # entity in each slot, or None
+        self._generations = list()    # generation of each slot
+        self._positions = list()      # position of each slot in _dense
+        self._kind_positions = list()  # position of each slot in its kind
+        self._free = list()           # slots that can be used again
+        self._dense = list()          # all entities
+        self._kinds = dict()          # kind: list of entities
+        self._adds = list()
+        self._removes = list()
+        self.deferred = False
+
+    def __len__(self):
+        return len(self._dense)
+
+    def __iter__(self):
+        return iter(self._dense)
+
+    def __contains__(self, entity):
+        handle = getattr(entity, 'handle', None)
+        return handle is not None and self.get(handle) is entity
+
+    def get(self, handle):
+        """ Return the entity of a handle, or None if it has been removed
+
+        Entities added while deferred are found before they are flushed.
+        """
+        index = handle & index_mask
+        try:
+            if self._generations[index] == handle >> index_bits:
+                return self._entities[index]
+        except IndexError:
+            pass
+
+    def of_kind(self, kind):
+        """ Return the list of entities of a kind
+
+        The list is kept by the registry; do not change it.
+        """
+        try:
+            return self._kinds[kind]
+        except KeyError:
+            entities = self._kinds[kind] = list()
+            return entities
+
+    def add(self, entity):
+        """ Add an entity
+
+        :return: the handle of the entity
+        """
+        if self._free:
+            index = self._free.pop()
+            self._entities[index] = entity
+        else:
+            index = len(self._entities)
+            if index > index_mask:
+                raise OverflowError('too many entities')
+            self._entities.append(entity)
+            self._generations.append(0)
+            self._positions.append(-1)
+            self._kind_positions.append(-1)
+
+        handle = make_handle(index, self._generations[index])
+        entity.handle = handle
+
+        if self.deferred:
+            self._adds.append(handle)
+        else:
+            self._insert(index)
+        return handle
+
+    def remove(self, entity):
+        """ Remove an entity, or do nothing if it is not in the registry
+        """
+        handle = getattr(entity, 'handle', None)
+        if handle is None or self.get(handle) is not entity:
+            return
+
+        if self.deferred:
+            self._removes.append(handle)
+        else:
+            self._erase(handle & index_mask)
+
+    def defer(self):
+        """ Keep adds and removes until flush is called
+        """
+        self.deferred = True
+
+    def flush(self):
+        """ Do the adds and removes kept since defer, and stop deferring
+        """
+        self.deferred = False
+        adds, removes = self._adds, self._removes
+        generations = self._generations
+
+        # an entity added, then removed, before the flush is still added
+        # so on_add and on_remove are always called in pairs
+        for handle in adds:
+            index = handle & index_mask
+            if generations[index] == handle >> index_bits:
+                self._insert(index)
+
+        for handle in removes:
+            index = handle & index_mask
+            if generations[index] == handle >> index_bits:
+                self._erase(index)
+
+        adds.clear()
+        removes.clear()
+
+    def clear(self):
+        """ Remove all entities, now
+        """
+        self.flush()
+        for entity in list(self._dense):
+            self._erase(entity.handle & index_mask)
+
+    def _insert(self, index):
+        entity = self._entities[index]
+        self._positions[index] = len(self._dense)
+        self._dense.append(entity)
+
+        kind = self.of_kind(getattr(entity, 'kind', None))
+        self._kind_positions[index] = len(kind)
+        kind.append(entity)
+
+        if self.on_add is not None:
+            self.on_add(entity)
+
+    def _erase(self, index):
+        entity = self._entities[index]
+        inserted = self._positions[index] >= 0
+        if inserted:
+            self._swap_pop(self._dense, index, self._positions)
+            kind = self._kinds[getattr(entity, 'kind', None)]
+            self._swap_pop(kind, index, self._kind_positions)
+
+        self._entities[index] = None
+        self._generations[index] += 1
+        self._free.append(index)
+        entity.handle = None
+
+        if inserted and self.on_remove is not None:
+            self.on_remove(entity)
+
+    @staticmethod
+    def _swap_pop(entities, index, positions):
+        """ Remove the entity of a slot, moving the last entity into its place
+        """
+        position = positions[index]
+        positions[index] = -1
+        last = entities.pop()
+        if position < len(entities):
+            entities[position] = last
+            positions[last.handle & index_mask] = position
+
+    def stats(self):
+        return {'entities': len(self._dense),
+                'slots': len(self._entities),
+                'free': len(self._free),
+                'kinds': {k: len(v) for k, v in self._kinds.items() if v}}
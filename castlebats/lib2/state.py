@@ -17,6 +17,10 @@ class State:
     """
     __metaclass__ = ABCMeta
 
+    # set to False if draw only changes the rect it is given, so what is
+    # drawn around the rect, like a hud, is kept between frames
+    draws_outside_rect = True
+
     @abstractmethod
     def draw(self, surface, rect):
         """ Render the state to the surface passed.  Must be overloaded in children
@@ -0,0 +1,263 @@
+"""
+Lighting for the map
+
+Light comes from elliptical objects in the 'Backlight' and 'Lights' object
+groups of the map.  Those lights never move, so they are rendered with
+numpy into chunks once when the map is loaded.  Each frame the chunks are
+copied into a buffer, lights that move (like the hero's torch) are added,
+and the buffer is multiplied over the view.
+
+Objects may have 'color' and 'intensity' properties, ie:
+    color = 255, 200, 150
+    intensity = 0.5
+"""
+import logging
+from itertools import product
+
+import numpy
+import pygame
+from pygame.surfarray import blit_array
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['Light', 'LightMap', 'LightRenderer', 'parse_color']
+
+# object groups of the map that are read as lights
+light_groups = ('Backlight', 'Lights')
+
+
+def parse_color(value):
+    """ Convert a config value or tiled property like "255, 200, 150"
+    """
+    r, g, b = [int(i) for i in value.split(',')]
+    return r, g, b
+
+
+def falloff(dx, dy):
+    """ Brightness of a light at distances scaled to the light's radius
+
+    1 at the center, 0 at the edge and beyond
+    """
+    d = 1 - (dx[:, None] ** 2 + dy[None, :] ** 2)
+    numpy.clip(d, 0, 1, out=d)
+    return d * d
+
+
+def make_light_image(radius, color):
+    """ Render a round light to a surface, to be added with BLEND_ADD
+    """
+    size = radius * 2
+    d = (numpy.arange(size, dtype=numpy.float32) - radius + .5) / radius
+    pixels = falloff(d, d)[:, :, None] * numpy.array(color, numpy.float32)
+    image = pygame.Surface((size, size))
+    blit_array(image, pixels.astype(numpy.uint8))
+    return image
+
+
+class Light:
+    """ A light that can move
+
+    The position is the center of the light, in map pixel coordinates.
+    If following a sprite, the position is taken from the sprite instead.
+    """
+    _images = dict()
+
+    def __init__(self, radius, color, position=(0, 0)):
+        self.radius = int(radius)
+        self.color = tuple(color)
+        self.position = position
+        self.following = None
+        self.map_height = None
+
+    @property
+    def image(self):
+        key = self.radius, self.color
+        try:
+            return self._images[key]
+        except KeyError:
+            image = make_light_image(self.radius, self.color)
+            self._images[key] = image
+            return image
+
+    def follow(self, sprite, map_height):
+        """ Follow a ShapeSprite
+
+        :param map_height: used to flip the physics y axis
+        """
+        self.following = sprite
+        self.map_height = map_height
+
+    def get_position(self):
+        if self.following is None:
+            return self.position
+        x, y = self.following.position
+        return x, self.map_height - y
+
+
+class LightMap:
+    """ The static lights of a map, and a list of lights that move
+
+    One lightmap is shared by every renderer that draws the same map.
+    Chunks that no light touches are only the ambient color, so they are
+    remembered as None and filled instead of blitted.
+    """
+
+    def __init__(self, tmx_data, ambient, chunk_size=256):
+        self.ambient = tuple(ambient)
+        self.chunk_size = chunk_size
+        self.map_rect = pygame.Rect(0, 0,
+                                    tmx_data.width * tmx_data.tilewidth,
+                                    tmx_data.height * tmx_data.tileheight)
+        self.lights = list()     # (rect, color) of static lights
+        self.dynamic = list()    # Lights drawn each frame
+        self._chunks = dict()
+
+        for layer in tmx_data.objectgroups:
+            if layer.name in light_groups:
+                for obj in layer:
+                    self.add_static(obj)
+
+    def add_static(self, obj):
+        """ Add a light from a tiled object
+        """
+        rect = pygame.Rect(obj.x, obj.y, obj.width, obj.height)
+        if rect.width < 1 or rect.height < 1:
+            logger.warning('ignoring light with no size: %s', obj)
+            return
+
+        props = obj.properties
+        color = parse_color(props.get('color', '255, 255, 255'))
+        intensity = float(props.get('intensity', 1))
+        color = [i * intensity for i in color]
+        self.lights.append((rect, color))
+
+    def add_light(self, light):
+        self.dynamic.append(light)
+
+    def remove_light(self, light):
+        self.dynamic.remove(light)
+
+    def chunks_in(self, rect):
+        """ Return the (cx, cy) of every chunk that touches a rect
+        """
+        size = self.chunk_size
+        rect = pygame.Rect(rect).clip(self.map_rect)
+        xs = range(rect.left // size, (rect.right + size - 1) // size)
+        ys = range(rect.top // size, (rect.bottom + size - 1) // size)
+        return [(cx, cy) for cy, cx in product(ys, xs)]
+
+    def prerender(self, rect=None):
+        """ Render every chunk of the map, or every chunk touching a rect
+        """
+        if rect is None:
+            rect = self.map_rect
+        for cx, cy in self.chunks_in(rect):
+            self.get_chunk(cx, cy)
+
+        count = sum(1 for i in self._chunks.values() if i is not None)
+        logger.info('%d light chunks rendered', count)
+
+    def forget(self, rect):
+        """ Forget the chunks inside a rect; they are rendered again if used
+        """
+        size = self.chunk_size
+        rect = pygame.Rect(rect)
+        for cx, cy in self.chunks_in(rect):
+            area = pygame.Rect(cx * size, cy * size, size, size)
+            if rect.contains(area.clip(self.map_rect)):
+                self._chunks.pop((cx, cy), None)
+
+    def get_chunk(self, cx, cy):
+        """ Return the surface of a chunk, or None if it is only ambient
+        """
+        try:
+            return self._chunks[(cx, cy)]
+        except KeyError:
+            chunk = self.render_chunk(cx, cy)
+            self._chunks[(cx, cy)] = chunk
+            return chunk
+
+    def render_chunk(self, cx, cy):
+        size = self.chunk_size
+        rect = pygame.Rect(cx * size, cy * size, size, size)
+        lights = [i for i in self.lights if i[0].colliderect(rect)]
+        if not lights:
+            return None
+
+        pixels = numpy.empty((size, size, 3), numpy.float32)
+        pixels[:] = self.ambient
+        for light_rect, color in lights:
+            area = light_rect.clip(rect)
+            rx = light_rect.width / 2.
+            ry = light_rect.height / 2.
+            dx = numpy.arange(area.left, area.right, dtype=numpy.float32)
+            dy = numpy.arange(area.top, area.bottom, dtype=numpy.float32)
+            dx = (dx + .5 - light_rect.centerx) / rx
+            dy = (dy + .5 - light_rect.centery) / ry
+
+            x, y = area.left - rect.left, area.top - rect.top
+            view = pixels[x:x + area.width, y:y + area.height]
+            view += falloff(dx, dy)[:, :, None] * numpy.array(color, numpy.float32)
+
+        numpy.clip(pixels, 0, 255, out=pixels)
+        chunk = pygame.Surface((size, size))
+        blit_array(chunk, pixels.astype(numpy.uint8))
+        return chunk
+
+
+class LightRenderer:
+    """ Multiplies the light of a LightMap over a view of the map
+    """
+
+    def __init__(self, lightmap):
+        self.lightmap = lightmap
+        self._buffer = None
+
+    def set_size(self, size, pool=None):
+        """ Set the size of the area that will be drawn
+
+        :param size: (width, height)
+        :param pool: optional castlebats.lib2.cache.SurfacePool for buffers
+        """
+        if self._buffer is not None:
+            if self._buffer.get_size() == tuple(size):
+                return
+            if pool is not None:
+                pool.release(self._buffer)
+
+        if pool is None:
+            self._buffer = pygame.Surface(size)
+        else:
+            self._buffer = pool.acquire(size)
+            self._buffer.set_colorkey(None)
+            self._buffer.set_alpha(None)
+
+    def draw(self, surface, rect, view):
+        """ Darken a drawn view of the map
+
+        :param surface: destination surface
+        :param rect: area of the destination the view was drawn to
+        :param view: area of the map that was drawn, in pixels
+        """
+        lightmap = self.lightmap
+        buffer = self._buffer
+        blit = buffer.blit
+        left, top = view.topleft
+        size = lightmap.chunk_size
+
+        buffer.fill(lightmap.ambient)
+        x1, y1 = left // size, top // size
+        x2, y2 = (view.right - 1) // size, (view.bottom - 1) // size
+        for cy in range(max(0, y1), y2 + 1):
+            for cx in range(max(0, x1), x2 + 1):
+                chunk = lightmap.get_chunk(cx, cy)
+                if chunk is not None:
+                    blit(chunk, (cx * size - left, cy * size - top))
+
+        for light in lightmap.dynamic:
+            x, y = light.get_position()
+            radius = light.radius
+            blit(light.image, (x - radius - left, y - radius - top),
+                 None, pygame.BLEND_ADD)
+
+        surface.blit(buffer, rect.topleft, None, pygame.BLEND_MULT)
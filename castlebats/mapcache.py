@@ -0,0 +1,174 @@
+"""
+Compiled cache of tiled maps
+
+Parsing a TMX file means reading the xml, then decoding and inflating
+every layer.  The first time a map is loaded, the parsed map is written
+to the cache folder: tile layers as one numpy array, and everything else
+(tilesets, object groups, properties, gid maps) pickled.  Files are named
+by the hash of the TMX file, so editing a map compiles it again.
+
+Loading a compiled map memory-maps the tile array and skips the xml
+entirely.  Tileset images are not cached, they are loaded by the
+image loader as usual.
+"""
+import copyreg
+import hashlib
+import logging
+import os
+import pickle
+
+import numpy
+import pytmx
+from pytmx import TiledMap, TiledTileLayer
+from pytmx.pytmx import TiledElement
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['load_map', 'compile_map', 'hash_file']
+
+# change if the compiled format changes, so old files are not used
+version = 2
+
+
+def hash_file(path):
+    """ Return the sha1 hex digest of a file
+    """
+    digest = hashlib.sha1()
+    with open(path, 'rb') as fp:
+        for block in iter(lambda: fp.read(65536), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_cache_paths(path, cache_dir, digest=None):
+    """ Return the paths of the compiled files for a map
+
+    :return: (path of pickle, path of tile array)
+    """
+    if digest is None:
+        digest = hash_file(path)
+    name = os.path.splitext(os.path.basename(path))[0]
+    pytmx_version = '.'.join(str(i) for i in pytmx.__version__)
+    base = '{}-{}-{}-{}'.format(name, digest, version, pytmx_version)
+    base = os.path.join(cache_dir, base)
+    return base + '.pickle', base + '.npy'
+
+
+def _new_element(cls):
+    # tiled elements look up missing attributes in their properties,
+    # so properties must exist before pickle looks for __setstate__
+    element = cls.__new__(cls)
+    element.__dict__['properties'] = dict()
+    return element
+
+
+def _reduce_element(element):
+    state = element.__dict__.copy()
+    if isinstance(element, TiledMap):
+        state['images'] = list()
+        state['image_loader'] = None
+    elif isinstance(element, TiledTileLayer):
+        state['data'] = None
+
+    # object groups are lists; their objects are not in __dict__
+    items = iter(element) if isinstance(element, list) else None
+    return _new_element, (element.__class__,), state, items
+
+
+def _element_classes(cls=TiledElement):
+    yield cls
+    for subclass in cls.__subclasses__():
+        for i in _element_classes(subclass):
+            yield i
+
+
+def _dispatch_table():
+    table = copyreg.dispatch_table.copy()
+    for cls in _element_classes():
+        table[cls] = _reduce_element
+    return table
+
+
+def _tile_layers(tmx_data):
+    return [layer for layer in tmx_data.layers
+            if isinstance(layer, TiledTileLayer)]
+
+
+def compile_map(tmx_data, path, cache_dir, digest=None):
+    """ Write a parsed map to the cache
+
+    :param tmx_data: pytmx.TiledMap parsed from path
+    :param path: path of the TMX file
+    """
+    pickle_path, array_path = get_cache_paths(path, cache_dir, digest)
+    os.makedirs(cache_dir, exist_ok=True)
+
+    layers = _tile_layers(tmx_data)
+    tiles = numpy.zeros((len(layers), tmx_data.height, tmx_data.width),
+                        numpy.uint16)
+    for index, layer in enumerate(layers):
+        for y, row in enumerate(layer.data):
+            tiles[index, y] = row
+
+    # the pickle is written last, and only if all went well,
+    # so a map is only used from the cache if both files are complete
+    temp = array_path + '.tmp'
+    with open(temp, 'wb') as fp:
+        numpy.save(fp, tiles)
+    os.replace(temp, array_path)
+
+    temp = pickle_path + '.tmp'
+    with open(temp, 'wb') as fp:
+        pickler = pickle.Pickler(fp, pickle.HIGHEST_PROTOCOL)
+        pickler.dispatch_table = _dispatch_table()
+        pickler.dump(tmx_data)
+    os.replace(temp, pickle_path)
+
+    logger.info('compiled %s', path)
+
+
+def read_map(path, cache_dir, image_loader, digest=None):
+    """ Return a compiled map, or None if it is not in the cache
+    """
+    pickle_path, array_path = get_cache_paths(path, cache_dir, digest)
+    try:
+        with open(pickle_path, 'rb') as fp:
+            tmx_data = pickle.load(fp)
+        tiles = numpy.load(array_path, mmap_mode='r')
+    except FileNotFoundError:
+        return None
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError,
+            AttributeError, ImportError):
+        logger.warning('cannot read compiled map for %s', path, exc_info=True)
+        return None
+
+    for index, layer in enumerate(_tile_layers(tmx_data)):
+        layer.data = tiles[index]
+
+    tmx_data.filename = path
+    tmx_data.image_loader = image_loader
+    tmx_data.reload_images()
+    return tmx_data
+
+
+def load_map(path, cache_dir, image_loader):
+    """ Load a TMX map, using the compiled copy if there is one
+
+    If the map is not compiled, it is parsed and compiled.
+
+    :param image_loader: pytmx image loader
+    :rtype: pytmx.TiledMap
+    """
+    digest = hash_file(path)
+    tmx_data = read_map(path, cache_dir, image_loader, digest)
+    if tmx_data is not None:
+        logger.info('loaded compiled %s', path)
+        return tmx_data
+
+    tmx_data = TiledMap(path, image_loader=image_loader)
+    try:
+        compile_map(tmx_data, path, cache_dir, digest)
+    except OSError:
+        logger.warning('cannot compile %s', path, exc_info=True)
+
+    return tmx_data
@@ -12,9 +12,12 @@ class BasicModel:
     * Models should implement high-level functions for groups
       of related shapes/bodies/joints
     """
+    kind = 'thing'    # for finding models of a kind in the level registry
+
     def __init__(self):
         self.space = None
         self.alive = True
+        self.handle = None
         self._pymunk_objects = set()
         self._named_references = set()
         self.sprites = set()
@@ -66,12 +69,34 @@ class BasicModel:
             self._named_references.add(name)
             setattr(self, name, body)
 
+    def replace_thing(self, old, new):
+        """ Keep a new pymunk object in place of an old one, when removed
+        """
+        self._pymunk_objects.discard(old)
+        self._pymunk_objects.add(new)
+
     def connect_bodies(self, pymunk_object, *others, name=None):
         self.connections.add((pymunk_object, others))
         if name:
             self._named_references.add(name)
             setattr(self, name, pymunk_object)
 
+    def disconnect(self, pymunk_object):
+        """ Forget a connection, so it is not removed from the space again
+        """
+        self.connections = {i for i in self.connections
+                            if i[0] is not pymunk_object}
+
+    def get_state(self):
+        """ Return a dict of the state of the model, for snapshots
+
+        Bodies are not included; they are saved by the snapshot.
+        """
+        return {'alive': self.alive}
+
+    def set_state(self, state):
+        self.alive = state['alive']
+
     def kill(self):
         """
         remove chipmunk stuff here
@@ -109,7 +134,9 @@ class UprightModel(BasicModel):
         self.move_power = 1
         self.jump_power = 1
 
-        # prevent super quick animation changes
+        # prevent super quick animation changes.  the level sets the clock
+        # to its own time, so the model does the same thing when replayed
+        self.clock = time.time
         self._debounce_time = 0
         self._grounded = False
 
@@ -117,18 +144,31 @@ class UprightModel(BasicModel):
         self.sprite_direction = self.RIGHT
 
     def physics_hook(self):
-        now = time.time()
+        now = self.clock()
         if now - self._debounce_time > .05:
             self._debounce_time = now
             if self._grounded:
                 if 'jumping' in self.sprite.state:
                     self.sprite.state.remove('jumping')
                     self.sprite.change_state()
-                    self._debounce_time = time.time()
+                    self._debounce_time = self.clock()
             else:
                 if 'jumping' not in self.sprite.state:
                     self.sprite.change_state('jumping')
 
+    def get_state(self):
+        state = super().get_state()
+        state['grounded'] = self._grounded
+        state['direction'] = self.sprite_direction
+        state['motor'] = self.motor.rate, self.motor.max_force
+        return state
+
+    def set_state(self, state):
+        super().set_state(state)
+        self._grounded = state['grounded']
+        self.sprite_direction = state['direction']
+        self.motor.rate, self.motor.max_force = state['motor']
+
     @property
     def grounded(self):
         return self._grounded
@@ -0,0 +1,174 @@
+"""
+Music that changes tracks without stalling the game
+
+Tracks are read into memory on a background thread, then streamed by
+pygame.mixer.music from memory, so the game never waits on the disk to
+change music.  pygame.mixer.music plays one stream, so changing tracks
+fades the old one out, then fades the new one in once it is read.  The
+fades are run by the scheduler.
+
+    from castlebats.music import jukebox
+    jukebox.prefetch('cave')     # read it now, play it later
+    jukebox.play('dungeon')
+"""
+import io
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+import pygame
+
+from castlebats import config
+from castlebats import resources
+from castlebats import scheduler
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['MusicPlayer', 'jukebox']
+
+
+def _read_file(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+class MusicPlayer:
+    """ Plays music tracks from memory, fading between them
+    """
+    interval = 1 / 30.    # seconds between volume changes while fading
+
+    def __init__(self):
+        self.files = dict()        # name: future with the bytes of the track
+        self.current = None        # name of the track playing
+        self.pending = None        # name of the track to play next
+        self.volume = 0.0          # volume of the music now
+        self.fade_time = 0.0       # seconds to fade between silent and full
+        self._stream = None        # file object being played
+        self._executor = None
+        self._fading = False
+        self._configured = False
+
+    def configure(self):
+        self.fade_time = config.getfloat('sound', 'music-fade')
+        self._executor = ThreadPoolExecutor(1)
+        self._configured = True
+
+    @property
+    def target_volume(self):
+        return config.getint('sound', 'music-volume') / 100.
+
+    def prefetch(self, name):
+        """ Start reading a track in the background, if it is not read yet
+        """
+        if not self._configured:
+            self.configure()
+
+        try:
+            return self.files[name]
+        except KeyError:
+            path = resources.music[name]
+            logger.info("reading %s", path)
+            future = self._executor.submit(_read_file, path)
+            self.files[name] = future
+            return future
+
+    def play(self, name):
+        """ Change to a track, fading out the one playing
+        """
+        if name == self.pending:
+            return
+
+        if name == self.current and not self._fading:
+            return
+
+        if self.target_volume <= 0:
+            return
+
+        self.prefetch(name)
+        self.pending = name
+        self.start_fade()
+
+    def stop(self):
+        """ Fade out and stop the music
+        """
+        self.pending = None
+        if self.current is not None:
+            self.start_fade()
+
+    def stop_now(self):
+        """ Stop the music without fading
+        """
+        scheduler.unschedule(self.update)
+        self._fading = False
+        self.pending = None
+        self.current = None
+        self.volume = 0.0
+        pygame.mixer.music.stop()
+
+    def start_fade(self):
+        if not self._fading:
+            self._fading = True
+            scheduler.schedule(self.update, self.interval, repeat=True)
+
+    def start_track(self, name):
+        """ Start playing a track that has been read, at no volume
+        """
+        self.current = None
+        try:
+            data = self.files[name].result()
+            stream = io.BytesIO(data)
+            pygame.mixer.music.load(stream)
+            pygame.mixer.music.set_volume(0)
+            pygame.mixer.music.play(-1)
+        except (OSError, pygame.error):
+            logger.warning("cannot play music %s", name, exc_info=True)
+            del self.files[name]
+            return
+
+        # the stream is read while playing, so keep it
+        self._stream = stream
+        self.current = name
+        logger.info("playing %s", name)
+
+    def update(self, dt):
+        """ Change the volume a step, and change tracks when silent
+        """
+        if self.fade_time > 0:
+            step = dt / self.fade_time
+        else:
+            step = 1.0
+
+        # fade out what is playing, unless it is what should be playing
+        if self.current is not None and not self.current == self.pending:
+            self.volume = max(0.0, self.volume - step)
+            pygame.mixer.music.set_volume(self.volume)
+            if self.volume > 0:
+                return
+
+            pygame.mixer.music.stop()
+            self.current = None
+            self._stream = None
+
+        if self.pending is None:
+            self._fading = False
+            return False
+
+        # wait for the next track without blocking the frame
+        if self.current is None:
+            if not self.files[self.pending].done():
+                return
+            self.start_track(self.pending)
+            if self.current is None:
+                self.pending = None
+                self._fading = False
+                return False
+
+        target = self.target_volume
+        self.volume = min(target, self.volume + step)
+        pygame.mixer.music.set_volume(self.volume)
+        if self.volume >= target:
+            self.pending = None
+            self._fading = False
+            return False
+
+
+jukebox = MusicPlayer()
@@ -0,0 +1,158 @@
+import logging
+
+import pygame
+import pymunk
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['PhysicsOverlay']
+
+
+class PhysicsOverlay:
+    """ Draws the physics shapes of a space over the map
+
+    Static shapes never move, so they are drawn once into chunks that
+    are cached for the lifetime of the overlay.  Dynamic shapes are
+    found with a bounding box query on the camera and drawn each frame.
+
+    All rects and points passed in are in map pixel coordinates, where
+    the y axis points down.
+    """
+    chunk_size = 256
+    colorkey = (0, 0, 0)
+    static_color = (64, 64, 255)
+    dynamic_color = (255, 128, 0)
+    sensor_color = (255, 255, 0)
+
+    def __init__(self, space, map_height, alpha=128):
+        self.space = space
+        self.map_height = map_height
+        self.alpha = alpha
+        self._chunks = dict()
+        self._buffer = None
+
+    def set_size(self, size, pool=None):
+        """ Set the size of the area that will be drawn
+
+        :param size: (width, height)
+        :param pool: optional castlebats.lib2.cache.SurfacePool for buffers
+        """
+        if self._buffer is not None:
+            if self._buffer.get_size() == tuple(size):
+                return
+            if pool is not None:
+                pool.release(self._buffer)
+
+        if pool is None:
+            self._buffer = pygame.Surface(size)
+        else:
+            self._buffer = pool.acquire(size)
+        self._buffer.set_colorkey(self.colorkey)
+        self._buffer.set_alpha(self.alpha)
+
+    def invalidate(self, rect=None):
+        """ Forget the cached static geometry
+
+        Call this if static shapes are added to or removed from the space
+
+        :param rect: optional area of the map that changed, else all of it
+        """
+        if rect is None:
+            self._chunks = dict()
+            return
+
+        size = self.chunk_size
+        for cy in range(rect.top // size, (rect.bottom - 1) // size + 1):
+            for cx in range(rect.left // size, (rect.right - 1) // size + 1):
+                self._chunks.pop((cx, cy), None)
+
+    def _query(self, rect):
+        left, top, width, height = rect
+        bottom = self.map_height - top - height
+        bb = pymunk.BB(left, bottom, left + width, self.map_height - top)
+        return self.space.bb_query(bb)
+
+    def _get_chunk(self, cx, cy):
+        try:
+            return self._chunks[(cx, cy)]
+        except KeyError:
+            pass
+
+        size = self.chunk_size
+        rect = pygame.Rect(cx * size, cy * size, size, size)
+        shapes = [s for s in self._query(rect) if s.body.is_static]
+
+        if shapes:
+            logger.debug('caching physics chunk %s', (cx, cy))
+            chunk = pygame.Surface((size, size))
+            chunk.set_colorkey(self.colorkey)
+            chunk.fill(self.colorkey)
+            for shape in shapes:
+                self.draw_shape(chunk, shape, rect.topleft)
+        else:
+            chunk = None
+
+        self._chunks[(cx, cy)] = chunk
+        return chunk
+
+    def draw(self, surface, camera, offset):
+        """ Draw the shapes visible in the camera
+
+        :param surface: destination surface
+        :param camera: rect of visible area of the map
+        :param offset: added to map coordinates to get surface coordinates
+        """
+        buffer = self._buffer
+        buffer.fill(self.colorkey)
+        blit = buffer.blit
+        left, top = camera.topleft
+        size = self.chunk_size
+
+        x1, y1 = left // size, top // size
+        x2, y2 = (camera.right - 1) // size, (camera.bottom - 1) // size
+        for cy in range(y1, y2 + 1):
+            for cx in range(x1, x2 + 1):
+                chunk = self._get_chunk(cx, cy)
+                if chunk is not None:
+                    blit(chunk, (cx * size - left, cy * size - top))
+
+        draw_shape = self.draw_shape
+        for shape in self._query(camera):
+            if not shape.body.is_static:
+                draw_shape(buffer, shape, camera.topleft)
+
+        surface.blit(buffer, (left + offset[0], top + offset[1]))
+
+    def draw_shape(self, surface, shape, origin):
+        """ Draw one shape onto a surface
+
+        :param origin: map coordinates of the top left of the surface
+        """
+        ox, oy = origin
+        map_height = self.map_height
+
+        def to_surface(point):
+            return int(point[0] - ox), int(map_height - point[1] - oy)
+
+        if shape.sensor:
+            color = self.sensor_color
+        elif shape.body.is_static:
+            color = self.static_color
+        else:
+            color = self.dynamic_color
+
+        body = shape.body
+        if isinstance(shape, pymunk.Circle):
+            center = body.position + shape.offset.rotated(body.angle)
+            radius = max(1, int(shape.radius))
+            pygame.draw.circle(surface, color, to_surface(center), radius)
+
+        elif isinstance(shape, pymunk.Segment):
+            a = to_surface(body.position + shape.a.rotated(body.angle))
+            b = to_surface(body.position + shape.b.rotated(body.angle))
+            width = max(1, int(shape.radius * 2))
+            pygame.draw.line(surface, color, a, b, width)
+
+        elif isinstance(shape, pymunk.Poly):
+            points = [to_surface(i) for i in shape.get_vertices()]
+            pygame.draw.polygon(surface, color, points)
@@ -0,0 +1,123 @@
+import logging
+
+import pygame
+from pytmx import TiledTileLayer
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ParallaxLayer', 'split_layers']
+
+
+def parse_pair(value):
+    """ Convert a tiled property like "4, 3" into a tuple of floats
+    """
+    x, y = [float(i) for i in value.split(',')]
+    return x, y
+
+
+def split_layers(cache):
+    """ Sort the visible tile layers of a map by the way they scroll
+
+    layers with a 'parallax_ratio' property are parallax layers
+
+    :param cache: castlebats.tilecache.TileChunkCache of the map
+    :return: list of normal layer numbers, list of ParallaxLayers
+    """
+    normal = list()
+    parallax = list()
+    for index, layer in enumerate(cache.data.tmx.layers):
+        if not isinstance(layer, TiledTileLayer) or not layer.visible:
+            continue
+
+        ratio = layer.properties.get('parallax_ratio')
+        if ratio is None:
+            normal.append(index)
+            continue
+
+        offset = layer.properties.get('parallax_offset', '0, 0')
+        parallax.append(ParallaxLayer(cache, index, parse_pair(ratio),
+                                      parse_pair(offset)))
+
+    # the bottom layer doesn't need transparency
+    if parallax:
+        bottom = parallax[0]
+        if not normal or bottom.layer < normal[0]:
+            bottom.opaque = True
+
+    return normal, parallax
+
+
+class ParallaxLayer:
+    """ Draws a tile layer that scrolls slower than the camera
+
+    The layer is drawn from a cached surface that is one tile larger than
+    the view on every side.  Scrolling within a tile only moves the cached
+    surface, tiles are only drawn when the layer shifts by a tile.
+    """
+
+    def __init__(self, cache, layer, ratio=(1, 1), offset=(0, 0)):
+        self.cache = cache           # castlebats.tilecache.TileChunkCache
+        self.layer = layer
+        self.ratio = ratio
+        self.offset = offset
+        self.opaque = False          # set if nothing will be drawn under
+        self._buffer = None
+        self._snapped = None
+
+    def set_size(self, size, pool=None):
+        """ Set the size of the area that will be drawn
+
+        :param size: (width, height)
+        :param pool: optional castlebats.lib2.cache.SurfacePool for buffers
+        """
+        tw, th = self.cache.data.tile_size
+        size = size[0] + tw * 2, size[1] + th * 2
+        flags = 0 if self.opaque else pygame.SRCALPHA
+
+        if self._buffer is not None:
+            if self._buffer.get_size() == size:
+                return
+            if pool is not None:
+                pool.release(self._buffer)
+
+        if pool is None:
+            self._buffer = pygame.Surface(size, flags)
+        else:
+            self._buffer = pool.acquire(size, flags)
+            if self.opaque:
+                self._buffer.set_colorkey(None)
+                self._buffer.set_alpha(None)
+        self._snapped = None
+
+    def draw(self, surface, rect, camera):
+        """ Draw the layer
+
+        :param surface: destination surface
+        :param rect: area of the destination to draw to
+        :param camera: center of the camera, in map pixel coordinates
+        """
+        tw, th = self.cache.data.tile_size
+        mw, mh = self.cache.map_rect.size
+        buffer = self._buffer
+        bw, bh = buffer.get_size()
+
+        # keep the buffer inside the map
+        x = camera[0] / self.ratio[0] + self.offset[0]
+        y = camera[1] / self.ratio[1] + self.offset[1]
+        x = max(bw // 2 + tw, min(x, mw - bw // 2 - tw))
+        y = max(bh // 2 + th, min(y, mh - bh // 2 - th))
+
+        snapped = int(x // tw * tw), int(y // th * th)
+        if not snapped == self._snapped:
+            self._snapped = snapped
+            buffer.fill((0, 0, 0, 0))
+            view = buffer.get_rect(center=snapped)
+            self.cache.draw_layer(buffer, self.layer, view,
+                                  (-view.left, -view.top))
+
+        dx = rect.left - tw - int(x - snapped[0])
+        dy = rect.top - th - int(y - snapped[1])
+        clip = surface.get_clip()
+        surface.set_clip(rect)
+        surface.blit(buffer, (dx, dy))
+        surface.set_clip(clip)
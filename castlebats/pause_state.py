@@ -1,19 +1,25 @@
 from castlebats.lib2.state import State
-from castlebats.lib2.animation import Animation
 from castlebats.gui import GraphicBox
+from castlebats import resources
 from castlebats import state_manager
 
-from os.path import join
-
 
 class Pause(State):
-    def resume(self):
-        filename = join('resources', 'images', 'dialog.png')
-        import pygame
+    box = None
+
+    @classmethod
+    def load_box(cls):
+        # the box is shared, so boxes it composed are kept between pauses
+        if cls.box is None:
+            cls.box = GraphicBox(resources.images['dialog'], quantize=4)
 
-        image = pygame.image.load(filename).convert_alpha()
+    def startup(self):
+        self.load_box()
+
+    def resume(self):
+        # not needed until the game is paused, so not imported at startup
+        from castlebats.lib2.animation import Animation
 
-        self.box = GraphicBox(image)
         self.gui_mod = 0
 
         ani = Animation(gui_mod=1.0, duration=.25, transition='out_quint')
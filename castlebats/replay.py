@@ -0,0 +1,160 @@
+"""
+Recording and replay of player input
+
+A recording has the commands given to the hero in each simulation
+frame.  A recorded level runs on a fixed timestep, so a replay can step
+the level exactly as it was stepped, without a keyboard or window.
+
+File format, little endian:
+
+    header: b'CBRP', version (uint8), timestep in seconds (float64)
+    frame:  number of commands (uint8), then each command (uint16)
+
+A command is the button, from castlebats.buttons, in the low 12 bits
+and the button state (BUTTONUP, BUTTONHELD, BUTTONDOWN) in the high 4.
+A frame without commands is one byte.
+
+Sprite animations are run by the scheduler.  While a level runs, the
+scheduler is on a SimulationClock, which the level advances by the
+timestep before each recorded frame, both when recording and when
+replaying.  Models keep time with the level too.  So a replay runs the
+same animations and hooks on the same frames as the session it was
+recorded from.  Rewinding is not allowed while recording.
+"""
+import logging
+import struct
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['Recorder', 'Replay', 'SimulationClock', 'play']
+
+magic = b'CBRP'
+version = 1
+
+header_struct = struct.Struct('<4sBd')
+count_struct = struct.Struct('<B')
+command_struct = struct.Struct('<H')
+
+
+def pack_command(button, state):
+    if button >= 4096 or state >= 16:
+        raise ValueError('cannot record button {} state {}'.format(button, state))
+    return state << 12 | button
+
+
+def unpack_command(value):
+    """ Return (button, state)
+    """
+    return value & 0xfff, value >> 12
+
+
+class Recorder:
+    """ Writes the commands of each simulation frame to a file
+    """
+
+    def __init__(self, path, timestep):
+        self.path = path
+        self.timestep = timestep
+        self.frames = 0
+        self._fp = open(path, 'wb')
+        self._fp.write(header_struct.pack(magic, version, timestep))
+
+    def record(self, commands):
+        """ Record one frame
+
+        :param commands: list of (input class, button, state)
+        """
+        if len(commands) > 255:
+            raise ValueError('too many commands in one frame')
+
+        data = [count_struct.pack(len(commands))]
+        for input_class, button, state in commands:
+            data.append(command_struct.pack(pack_command(button, state)))
+        self._fp.write(b''.join(data))
+        self.frames += 1
+
+    def close(self):
+        if self._fp is not None:
+            self._fp.close()
+            self._fp = None
+            logger.info('recorded %d frames to %s', self.frames, self.path)
+
+
+class Replay:
+    """ The frames of a recording
+
+    Iterating gives the commands of each frame, in the form used by
+    hero.Model.process.
+    """
+
+    def __init__(self, timestep, frames):
+        self.timestep = timestep
+        self.frames = frames    # list of tuples of packed commands
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as fp:
+            data = fp.read()
+
+        file_magic, file_version, timestep = header_struct.unpack_from(data)
+        if not file_magic == magic:
+            raise ValueError('{} is not a recording'.format(path))
+        if not file_version == version:
+            raise ValueError('{} is recording version {}, not {}'.format(
+                path, file_version, version))
+
+        frames = list()
+        offset = header_struct.size
+        end = len(data)
+        size = command_struct.size
+        while offset < end:
+            count = data[offset]
+            offset += 1
+            commands = struct.unpack_from('<{}H'.format(count), data, offset)
+            offset += count * size
+            frames.append(commands)
+
+        return cls(timestep, frames)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def __iter__(self):
+        cls = self.__class__
+        for frame in self.frames:
+            yield [(cls, ) + unpack_command(i) for i in frame]
+
+
+class SimulationClock:
+    """ Time function for the scheduler that moves only when advanced
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+def play(level, replay, frame_hook=None):
+    """ Step a level through every frame of a replay
+
+    Frames are stepped like the level steps them while recording, on the
+    simulation clock of the level.
+
+    :param level: castlebats.level_state.Level
+    :param frame_hook: optional function called after each frame
+    :return: number of frames played
+    """
+    timestep = replay.timestep
+    frames = 0
+    for commands in replay:
+        level.step(timestep, commands)
+        frames += 1
+        if frame_hook is not None:
+            frame_hook()
+
+    return frames
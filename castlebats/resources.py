@@ -1,12 +1,20 @@
+import io
 import logging
 import os
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from time import perf_counter
 
 import pygame
-from pytmx.util_pygame import load_pygame
+from pytmx.util_pygame import handle_transformation, smart_convert
+
+from castlebats import mapcache
+from castlebats.lib2.cache import LRUCache, sizeof_surface
 
 logger = logging.getLogger(__name__)
 
-__all__ = ['sounds', 'images', 'music', 'maps', 'load', 'play_music']
+__all__ = ['sounds', 'images', 'music', 'maps', 'load', 'stats',
+           'ResourceMap', 'SoundBank']
 
 # because i am lazy
 _jpath = os.path.join
@@ -19,15 +27,254 @@ fonts = None
 level_xml = None
 
 
-def load():
+class _PendingTile:
+    """ Tile image that has been decoded, but not converted for the display
+    """
+    __slots__ = ('image', 'colorkey')
+
+    def __init__(self, image, colorkey):
+        self.image = image
+        self.colorkey = colorkey
+
+
+def _deferred_image_loader(filename, colorkey, **kwargs):
+    """ pytmx image loader that does not need the display
+
+    Works like pytmx.util_pygame.pygame_image_loader, but tiles must be
+    converted later with _convert_map.
+    """
+    if colorkey:
+        colorkey = pygame.Color('#{0}'.format(colorkey))
+
+    image = pygame.image.load(filename)
+
+    def load_image(rect=None, flags=None):
+        if rect:
+            tile = image.subsurface(rect)
+        else:
+            tile = image.copy()
+
+        if flags:
+            tile = handle_transformation(tile, flags)
+
+        return _PendingTile(tile, colorkey)
+
+    return load_image
+
+
+def _convert_map(tmx_data):
+    images = tmx_data.images
+    for index, tile in enumerate(images):
+        if isinstance(tile, _PendingTile):
+            images[index] = smart_convert(tile.image, tile.colorkey, True)
+    return tmx_data
+
+
+def sizeof_sound(sound):
+    """ Number of bytes used by the samples of a sound
+    """
+    frequency, size, channels = pygame.mixer.get_init()
+    return int(sound.get_length() * frequency * channels * abs(size) // 8)
+
+
+def sizeof_map(tmx_data):
+    """ Number of bytes used by the tile images of a map
+    """
+    return sum(sizeof_surface(i) for i in tmx_data.images if i is not None)
+
+
+class ResourceMap(Mapping):
+    """ Mapping of names to resources that are loaded when first used
+
+    Loaded resources are kept in an LRU cache, and the least recently used
+    are forgotten when the total size is over the capacity.  Anything still
+    using a forgotten resource keeps it; it will be loaded again if it is
+    used from here.
+
+    :param paths: dict of name: path
+    :param decode: function to read a path; must be safe to call in a thread
+    :param finish: function to make the decoded data ready to use
+    :param capacity: bytes
+    :param sizeof: function to get the size of a resource in bytes
+    """
+
+    def __init__(self, paths, decode, finish, capacity, sizeof):
+        self.paths = paths
+        self.decode = decode
+        self.finish = finish
+        self.loads = 0
+        self.load_times = dict()   # name: (decode seconds, finish seconds)
+        self._cache = LRUCache(capacity, sizeof)
+
+    def __getitem__(self, name):
+        try:
+            return self._cache[name]
+        except KeyError:
+            pass
+
+        path = self.paths[name]
+        logger.info("loading %s", path)
+        return self.add(name, *self.timed_decode(path))
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    # compared by identity; Mapping would compare by loading every item
+    __eq__ = object.__eq__
+    __ne__ = object.__ne__
+    __hash__ = object.__hash__
+
+    def timed_decode(self, path):
+        """ Decode a path and return (decoded, seconds taken)
+        """
+        start = perf_counter()
+        decoded = self.decode(path)
+        return decoded, perf_counter() - start
+
+    def add(self, name, decoded, decode_time=0.0):
+        """ Finish a decoded resource and keep it
+        """
+        start = perf_counter()
+        resource = self.finish(decoded)
+        self.load_times[name] = decode_time, perf_counter() - start
+        self._cache[name] = resource
+        self.loads += 1
+        return resource
+
+    def is_loaded(self, name):
+        return name in self._cache
+
+    def clear(self):
+        """ Forget all the loaded resources
+        """
+        self._cache.clear()
+
+    def stats(self):
+        """ Return a dict of the cache usage; sizes are bytes
+        """
+        stats = self._cache.stats()
+        stats['loads'] = self.loads
+        return stats
+
+
+class SoundBank(ResourceMap):
+    """ ResourceMap of sounds that keeps compressed files in memory
+
+    Compressed files are read into memory by read_files, and are decoded
+    into a pygame.mixer.Sound when first played.  Decoded sounds are kept
+    in the LRU cache like any other resource, so only the sounds in use
+    cost the memory of their samples.  Uncompressed files are decoded from
+    disk, since keeping their bytes would cost as much as the samples;
+    load preloads them, so they are not read from disk during play.
+
+    If a file has a compressed copy, in the OGG folder next to it with
+    the same name, the copy is used.
+    """
+    compressed_formats = ('.ogg',)
+
+    def __init__(self, paths, finish, capacity):
+        paths = {name: self.find_compressed(path)
+                 for name, path in paths.items()}
+        super().__init__(paths, self.decode_sound, finish, capacity,
+                         sizeof_sound)
+        self.files = dict()    # path: bytes of a compressed file
+
+    @classmethod
+    def is_compressed(cls, path):
+        return os.path.splitext(path)[1].lower() in cls.compressed_formats
+
+    @classmethod
+    def find_compressed(cls, path):
+        """ Return the path of a compressed copy of a file, or the path
+        """
+        if cls.is_compressed(path):
+            return path
+        folder, filename = os.path.split(path)
+        stem = os.path.splitext(filename)[0]
+        for ext in cls.compressed_formats:
+            candidate = _jpath(folder, 'OGG', stem + ext)
+            if os.path.exists(candidate):
+                return candidate
+        return path
+
+    def uncompressed(self):
+        """ Return the names of sounds without a compressed file
+        """
+        return [name for name, path in self.paths.items()
+                if not self.is_compressed(path)]
+
+    def read_files(self):
+        """ Read every compressed file into memory
+        """
+        for path in self.paths.values():
+            if self.is_compressed(path) and path not in self.files:
+                with open(path, 'rb') as fp:
+                    self.files[path] = fp.read()
+
+    def decode_sound(self, path):
+        data = self.files.get(path)
+        if data is None:
+            if not self.is_compressed(path):
+                return pygame.mixer.Sound(path)
+            with open(path, 'rb') as fp:
+                data = fp.read()
+            self.files[path] = data
+        return pygame.mixer.Sound(file=io.BytesIO(data))
+
+    def stats(self):
+        stats = super().stats()
+        stats['files'] = len(self.files)
+        stats['compressed'] = sum(len(i) for i in self.files.values())
+        return stats
+
+
+def stats():
+    """ Return the stats of each resource map
+    """
+    return {'images': images.stats(),
+            'sounds': sounds.stats(),
+            'maps': maps.stats()}
+
+
+def report(dt=None):
+    for kind, resource_map in (('images', images), ('sounds', sounds),
+                               ('maps', maps)):
+        s = resource_map.stats()
+        logger.info('%s: %d/%d loaded, %.1f/%.1f MB, %d hits, %d misses, '
+                    '%d evictions', kind, s['items'], len(resource_map),
+                    s['size'] / 1048576., s['capacity'] / 1048576.,
+                    s['hits'], s['misses'], s['evictions'])
+
+    s = sounds.stats()
+    logger.info('sound bank: %d compressed files, %.1f MB',
+                s['files'], s['compressed'] / 1048576.)
+
+
+def load(progress=None):
+    """ Set up the resources listed in the config
+
+    Images, sounds and maps are ResourceMaps that load each file when it
+    is first used.  Compressed sound files are read into memory now, and
+    decoded when first played.  Files named in the [resources] preload
+    option, and sounds without a compressed file, are loaded now, decoded
+    in a pool of threads; pygame releases the GIL while decoding.  Images
+    are converted for the display on the calling thread, so the display
+    must be set.  This is a generator that yields each preloaded resource
+    when it is ready, in no particular order.
+
+    :param progress: called with (done, total, name) after each resource
+    """
     from . import config
 
     global sounds, images, music, maps, fonts, level_xml
 
-    sounds = dict()
-    images = dict()
     music = dict()
-    maps = dict()
     fonts = dict()
 
     resource_path = config.get('paths', 'resource-path')
@@ -35,50 +282,82 @@ def load():
 
     level_xml = _jpath(resource_path, 'maps', 'objects.xml')
 
-    for name, filename in config.items('font-files'):
-        path = _jpath(resource_path, 'fonts', filename)
-        fonts[name] = path
+    def get_paths(section, folder):
+        return {name: _jpath(resource_path, folder, filename)
+                for name, filename in config.items(section)}
+
+    def get_budget(option):
+        return config.getint('resources', option) * 1024 * 1024
+
+    fonts = get_paths('font-files', 'fonts')
+    music = get_paths('music-files', 'music')
 
     vol = config.getint('sound', 'sound-volume') / 100.
-    for name, filename in config.items('sound-files'):
-        path = _jpath(resource_path, 'sounds', filename)
-        logger.info("loading %s", path)
-        sound = pygame.mixer.Sound(path)
+
+    def finish_sound(sound):
         sound.set_volume(vol)
-        sounds[name] = sound
-        yield sound
+        return sound
 
-    for name, filename in config.items('image-files'):
-        path = _jpath(resource_path, 'images', filename)
-        logger.info("loading %s", path)
-        image = pygame.image.load(path).convert_alpha()
-        images[name] = image
-        yield image
+    def finish_image(image):
+        return image.convert_alpha()
 
-    for name, filename in config.items('map-files'):
-        path = _jpath(resource_path, 'maps', filename)
-        logger.info("loading %s", path)
-        map = load_pygame(path, pixelalpha=True)
-        maps[name] = map
-        yield map
+    # maps are compiled the first time they are loaded, to skip parsing later
+    cache_path = os.path.abspath(config.get('paths', 'cache-path'))
 
-    for name, filename in config.items('music-files'):
-        path = _jpath(resource_path, 'music', filename)
-        logger.info("loading %s", path)
-        music[name] = path
-        yield path
+    def load_map(path):
+        return mapcache.load_map(path, cache_path, _deferred_image_loader)
 
+    sounds = SoundBank(get_paths('sound-files', 'sounds'), finish_sound,
+                       get_budget('sound-budget'))
+    sounds.read_files()
+    images = ResourceMap(get_paths('image-files', 'images'),
+                         pygame.image.load, finish_image,
+                         get_budget('image-budget'), sizeof_surface)
+    maps = ResourceMap(get_paths('map-files', 'maps'),
+                       load_map, _convert_map,
+                       get_budget('map-budget'), sizeof_map)
 
-def play_music(name):
-    from . import config
+    jobs = list()
+    queued = set()    # (id of resource map, name) of each job
+
+    def queue(resource_map, name):
+        key = id(resource_map), name
+        if key not in queued:
+            queued.add(key)
+            jobs.append((resource_map, name))
+
+    for name in config.get('resources', 'preload').split(','):
+        name = name.strip()
+        if not name:
+            continue
+        for resource_map in (sounds, images, maps):
+            if name in resource_map:
+                queue(resource_map, name)
+                break
+        else:
+            logger.warning('cannot preload unknown resource: %s', name)
+
+    # decoding these on first play would read the disk during the game
+    for name in sounds.uncompressed():
+        queue(sounds, name)
+
+    total = len(jobs)
+    done = 0
+
+    workers = config.getint('resources', 'loader-threads')
+    with ThreadPoolExecutor(max(1, workers)) as pool:
+        futures = dict()
+        for resource_map, name in jobs:
+            path = resource_map.paths[name]
+            logger.info("loading %s", path)
+            future = pool.submit(resource_map.timed_decode, path)
+            futures[future] = resource_map, name
+
+        for future in as_completed(futures):
+            resource_map, name = futures[future]
+            thing = resource_map.add(name, *future.result())
+            done += 1
+            if progress is not None:
+                progress(done, total, name)
+            yield thing
 
-    try:
-        track = music[name]
-        logger.info("playing %s", track)
-        vol = config.getint('sound', 'music-volume') / 100.
-        if vol > 0:
-            pygame.mixer.music.set_volume(vol)
-            pygame.mixer.music.load(track)
-            pygame.mixer.music.play(-1)
-    except pygame.error:
-        pass
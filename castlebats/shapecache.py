@@ -0,0 +1,180 @@
+"""
+Cache of the physics shapes made from a map
+
+pymunktmx reads the objects of a map and makes shapes from them, then the
+level changes some of the shapes by name.  The first time a map is used,
+the finished shapes are described as plain data and written to the cache
+folder.  Later, shapes are made from the descriptions and added to the
+space in bulk, either all of them or only those a level streams in.
+
+Descriptions are named by the hashes of the TMX file and the pymunktmx
+object types file, so changing either one will make new descriptions.
+"""
+import logging
+import os
+import pickle
+
+import pymunk
+from pymunk.vec2d import Vec2d
+from pymunktmx import load_shapes as pymunktmx_load_shapes
+
+from castlebats.mapcache import hash_file
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['load_descriptions', 'describe_shape', 'build_shapes',
+           'get_bounds']
+
+# change if the description format changes, so old files are not used
+version = 1
+
+shape_attributes = ('friction', 'elasticity', 'collision_type', 'layers',
+                    'group', 'sensor')
+
+
+def get_cache_path(tmx_path, xml_path, cache_dir):
+    name = os.path.splitext(os.path.basename(tmx_path))[0]
+    filename = '{}-shapes-{}-{}-{}.pickle'.format(
+        name, hash_file(tmx_path), hash_file(xml_path), version)
+    return os.path.join(cache_dir, filename)
+
+
+def describe_shape(shape):
+    """ Return a dict that has what is needed to make the shape again
+    """
+    body = shape.body
+    position = Vec2d(body.position)
+    angle = body.angle
+
+    def to_body(point):
+        return tuple((Vec2d(point) - position).rotated(-angle))
+
+    if isinstance(shape, pymunk.Circle):
+        geometry = 'circle', shape.radius, tuple(shape.offset)
+    elif isinstance(shape, pymunk.Segment):
+        geometry = 'segment', tuple(shape.a), tuple(shape.b), shape.radius
+    elif isinstance(shape, pymunk.Poly):
+        geometry = 'poly', [to_body(i) for i in shape.get_vertices()]
+    else:
+        raise TypeError('cannot describe shape {}'.format(shape))
+
+    description = {'geometry': geometry,
+                   'static': body.is_static,
+                   'position': tuple(position),
+                   'angle': angle}
+
+    if not body.is_static:
+        description['mass'] = body.mass
+        description['moment'] = body.moment
+
+    for name in shape_attributes:
+        description[name] = getattr(shape, name)
+
+    return description
+
+
+def get_bounds(description):
+    """ Return (left, right) of the shape made from a description
+    """
+    position = Vec2d(description['position'])
+    angle = description['angle']
+    geometry = description['geometry']
+    kind = geometry[0]
+
+    def to_world(point):
+        return Vec2d(point).rotated(angle) + position
+
+    if kind == 'circle':
+        center = to_world(geometry[2])
+        radius = geometry[1]
+        return center.x - radius, center.x + radius
+
+    elif kind == 'segment':
+        a, b = to_world(geometry[1]), to_world(geometry[2])
+        radius = geometry[3]
+        return min(a.x, b.x) - radius, max(a.x, b.x) + radius
+
+    xs = [to_world(i).x for i in geometry[1]]
+    return min(xs), max(xs)
+
+
+def build_shapes(descriptions, space):
+    """ Make shapes from descriptions and add them all to a space
+
+    :param descriptions: dict of name: description
+    :return: dict of name: shape
+    """
+    shapes = dict()
+    things = list()
+    for name, d in descriptions.items():
+        if d['static']:
+            body = pymunk.Body()
+        else:
+            body = pymunk.Body(d['mass'], d['moment'])
+            things.append(body)
+        body.position = d['position']
+        body.angle = d['angle']
+
+        geometry = d['geometry']
+        kind = geometry[0]
+        if kind == 'circle':
+            shape = pymunk.Circle(body, geometry[1], geometry[2])
+        elif kind == 'segment':
+            shape = pymunk.Segment(body, geometry[1], geometry[2], geometry[3])
+        else:
+            shape = pymunk.Poly(body, geometry[1])
+
+        for attr in shape_attributes:
+            setattr(shape, attr, d[attr])
+
+        shapes[name] = shape
+        things.append(shape)
+
+    space.add(*things)
+    return shapes
+
+
+def load_descriptions(tmx_data, xml_path, cache_dir, prepare=None):
+    """ Return descriptions of the shapes of a map, using the cache if possible
+
+    If the shapes are not cached, they are made by pymunktmx in a space of
+    their own, then passed to prepare, then described and cached.  Only
+    changes made by prepare to the body and to the attributes in
+    shape_attributes are cached.
+
+    :param tmx_data: pytmx.TiledMap; filename must be set
+    :param xml_path: path to the pymunktmx object types file
+    :param prepare: optional function called with (name, shape)
+    :return: dict of name: description
+    """
+    path = get_cache_path(tmx_data.filename, xml_path, cache_dir)
+    try:
+        with open(path, 'rb') as fp:
+            descriptions = pickle.load(fp)
+    except FileNotFoundError:
+        pass
+    except (OSError, EOFError, ValueError, pickle.UnpicklingError,
+            AttributeError, ImportError):
+        logger.warning('cannot read cached shapes %s', path, exc_info=True)
+    else:
+        logger.info('loaded cached shapes %s', path)
+        return descriptions
+
+    shapes = pymunktmx_load_shapes(tmx_data, pymunk.Space(), xml_path)
+    if prepare is not None:
+        for name, shape in shapes.items():
+            prepare(name, shape)
+
+    descriptions = {name: describe_shape(shape)
+                    for name, shape in shapes.items()}
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        temp = path + '.tmp'
+        with open(temp, 'wb') as fp:
+            pickle.dump(descriptions, fp, pickle.HIGHEST_PROTOCOL)
+        os.replace(temp, path)
+    except OSError:
+        logger.warning('cannot cache shapes %s', path, exc_info=True)
+
+    return descriptions
+
@@ -0,0 +1,141 @@
+"""
+Snapshots of the simulation
+
+A snapshot has the position, velocity and angle of every body in a space
+in one numpy array, and the state of each model and its sprites.  It is
+restored in place: bodies and models are changed, not rebuilt.  Bodies
+and models that have left the level since the snapshot are not brought
+back, and things added since are left as they are.
+
+Snapshots are kept in a ring buffer, so the newest few seconds can be
+rewound without using more memory as the game goes on.
+"""
+import logging
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['Snapshot', 'SnapshotRing']
+
+
+class Snapshot:
+    """ State of the bodies and models of a level at one time
+    """
+    __slots__ = ('time', 'bodies', 'data', 'models')
+
+    def __init__(self, time, bodies, data, models):
+        self.time = time
+        self.bodies = bodies    # tuple of pymunk.Body
+        self.data = data        # array of x, y, vx, vy, angle, spin per body
+        self.models = models    # list of (model, state, [(sprite, state)])
+
+    @classmethod
+    def capture(cls, time, space, models):
+        bodies = tuple(space.bodies)
+        data = numpy.array([(b.position.x, b.position.y,
+                             b.velocity.x, b.velocity.y,
+                             b.angle, b.angular_velocity) for b in bodies],
+                           numpy.float64).reshape(len(bodies), 6)
+
+        model_states = list()
+        for model in models:
+            sprites = [(sprite, sprite.get_state()) for sprite in model.sprites]
+            model_states.append((model, model.get_state(), sprites))
+
+        return cls(time, bodies, data, model_states)
+
+    def restore(self, space, models, only=None):
+        """ Put the bodies in space and the models back as they were
+
+        :param only: optional model; if given, only it and its bodies are
+            put back, and the rest of the level is left as it is
+        """
+        # models first, since they may move bodies when changing shape
+        for model, state, sprites in self.models:
+            if only is not None and model is not only:
+                continue
+            if model in models:
+                model.set_state(state)
+                for sprite, sprite_state in sprites:
+                    sprite.set_state(sprite_state)
+
+        current = set(space.bodies)
+        if only is not None:
+            current.intersection_update(only.gather_pymunk_objects())
+        for body, (x, y, vx, vy, angle, spin) in zip(self.bodies,
+                                                       self.data.tolist()):
+            if body in current:
+                body.position = x, y
+                body.velocity = vx, vy
+                body.angle = angle
+                body.angular_velocity = spin
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+
+class SnapshotRing:
+    """ Keeps the newest snapshots, forgetting the oldest
+
+    :param capacity: number of snapshots to keep
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = [None] * capacity
+        self._index = 0         # where the next snapshot goes
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def push(self, snapshot):
+        self._items[self._index] = snapshot
+        self._index = (self._index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def pop(self):
+        """ Remove and return the newest snapshot
+        """
+        if not self._count:
+            raise IndexError('pop from empty ring')
+        self._index = (self._index - 1) % self.capacity
+        self._count -= 1
+        snapshot = self._items[self._index]
+        self._items[self._index] = None
+        return snapshot
+
+    def latest(self):
+        """ Return the newest snapshot, or None
+        """
+        if self._count:
+            return self._items[(self._index - 1) % self.capacity]
+
+    def rewind(self, seconds):
+        """ Forget snapshots newer than some seconds before the newest
+
+        The oldest snapshot is kept, if there is any.
+
+        :return: the newest snapshot kept, or None
+        """
+        newest = self.latest()
+        if newest is None:
+            return None
+
+        time = newest.time - seconds
+        while self._count > 1 and self.latest().time > time:
+            self.pop()
+        return self.latest()
+
+    def clear(self):
+        self._items = [None] * self.capacity
+        self._index = 0
+        self._count = 0
+
+    def stats(self):
+        items = [i for i in self._items if i is not None]
+        return {'snapshots': self._count,
+                'capacity': self.capacity,
+                'bytes': sum(i.nbytes for i in items)}
@@ -2,14 +2,19 @@ import itertools
 import logging
 from collections import OrderedDict
 from math import degrees
+from time import perf_counter
 
 import pygame
 import pymunk
-import pyscroll
 from pygame.transform import rotozoom, rotate, flip
 from pymunk.vec2d import Vec2d
 
 from . import resources
+from .lighting import LightMap, LightRenderer, parse_color
+from .overlay import PhysicsOverlay
+from .parallax import split_layers
+from .tilecache import TileChunkCache, ChunkRenderer
+from castlebats.lib2.cache import SurfacePool
 from castlebats import scheduler
 from castlebats import config
 
@@ -81,6 +86,21 @@ class ShapeSprite(pygame.sprite.Sprite):
         position = pymunk.Vec2d(value)
         self.shape.body.position += position
 
+    def get_state(self):
+        """ Return a dict of the state of the sprite, for snapshots
+        """
+        return {'state': list(self.state), 'flip': self.flip}
+
+    def set_state(self, state):
+        self.state = list(state['state'])
+        self.flip = state['flip']
+        self.dirty = True
+
+        # start the animation of the state again
+        change_state = getattr(self, 'change_state', None)
+        if change_state is not None and self.state:
+            change_state()
+
     def update_image(self):
         """
         call this before drawing
@@ -162,15 +182,40 @@ class BoxSprite(ShapeSprite):
 
 class ViewPortGroup(pygame.sprite.Group):
     """ viewports can be attached
+
+    If prerender_lights is false, light chunks are rendered when first
+    drawn, or when the level asks the lightmap for them.
     """
 
-    def __init__(self, space, map_data):
+    def __init__(self, space, map_data, prerender_lights=True):
         super().__init__()
         self.space = space
         self.map_data = map_data
         self.viewports = OrderedDict()
         self.rect = None
 
+        # tiles are rendered once and shared by all the viewports
+        # without a size, the cache is sized by the viewports
+        capacity = None
+        size = config.get('display', 'tile-cache-size').strip()
+        if size:
+            capacity = int(size) * 1024 * 1024
+        screens = config.getint('display', 'tile-cache-screens')
+        self.tile_cache = TileChunkCache(map_data, capacity=capacity,
+                                         screens=screens)
+
+        # buffers of old sizes are kept in case the viewports are resized back
+        self.surface_pool = SurfacePool()
+
+        # static lights are rendered once, here, and shared by the viewports
+        self.lightmap = None
+        if config.getboolean('lighting', 'enabled'):
+            ambient = parse_color(config.get('lighting', 'ambient'))
+            chunk_size = config.getint('lighting', 'chunk-size')
+            self.lightmap = LightMap(map_data.tmx, ambient, chunk_size)
+            if prerender_lights:
+                self.lightmap.prerender()
+
     def set_rect(self, rect):
         self.rect = rect
         self.resize()
@@ -211,6 +256,7 @@ class ViewPortGroup(pygame.sprite.Group):
     def remove_internal(self, sprite):
         if sprite in self.viewports:
             del self.viewports[sprite]
+            self.tile_cache.forget_view(sprite)
             if self.rect is not None:
                 self.resize()
         else:
@@ -218,6 +264,10 @@ class ViewPortGroup(pygame.sprite.Group):
             for vp in self.viewports.keys():
                 if vp.following is sprite:
                     vp.follow(None)
+            if self.lightmap is not None:
+                for light in list(self.lightmap.dynamic):
+                    if light.following is sprite:
+                        self.lightmap.remove_light(light)
             super().remove_internal(sprite)
 
     def clear(self):
@@ -235,7 +285,8 @@ class ViewPort(pygame.sprite.Sprite):
         self.parent = None           # castlebats.Level
         self.rect = None
         self.camera_vector = None
-        self.map_layer = None        # pyscroll renderer
+        self.map_layer = None        # castlebats.tilecache.ChunkRenderer
+        self.parallax_layers = None  # castlebats.parallax.ParallaxLayer
         self.map_height = None
         self.following = None
 
@@ -243,24 +294,46 @@ class ViewPort(pygame.sprite.Sprite):
         self.draw_sprites = config.getboolean('display', 'draw-sprites')
         self.draw_map = config.getboolean('display', 'draw-map')
         self.draw_overlay = config.getboolean('display', 'draw-physics-overlay')
-        self.overlay_surface = None
+        self.overlay = None          # physics overlay renderer
+        self.lighting = None         # castlebats.lighting.LightRenderer
+
+        # seconds spent in each stage of the last draw
+        self.timings = {'sprites': 0.0, 'map': 0.0, 'lighting': 0.0,
+                        'overlay': 0.0}
 
     def set_rect(self, rect):
         logger.info('setting rect')
         md = self.parent.map_data
+        pool = self.parent.surface_pool
         self.rect = pygame.Rect(rect)
-        self.map_layer = pyscroll.BufferedRenderer(md, self.rect.size, alpha=True)
         self.map_height = md.map_size[1] * md.tile_size[1]
+
+        # the renderers are kept between resizes, only their buffers change
+        if self.map_layer is None:
+            # parallax layers get their own renderers and scroll at their own rate
+            cache = self.parent.tile_cache
+            layers, self.parallax_layers = split_layers(cache)
+            self.map_layer = ChunkRenderer(cache, layers, self.rect.size)
+        else:
+            self.map_layer.set_size(self.rect.size)
+        self.parent.tile_cache.fit_view(self, self.rect.size)
+
+        for layer in self.parallax_layers:
+            layer.set_size(self.rect.size, pool)
+
         self.center()
 
+        if self.parent.lightmap is not None:
+            if self.lighting is None:
+                self.lighting = LightRenderer(self.parent.lightmap)
+            self.lighting.set_size(self.rect.size, pool)
+
         if self.draw_overlay:
-            md = self.parent.map_data
-            height = md.map_size[1] * md.tile_size[1]
-            width = md.map_size[0] * md.tile_size[0]
-            self.overlay_surface = pygame.Surface((width, height))
-            self.overlay_surface.set_colorkey((0, 0, 0))
-            alpha = config.getint('display', 'physics-overlay-alpha')
-            self.overlay_surface.set_alpha(alpha)
+            if self.overlay is None:
+                alpha = config.getint('display', 'physics-overlay-alpha')
+                self.overlay = PhysicsOverlay(self.parent.space,
+                                              self.map_height, alpha)
+            self.overlay.set_size(self.rect.size, pool)
 
     def add_internal(self, group):
         try:
@@ -299,6 +372,9 @@ class ViewPort(pygame.sprite.Sprite):
 
         self.center()
 
+        timings = self.timings
+        start = perf_counter()
+
         camera = self.rect.copy()
         camera.center = self.camera_vector
 
@@ -333,19 +409,38 @@ class ViewPort(pygame.sprite.Sprite):
                         new_rect = new_rect.move(xx, yy)
                         to_draw_append((sprite.image, new_rect, 1))
 
+        now = perf_counter()
+        timings['sprites'] = now - start
+        start = now
+
+        if self.draw_background:
+            center = self.map_layer.view_rect.center
+            for layer in self.parallax_layers:
+                layer.draw(surface, self.rect, center)
+        else:
+            surface.fill(0, self.rect)
+
         if self.draw_map and self.draw_sprites:
             self.map_layer.draw(surface, self.rect, surfaces=to_draw)
 
         elif self.draw_map:
             self.map_layer.draw(surface, self.rect)
 
+        now = perf_counter()
+        timings['map'] = now - start
+        start = now
+
+        if self.lighting is not None:
+            self.lighting.draw(surface, self.rect, self.map_layer.view_rect)
+
+        now = perf_counter()
+        timings['lighting'] = now - start
+        start = now
+
         if self.draw_overlay:
-            from pymunk.pygame_util import draw
-            overlay = self.overlay_surface
-            overlay.set_clip(camera)
-            overlay.fill((0, 0, 0))
-            draw(overlay, self.parent.space)
-            surface.blit(overlay, (xx, yy))
+            self.overlay.draw(surface, camera, (xx, yy))
+
+        timings['overlay'] = perf_counter() - start
 
 
 def make_rect(i):
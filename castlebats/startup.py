@@ -0,0 +1,189 @@
+"""
+Profile of starting the game
+
+Records how long each phase of starting takes, up to the first frame
+drawn, the time spent importing each module, and the time spent loading
+each resource.  This module only uses the standard library, so it can
+be imported before anything that should be timed.
+
+    profile = StartupProfile()
+    profile.time_imports()
+    ...
+    profile.mark('imports')
+    ...
+    profile.mark('first frame')
+    profile.write('startup.json')
+"""
+import builtins
+import importlib.util
+import json
+import logging
+import sys
+import threading
+from time import perf_counter
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ImportTimer', 'StartupProfile']
+
+
+class ImportTimer:
+    """ Times the first import of each module
+
+    Time is given to the name in the import statement, so "import a.b"
+    includes the time to import "a", if it was not imported yet.  Self
+    time does not include other imports timed while importing.  Only
+    imports on the thread that installed the timer are timed.
+    """
+
+    def __init__(self):
+        self.records = list()    # [name, total seconds, self seconds]
+        self._stack = list()
+        self._original = None
+        self._thread = None
+
+    def install(self):
+        self._original = builtins.__import__
+        self._thread = threading.get_ident()
+        builtins.__import__ = self._import
+
+    def uninstall(self):
+        if self._original is not None:
+            builtins.__import__ = self._original
+            self._original = None
+
+    @staticmethod
+    def resolve(name, globals, level):
+        if not level:
+            return name
+        package = globals.get('__package__')
+        if not package:
+            package = globals['__name__']
+            if '__path__' not in globals:
+                package = package.rpartition('.')[0]
+        return importlib.util.resolve_name('.' * level + name, package)
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original
+        if not threading.get_ident() == self._thread:
+            return original(name, globals, locals, fromlist, level)
+
+        try:
+            fullname = self.resolve(name, globals or {}, level)
+        except (KeyError, ImportError, ValueError):
+            fullname = name
+
+        if fullname in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+
+        record = [fullname, 0.0, 0.0]
+        stack = self._stack
+        stack.append(record)
+        start = perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            total = perf_counter() - start
+            stack.pop()
+            record[1] = total
+            record[2] += total
+            if stack:
+                stack[-1][2] -= total
+            self.records.append(record)
+
+
+class StartupProfile:
+    """ Times the phases of starting the game
+
+    :param started: perf_counter time the game started, or now
+    """
+
+    def __init__(self, started=None):
+        if started is None:
+            started = perf_counter()
+        self.started = started
+        self.phases = list()     # (name, seconds since started)
+        self.import_timer = None
+
+    def time_imports(self):
+        """ Start timing imports, until finish is called
+        """
+        self.import_timer = ImportTimer()
+        self.import_timer.install()
+
+    def mark(self, name):
+        """ Record that a phase has ended
+
+        :return: seconds since started
+        """
+        elapsed = perf_counter() - self.started
+        self.phases.append((name, elapsed))
+        return elapsed
+
+    def finish(self):
+        if self.import_timer is not None:
+            self.import_timer.uninstall()
+
+    def report(self):
+        """ Return a dict of the times, in milliseconds
+        """
+        from castlebats import resources
+
+        phases = list()
+        last = 0.0
+        for name, elapsed in self.phases:
+            phases.append({'name': name,
+                           'ms': (elapsed - last) * 1000,
+                           'elapsed_ms': elapsed * 1000})
+            last = elapsed
+
+        imports = list()
+        if self.import_timer is not None:
+            records = sorted(self.import_timer.records,
+                             key=lambda i: i[2], reverse=True)
+            imports = [{'module': name,
+                        'self_ms': self_time * 1000,
+                        'total_ms': total * 1000}
+                       for name, total, self_time in records]
+
+        loaded = list()
+        for kind in ('images', 'sounds', 'maps'):
+            resource_map = getattr(resources, kind)
+            if resource_map is None:
+                continue
+            for name, (decode, finish) in resource_map.load_times.items():
+                loaded.append({'kind': kind, 'name': name,
+                               'decode_ms': decode * 1000,
+                               'finish_ms': finish * 1000})
+        loaded.sort(key=lambda i: i['decode_ms'] + i['finish_ms'],
+                    reverse=True)
+
+        first_frame = dict(self.phases).get('first frame')
+        if first_frame is not None:
+            first_frame *= 1000
+
+        return {'first_frame_ms': first_frame,
+                'phases': phases,
+                'imports': imports,
+                'resources': loaded}
+
+    def write(self, path):
+        """ Write the report to a file as json, and a summary to stdout
+        """
+        report = self.report()
+        with open(path, 'w') as fp:
+            json.dump(report, fp, indent=2)
+
+        if report['first_frame_ms'] is not None:
+            print('first frame after {:.1f} ms'.format(
+                report['first_frame_ms']))
+        for phase in report['phases']:
+            print('  {:<16} {:8.1f} ms'.format(phase['name'], phase['ms']))
+        print('slowest imports (self time):')
+        for item in report['imports'][:10]:
+            print('  {:<48} {:8.1f} ms'.format(item['module'], item['self_ms']))
+        print('slowest resources:')
+        for item in report['resources'][:10]:
+            print('  {:<48} {:8.1f} ms'.format(
+                item['name'], item['decode_ms'] + item['finish_ms']))
+        print('report written to {}'.format(path))
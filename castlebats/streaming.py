@@ -0,0 +1,143 @@
+"""
+Streaming of the parts of a level near the camera
+
+The level is split into chunks: columns of a fixed width.  Each thing in
+the level, like a shape or an actor, covers one or more chunks.  When the
+camera comes within the load distance of a chunk, the chunk is loaded,
+and things in it that are not loaded yet are loaded.  When the camera is
+farther than the unload distance, the chunk is unloaded, and things that
+are not in another loaded chunk are unloaded.
+
+The unload distance should be larger than the load distance, so a chunk
+at the edge is not loaded and unloaded over and over.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['ChunkStreamer']
+
+
+class ChunkStreamer:
+    """ Loads and unloads things as the camera moves along a level
+
+    :param chunk_width: pixels
+    :param load_distance: pixels from the camera to load a chunk
+    :param unload_distance: pixels from the camera to unload a chunk
+    :param load: function called with a list of keys of things to load
+    :param unload: function called with a list of keys of things to unload
+    """
+
+    def __init__(self, chunk_width, load_distance, unload_distance,
+                 load, unload):
+        assert (unload_distance >= load_distance)
+        self.chunk_width = chunk_width
+        self.load_distance = load_distance
+        self.unload_distance = unload_distance
+        self.load = load
+        self.unload = unload
+        self.spans = dict()     # key: (first chunk, last chunk)
+        self.chunks = dict()    # chunk: list of keys
+        self.loaded = set()     # chunks that are loaded
+        self.counts = dict()    # key: number of loaded chunks it is in
+        self.loads = 0
+        self.unloads = 0
+
+    def add(self, key, left, right):
+        """ Add a thing that covers the level from left to right, in pixels
+
+        If a chunk it is in is loaded, the thing is loaded now.
+        """
+        width = self.chunk_width
+        first, last = int(left // width), int(right // width)
+        self.spans[key] = first, last
+        count = 0
+        for index in range(first, last + 1):
+            self.chunks.setdefault(index, list()).append(key)
+            if index in self.loaded:
+                count += 1
+
+        if count:
+            self.counts[key] = count
+            self.loads += 1
+            self.load([key])
+
+    def is_loaded(self, key):
+        return key in self.counts
+
+    def distance(self, index, x):
+        """ Return the pixels from x to a chunk, or 0 if x is in it
+        """
+        left = index * self.chunk_width
+        right = left + self.chunk_width
+        if x < left:
+            return left - x
+        if x > right:
+            return x - right
+        return 0
+
+    def update(self, x):
+        """ Load and unload chunks for a camera at x
+
+        :return: number of chunks loaded or unloaded
+        """
+        width = self.chunk_width
+        distance = self.distance
+        changed = 0
+
+        for index in list(self.loaded):
+            if distance(index, x) > self.unload_distance:
+                self.unload_chunk(index)
+                changed += 1
+
+        first = int((x - self.load_distance) // width)
+        last = int((x + self.load_distance) // width)
+        for index in range(first, last + 1):
+            if index not in self.loaded and index in self.chunks:
+                if distance(index, x) <= self.load_distance:
+                    self.load_chunk(index)
+                    changed += 1
+
+        return changed
+
+    def load_chunk(self, index):
+        logger.info('loading chunk %d', index)
+        self.loaded.add(index)
+        counts = self.counts
+        keys = list()
+        for key in self.chunks.get(index, ()):
+            count = counts.get(key, 0)
+            counts[key] = count + 1
+            if not count:
+                keys.append(key)
+
+        if keys:
+            self.loads += len(keys)
+            self.load(keys)
+
+    def unload_chunk(self, index):
+        logger.info('unloading chunk %d', index)
+        self.loaded.discard(index)
+        counts = self.counts
+        keys = list()
+        for key in self.chunks.get(index, ()):
+            count = counts[key] - 1
+            if count:
+                counts[key] = count
+            else:
+                del counts[key]
+                keys.append(key)
+
+        if keys:
+            self.unloads += len(keys)
+            self.unload(keys)
+
+    def unload_all(self):
+        for index in list(self.loaded):
+            self.unload_chunk(index)
+
+    def stats(self):
+        return {'chunks': len(self.loaded),
+                'things': len(self.counts),
+                'loads': self.loads,
+                'unloads': self.unloads}
@@ -0,0 +1,251 @@
+"""
+Text drawn from glyph atlases
+
+Each glyph of a font is rendered once per color into an atlas surface.
+Text is measured with the cached advance of each glyph and drawn by
+blitting glyphs from the atlas, so changing text, like a score, does not
+need the font renderer.
+
+    atlas = get_atlas(get_font('default', 12), (255, 255, 255))
+    atlas.draw(surface, 'score 100', (10, 10))
+"""
+import pygame
+
+from . import resources
+
+__all__ = ['GlyphAtlas', 'get_atlas', 'get_font']
+
+_fonts = dict()
+_atlases = dict()
+
+
+def get_font(name=None, size=16):
+    """ Return a font from the font resources, loading it only once
+
+    :param name: name in the [font-files] config, or None for pygame's font
+    """
+    key = name, size
+    try:
+        return _fonts[key]
+    except KeyError:
+        path = None if name is None else resources.fonts[name]
+        font = pygame.font.Font(path, size)
+        _fonts[key] = font
+        return font
+
+
+def get_atlas(font, color, bgcolor=None, aa=False, colorkey=False):
+    """ Return the atlas of a font in a color, rendering it only once
+
+    :param colorkey: if True, the bgcolor will not be drawn
+    """
+    color = tuple(pygame.Color(*color))
+    if bgcolor is not None:
+        bgcolor = tuple(pygame.Color(*bgcolor))
+
+    key = font, color, bgcolor, aa, colorkey
+    try:
+        return _atlases[key]
+    except KeyError:
+        atlas = GlyphAtlas(font, color, bgcolor, aa, colorkey)
+        _atlases[key] = atlas
+        return atlas
+
+
+class GlyphAtlas:
+    """ Draws text with glyphs rendered once
+
+    Printable ascii is rendered into the atlas when it is created, other
+    characters are rendered the first time they are drawn.  Without a
+    bgcolor, or with colorkey set, the text will have a transparent
+    background.
+    """
+    preload = ''.join(chr(i) for i in range(32, 127))
+
+    def __init__(self, font, color, bgcolor=None, aa=False, colorkey=False):
+        self.font = font
+        self.color = color
+        self.bgcolor = bgcolor
+        self.aa = aa
+        self.colorkey = colorkey and bgcolor is not None
+        # set if drawn glyphs completely cover the old text on a surface
+        self.covers = bgcolor is not None and not self.colorkey
+        self.height = font.get_height()
+        self.glyphs = dict()      # char: (surface, area of surface)
+        self.advances = dict()    # char: pixels to move after drawing char
+        self.image = self._build(self.preload)
+
+    def _render(self, text):
+        if self.bgcolor is None:
+            return self.font.render(text, self.aa, self.color)
+        image = self.font.render(text, self.aa, self.color, self.bgcolor)
+        if self.colorkey:
+            image.set_colorkey(self.bgcolor)
+        return image
+
+    def _build(self, chars):
+        images = [self._render(char) for char in chars]
+        width = sum(i.get_width() for i in images)
+        image = self.new_surface((width, self.height))
+
+        x = 0
+        for char, glyph in zip(chars, images):
+            w = glyph.get_width()
+            image.blit(glyph, (x, 0))
+            self.glyphs[char] = image, pygame.Rect(x, 0, w, self.height)
+            self._check_cover(glyph, char)
+            x += w
+
+        return image
+
+    def new_surface(self, size):
+        """ Return a surface cleared to the background of the text
+        """
+        if self.bgcolor is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA)
+        else:
+            surface = pygame.Surface(size)
+            if self.colorkey:
+                surface.set_colorkey(self.bgcolor)
+        self.clear(surface)
+        return surface
+
+    def clear(self, surface):
+        if self.bgcolor is None:
+            surface.fill((0, 0, 0, 0))
+        else:
+            surface.fill(self.bgcolor)
+
+    def glyph(self, char):
+        try:
+            return self.glyphs[char]
+        except KeyError:
+            image = self._render(char)
+            glyph = image, image.get_rect()
+            self.glyphs[char] = glyph
+            self._check_cover(image, char)
+            return glyph
+
+    def _check_cover(self, image, char):
+        if not image.get_size() == (self.advance(char), self.height):
+            self.covers = False
+
+    def advance(self, char):
+        try:
+            return self.advances[char]
+        except KeyError:
+            metrics = self.font.metrics(char)[0]
+            if metrics is None:
+                advance = self.font.size(char)[0]
+            else:
+                advance = metrics[4]
+            self.advances[char] = advance
+            return advance
+
+    def width(self, text):
+        advances = self.advances
+        advance = self.advance
+        total = 0
+        for char in text:
+            try:
+                total += advances[char]
+            except KeyError:
+                total += advance(char)
+        return total
+
+    def size(self, text):
+        return self.width(text), self.height
+
+    def draw(self, surface, text, position):
+        """ Draw one line of text
+
+        :return: rect of the area drawn
+        """
+        blit = surface.blit
+        glyphs = self.glyphs
+        advances = self.advances
+        left, y = position
+        x = left
+        for char in text:
+            try:
+                image, area = glyphs[char]
+                advance = advances[char]
+            except KeyError:
+                image, area = self.glyph(char)
+                advance = self.advance(char)
+            blit(image, (x, y), area)
+            x += advance
+
+        return pygame.Rect(left, y, x - left, self.height)
+
+    def redraw(self, surface, text):
+        """ Replace the text on a surface from render
+
+        The surface must be the width of the new text.
+        """
+        if not self.covers:
+            self.clear(surface)
+        return self.draw(surface, text, (0, 0))
+
+    def render(self, text):
+        """ Return a new surface with one line of text
+        """
+        width = max(1, self.width(text))
+        surface = self.new_surface((width, self.height))
+        self.draw(surface, text, (0, 0))
+        return surface
+
+    def wrap(self, text, width):
+        """ Split text into lines that fit a width
+
+        Lines are broken at newlines, and at the last space that fits.
+        Words too long for a line are broken anywhere.
+
+        :return: list of (start, end) indexes of each line in the text
+        """
+        advances = self.advances
+        advance = self.advance
+        lines = list()
+        length = len(text)
+        start = index = 0
+        space = -1
+        line_width = 0
+
+        while index < length:
+            char = text[index]
+            if char == '\n':
+                lines.append((start, index))
+                start = index = index + 1
+                space = -1
+                line_width = 0
+                continue
+
+            try:
+                w = advances[char]
+            except KeyError:
+                w = advance(char)
+
+            if line_width + w > width and index > start:
+                if char == ' ':
+                    # the text before the space fits
+                    lines.append((start, index))
+                    start = index = index + 1
+                elif space > start:
+                    lines.append((start, space))
+                    start = index = space + 1
+                else:
+                    lines.append((start, index))
+                    start = index
+                space = -1
+                line_width = 0
+                continue
+
+            if char == ' ':
+                space = index
+            line_width += w
+            index += 1
+
+        if start < length:
+            lines.append((start, length))
+
+        return lines
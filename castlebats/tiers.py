@@ -0,0 +1,136 @@
+"""
+Tiers of how often models think, by distance from the camera
+
+Models near the camera have their physics hook called every frame by the
+level.  Models farther away are called every few simulation frames, and
+models far away are called rarely.  Each tier is split into one group
+per frame of its period, and one group is called each frame, so the
+calls are spread over the period instead of all being on one frame.
+
+Tiers count simulation frames, not time, so a replay calls the same
+hooks on the same frames as the session it was recorded from.
+
+Tiers are chosen again every so often, using the level's grid, so it
+costs about the same however many models are far away.  The hero is
+always near.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['TickTiers', 'NEAR', 'MID', 'FAR']
+
+NEAR = 0
+MID = 1
+FAR = 2
+
+
+class TickTiers:
+    """ Calls the physics hook of models as often as they matter
+
+    :param level: castlebats.level_state.Level
+    :param near_distance: pixels from the camera of near models
+    :param mid_distance: pixels from the camera of mid range models
+    :param periods: frames between hooks of mid range and far models
+    :param tier_period: frames between choosing the tiers again
+    """
+
+    def __init__(self, level, near_distance, mid_distance, periods,
+                 tier_period=15):
+        assert (mid_distance >= near_distance)
+        assert (min(periods) > 0 and tier_period > 0)
+        self.level = level
+        self.near_distance = near_distance
+        self.mid_distance = mid_distance
+        self.tier_period = tier_period
+        self.frame = 0
+        self.every_frame = set()    # near models, called by the level
+        self.tiers = dict()         # model: tier
+        self.places = dict()        # model: group, for mid and far models
+        self.groups = {MID: [list() for i in range(periods[0])],
+                       FAR: [list() for i in range(periods[1])]}
+        self.calls = {NEAR: 0, MID: 0, FAR: 0}
+        self._near = list()
+        self._mid = list()
+
+    def add(self, model):
+        """ Add a model as near, until the tiers are chosen again
+        """
+        self.tiers[model] = NEAR
+        self.every_frame.add(model)
+
+    def remove(self, model):
+        self._leave(model, self.tiers.pop(model))
+
+    def move(self, model, tier):
+        """ Put a model in another tier
+        """
+        old = self.tiers[model]
+        if old == tier:
+            return
+
+        self._leave(model, old)
+        self.tiers[model] = tier
+        if tier == NEAR:
+            self.every_frame.add(model)
+        else:
+            group = min(self.groups[tier], key=len)
+            group.append(model)
+            self.places[model] = group
+
+    def _leave(self, model, tier):
+        if tier == NEAR:
+            self.every_frame.discard(model)
+        else:
+            self.places.pop(model).remove(model)
+
+    def update(self):
+        """ Call the hooks of the mid range and far models due this frame
+
+        Called by the level once each simulation frame, after the hooks
+        of the near models.
+        """
+        frame = self.frame
+        self.frame += 1
+        self.calls[NEAR] += len(self.every_frame)
+
+        for tier in (MID, FAR):
+            groups = self.groups[tier]
+            group = groups[frame % len(groups)]
+            for model in group:
+                if model.alive:
+                    model.physics_hook()
+            self.calls[tier] += len(group)
+
+        if not frame % self.tier_period:
+            self.choose_tiers()
+
+    def choose_tiers(self):
+        level = self.level
+        center = level.get_camera_position()
+        if center is None:
+            return
+
+        near = level.models_near(center, self.near_distance, out=self._near)
+        mid = level.models_near(center, self.mid_distance, out=self._mid)
+        tiers = self.tiers
+        chosen = dict.fromkeys(mid, MID)
+        chosen.update(dict.fromkeys(near, NEAR))
+
+        move = self.move
+        for model, old in tiers.items():
+            if model.kind == 'hero':
+                tier = NEAR
+            else:
+                tier = chosen.get(model, FAR)
+            if not old == tier:
+                move(model, tier)
+
+    def stats(self):
+        counts = {NEAR: 0, MID: 0, FAR: 0}
+        for tier in self.tiers.values():
+            counts[tier] += 1
+        return {'near': counts[NEAR], 'mid': counts[MID], 'far': counts[FAR],
+                'near_calls': self.calls[NEAR],
+                'mid_calls': self.calls[MID],
+                'far_calls': self.calls[FAR]}
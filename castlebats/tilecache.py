@@ -0,0 +1,192 @@
+import logging
+from itertools import product
+
+import pygame
+from pytmx import TiledTileLayer
+
+from castlebats.lib2.cache import LRUCache, sizeof_surface
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['TileChunkCache', 'ChunkRenderer']
+
+
+class TileChunkCache:
+    """ Renders each tile layer of a map into chunks, and keeps them
+
+    One cache is shared by every renderer that draws the same map data,
+    so tiles seen by two viewports are only rendered and stored once.
+    Chunks are square, 'chunk_size' tiles on a side, and are forgotten
+    when the cache grows past 'capacity' bytes.  Chunks without any
+    tiles are remembered as None and never blitted.
+
+    If capacity is None, the cache keeps about 'screens' screens of
+    chunks of every layer for each view passed to fit_view.
+    """
+    empty = object()
+
+    def __init__(self, data, chunk_size=16, capacity=None, screens=2):
+        self.data = data
+        self.chunk_size = chunk_size
+        self.screens = screens
+        tw, th = data.tile_size
+        mw, mh = data.map_size
+        self.chunk_pixel_size = chunk_size * tw, chunk_size * th
+        self.map_rect = pygame.Rect(0, 0, mw * tw, mh * th)
+        self.fixed = capacity is not None
+        self._views = dict()    # view: bytes of chunks kept for it
+        self._chunks = LRUCache(capacity or 0, self._sizeof)
+
+    def fit_view(self, view, size):
+        """ Keep enough chunks for a view of some size
+
+        Does nothing if the capacity was given.
+
+        :param view: any hashable object, like the viewport
+        :param size: (width, height) of the view in pixels
+        """
+        if self.fixed:
+            return
+
+        cw, ch = self.chunk_pixel_size
+        layers = sum(1 for layer in self.data.tmx.layers
+                     if isinstance(layer, TiledTileLayer) and layer.visible)
+
+        # a view not lined up with the chunks touches one more of each
+        columns = -(-size[0] // cw) + 1
+        rows = -(-size[1] // ch) + 1
+        chunk_bytes = cw * ch * 4
+        self._views[view] = (self.screens * columns * rows * layers *
+                             chunk_bytes)
+        self._resize()
+
+    def forget_view(self, view):
+        if self._views.pop(view, None) is not None:
+            self._resize()
+
+    def _resize(self):
+        self._chunks.capacity = sum(self._views.values())
+        self._chunks.trim()
+        logger.info('tile cache capacity %.1f MB',
+                    self._chunks.capacity / 1048576.)
+
+    @staticmethod
+    def _sizeof(chunk):
+        if chunk is None:
+            return 0
+        return sizeof_surface(chunk)
+
+    def stats(self):
+        return self._chunks.stats()
+
+    def get_chunk(self, layer, cx, cy):
+        """ Return the surface of a chunk, or None if it has no tiles
+        """
+        key = layer, cx, cy
+        chunk = self._chunks.get(key, self.empty)
+        if chunk is self.empty:
+            chunk = self.render_chunk(layer, cx, cy)
+            self._chunks[key] = chunk
+        return chunk
+
+    def render_chunk(self, layer, cx, cy):
+        tw, th = self.data.tile_size
+        mw, mh = self.data.map_size
+        size = self.chunk_size
+        get_tile = self.data.get_tile_image
+
+        x1, y1 = cx * size, cy * size
+        xs = range(x1, min(x1 + size, mw))
+        ys = range(y1, min(y1 + size, mh))
+
+        chunk = None
+        for y, x in product(ys, xs):
+            tile = get_tile((x, y, layer))
+            if tile:
+                if chunk is None:
+                    chunk = pygame.Surface(self.chunk_pixel_size, pygame.SRCALPHA)
+                chunk.blit(tile, ((x - x1) * tw, (y - y1) * th))
+
+        return chunk
+
+    def draw_layer(self, surface, layer, rect, offset):
+        """ Draw part of a layer
+
+        :param surface: destination surface
+        :param layer: layer number
+        :param rect: area of the map to draw, in pixels
+        :param offset: added to map coordinates to get surface coordinates
+        """
+        rect = pygame.Rect(rect).clip(self.map_rect)
+        if not rect:
+            return
+
+        cw, ch = self.chunk_pixel_size
+        ox, oy = offset
+        blit = surface.blit
+        get_chunk = self.get_chunk
+
+        for cy in range(rect.top // ch, (rect.bottom - 1) // ch + 1):
+            for cx in range(rect.left // cw, (rect.right - 1) // cw + 1):
+                chunk = get_chunk(layer, cx, cy)
+                if chunk is not None:
+                    blit(chunk, (cx * cw + ox, cy * ch + oy))
+
+
+class ChunkRenderer:
+    """ Draws tile layers of a map from a shared TileChunkCache
+
+    The renderer does not own any buffers, so it is cheap to create,
+    and several can draw the same map without rendering tiles twice.
+
+    Like pyscroll, surfaces passed to draw are interlaced with the
+    tiles: each is drawn over the layers with a number less than or
+    equal to its own layer, and under the others.
+    """
+
+    def __init__(self, cache, layers, size):
+        self.cache = cache
+        self.layers = tuple(sorted(layers))
+        self.view_rect = pygame.Rect(0, 0, 0, 0)
+        self.set_size(size)
+
+    def set_size(self, size):
+        self.view_rect.size = size
+
+    def center(self, coords):
+        """ Center the view on a pixel, but stay inside the map
+        """
+        self.view_rect.center = [int(round(i)) for i in coords]
+        self.view_rect.clamp_ip(self.cache.map_rect)
+
+    def draw(self, surface, rect, surfaces=None):
+        """ Draw the map onto a surface
+
+        :param surface: destination surface
+        :param rect: area of the destination to draw to
+        :param surfaces: optional sequence of (surface, rect, layer) tuples
+        """
+        view = self.view_rect
+        offset = rect.left - view.left, rect.top - view.top
+        draw_layer = self.cache.draw_layer
+        blit = surface.blit
+
+        if surfaces:
+            pending = sorted(surfaces, key=lambda i: i[2])
+        else:
+            pending = list()
+        index = 0
+
+        clip = surface.get_clip()
+        surface.set_clip(rect)
+
+        for layer in self.layers:
+            while index < len(pending) and pending[index][2] < layer:
+                blit(pending[index][0], pending[index][1])
+                index += 1
+            draw_layer(surface, layer, view, offset)
+
+        for image, image_rect, layer in pending[index:]:
+            blit(image, image_rect)
+
+        surface.set_clip(clip)
@@ -1,28 +1,44 @@
 import pygame
 
-from . import resources
+from .text import get_atlas, get_font
 
 __all__ = ['TextSprite']
 
 
 class TextSprite(pygame.sprite.DirtySprite):
-    def __init__(self, text, color=None, bgcolor=None):
+    """ Sprite that shows one line of text
+
+    Text is drawn from a glyph atlas, so changing it every frame is cheap.
+    The image is reused if the new text has the same width.
+    """
+
+    def __init__(self, text, color=None, bgcolor=None, font='default', size=12):
         super().__init__()
         self._text_object = None
         self._text = None
         self._color = None
         self._bgcolor = None
+        self._atlas = None
         self.text = text
         self.color = color
         self.bgcolor = bgcolor
         self.image = None
         self.rect = pygame.Rect(0, 0, 1, 1)
-        self.font = pygame.font.Font(resources.fonts['default'], 12)
+        self.font = get_font(font, size)
         self.update_image()
 
     def update_image(self):
-        self.image = self.font.render(self._text, 0, self._color, self._bgcolor)
-        self.rect.size = self.image.get_size()
+        if self._atlas is None:
+            self._atlas = get_atlas(self.font, self._color, self._bgcolor)
+
+        atlas = self._atlas
+        size = max(1, atlas.width(self._text)), atlas.height
+        if self.image is None or not self.image.get_size() == size:
+            self.image = atlas.render(self._text)
+        else:
+            atlas.redraw(self.image, self._text)
+
+        self.rect.size = size
         self.dirty = 1
 
     @property
@@ -38,7 +54,8 @@ class TextSprite(pygame.sprite.DirtySprite):
 
         if not color == self._bgcolor:
             self._bgcolor = color
-            self.update()
+            self._atlas = None
+            self.update_image()
 
     @property
     def color(self):
@@ -53,7 +70,8 @@ class TextSprite(pygame.sprite.DirtySprite):
 
         if not color == self.color:
             self._color = color
-            self.update()
+            self._atlas = None
+            self.update_image()
 
     @property
     def text(self):
@@ -70,4 +88,4 @@ class TextSprite(pygame.sprite.DirtySprite):
         if not text == self._text:
             self._text_object = value
             self._text = text
-            self.update()
+            self.update_image()
@@ -0,0 +1,121 @@
+import collections
+import logging
+import time
+
+import pygame
+
+logger = logging.getLogger(__name__)
+
+__all__ = ['Upscaler']
+
+
+class Upscaler:
+    """ Scales the low resolution game surface up to the display
+
+    scaler = Upscaler(screen, 2)
+    scaler.source.fill(0)
+    scaler.scale()
+
+    The source surface and any intermediate buffers are allocated once,
+    and share the pixel format of the display so that no conversion
+    happens during the scale.
+
+    filters:
+        scale    => nearest neighbor.  fastest for integer factors
+        scale2x  => 'scale2x' (EPX) smoothing for power-of-two factors
+
+    non-integer factors will always use smoothscale if 'smooth' is set,
+    otherwise they fall back to nearest neighbor.
+    """
+    filters = ('scale', 'scale2x')
+
+    def __init__(self, dest, factor=2, filter='scale', smooth=True):
+        if filter not in self.filters:
+            logger.error('unknown upscale filter: %s', filter)
+            raise ValueError
+
+        self.factor = factor
+        self.filter = filter
+        self.smooth = smooth
+        self.dest = None
+        self.source = None
+        self.times = collections.deque(maxlen=120)
+        self._intermediates = list()
+        self._method = None
+        self.set_dest(dest)
+
+    def set_dest(self, dest):
+        """ Set the destination surface and reallocate the buffers
+
+        This is an expensive operation, do only when the display changes.
+        """
+        self.dest = dest
+        dest_size = dest.get_size()
+        source_size = tuple(int(i / self.factor) for i in dest_size)
+
+        if self.source is None or not self.source.get_size() == source_size:
+            self.source = pygame.Surface(source_size, 0, dest)
+
+        self._intermediates = list()
+        self._method = self._choose_method(source_size, dest_size)
+        logger.info('upscaling %s to %s with %s', source_size, dest_size,
+                    self._method.__name__)
+
+    def _choose_method(self, source_size, dest_size):
+        sw, sh = source_size
+        dw, dh = dest_size
+        integer = dw % sw == 0 and dh % sh == 0 and dw // sw == dh // sh
+
+        if not integer:
+            if self.smooth and self.dest.get_bitsize() in (24, 32):
+                return self._smoothscale
+            return self._scale
+
+        factor = dw // sw
+        if self.filter == 'scale2x' and factor > 1 and not factor & (factor - 1):
+            # all but the last pass of scale2x need their own buffer
+            size = sw, sh
+            while factor > 2:
+                size = size[0] * 2, size[1] * 2
+                self._intermediates.append(pygame.Surface(size, 0, self.dest))
+                factor //= 2
+            return self._scale2x
+
+        return self._scale
+
+    def _scale(self):
+        pygame.transform.scale(self.source, self.dest.get_size(), self.dest)
+
+    def _smoothscale(self):
+        pygame.transform.smoothscale(self.source, self.dest.get_size(), self.dest)
+
+    def _scale2x(self):
+        scale2x = pygame.transform.scale2x
+        surface = self.source
+        for buffer in self._intermediates:
+            scale2x(surface, buffer)
+            surface = buffer
+        scale2x(surface, self.dest)
+
+    def scale(self):
+        """ Scale the source surface onto the destination
+
+        :return: time taken, in seconds
+        """
+        start = time.perf_counter()
+        self._method()
+        elapsed = time.perf_counter() - start
+        self.times.append(elapsed)
+        return elapsed
+
+    @property
+    def average_time(self):
+        """ Average time of the recent scales, in seconds
+        """
+        try:
+            return sum(self.times) / len(self.times)
+        except ZeroDivisionError:
+            return 0.0
+
+    def report(self, dt=None):
+        logger.info('upscale: %.3f ms/frame', self.average_time * 1000)
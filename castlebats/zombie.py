@@ -18,22 +18,17 @@ class Model(models.UprightModel):
 
     generic bad guy will just move left or right until it goes off screen
     """
+    kind = 'enemy'
     RIGHT = 1
     LEFT = -1
 
     def __init__(self):
         super().__init__()
-        self.sensor = None
         self.move_power = config.getint('zombie', 'move')
         self.jump_power = config.getint('zombie', 'jump')
         self.sprite_direction = self.LEFT
 
-    def kill(self):
-        space = self.sprite.shape.body._space
-        space.remove(self.sensor)
-        super().kill()
-
-    def physics_hook(self, dt):
+    def physics_hook(self):
         if self.motor.rate == 0:
             self.accelerate(self.sprite_direction)
 
@@ -119,7 +114,8 @@ def build(space):
     body_shape.layers = layers
     body_shape.friction = 1
     body_sprite = Sprite(body_shape)
-    space.add(body_body, body_shape)
+
+    model.attach_sprite(body_sprite, name='sprite')
 
     # build feet
     layers = 2
@@ -127,8 +123,9 @@ def build(space):
     feet_shape.elasticity = 0
     feet_shape.layers = layers
     feet_shape.friction = pymunk.inf
-    feet_sprite = ShapeSprite(feet_shape)
-    space.add(feet_body, feet_shape)
+
+    model.attach_thing(feet_body, name='feet')
+    model.attach_thing(feet_shape)
 
     # jump/collision sensor
     size = body_rect.width, body_rect.height * 1.05
@@ -137,7 +134,7 @@ def build(space):
     sensor.collision_type = collisions.enemy
     sensor.sensor = True
     sensor.model = model
-    space.add(sensor)
+    model.attach_thing(sensor, name='sensor')
 
     # attach feet to body
     feet_body.position = (body_body.position.x,
@@ -145,15 +142,12 @@ def build(space):
 
     # motor and joint for feet
     motor = pymunk.SimpleMotor(body_body, feet_body, 0.0)
+    model.connect_bodies(motor, body_body, feet_body, name='motor')
+
     joint = pymunk.PivotJoint(
             body_body, feet_body, feet_body.position, (0, 0))
-    space.add(motor, joint)
-
-    # the model is used to gameplay logic
-    model.sprite = body_sprite
-    model.feet = feet_sprite
-    model.motor = motor
-    model.joint = joint
-    model.sensor = sensor
+    model.connect_bodies(joint, body_body, feet_body, name='joint')
+
+    model.connect_to_space(space)
 
     return model
@@ -0,0 +1,24 @@
+import os
+import sys
+
+# benchmarks don't need a window or sound card
+# these must be set before pygame is imported
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+from castlebats import config
+
+# load configuration
+filename = os.path.join('config', 'castlebats.ini')
+config.read(filename)
+
+import logging
+logging.basicConfig(
+    level=logging.WARNING,
+    format="%(name)s:%(filename)s:%(lineno)d:%(levelname)s: %(message)s")
+
+from castlebats import benchmark
+
+
+if __name__ == '__main__':
+    sys.exit(benchmark.main(sys.argv[1:]))
@@ -1,9 +1,32 @@
-from castlebats import config
+import time
+started = time.perf_counter()
+
+import argparse
 import os
+import sys
+
+from castlebats.startup import StartupProfile
+
+parser = argparse.ArgumentParser(description='Play castlebats')
+parser.add_argument('--profile-startup', metavar='FILE',
+                    help='write the time taken by imports and loading to '
+                         'FILE as json, then quit after the first frame')
+parser.add_argument('--record', metavar='FILE',
+                    help='record the input of the level to FILE, to be '
+                         'replayed with run_benchmark.py replay FILE')
+args = parser.parse_args()
+
+profile = StartupProfile(started)
+if args.profile_startup:
+    profile.time_imports()
+
+from castlebats import config
 
 # load configuration
 filename = os.path.join('config', 'castlebats.ini')
 config.read(filename)
+if args.record:
+    config.set('replay', 'record', args.record)
 
 import logging
 logger = logging.getLogger('castlebats.run')
@@ -11,6 +34,8 @@ logging.basicConfig(
     level=getattr(logging, config.get('general', 'debug-level')),
     format="%(name)s:%(filename)s:%(lineno)d:%(levelname)s: %(message)s")
 
+profile.mark('config')
+
 from castlebats import resources
 from castlebats.game import Game
 import pygame
@@ -18,18 +43,16 @@ import pygame
 #import pymunkoptions
 #pymunkoptions.options["debug"] = False
 
+profile.mark('imports')
 
-def check_libs():
-    import pytmx
-    import pymunktmx
-    import pyscroll
-    logger.info('pygame version:\t%s', pygame.__version__)
-    logger.info('pytmx version:\t%s', pytmx.__version__)
-    logger.info('pymunktmx version:\t%s', pymunktmx.__version__)
-    logger.info('pyscroll version:\t%s', pyscroll.__version__)
 
-    import pymunk
-    logger.info('pymunk version:\t%s', pymunk.__version__)
+def check_libs():
+    # the libraries are imported by the level, so do not import them here
+    for name in ('pygame', 'pytmx', 'pymunktmx', 'pyscroll', 'pymunk'):
+        module = sys.modules.get(name)
+        if module is not None:
+            logger.info('%s version:\t%s', name,
+                        getattr(module, '__version__', 'unknown'))
 
 
 if __name__ == '__main__':
@@ -40,7 +63,6 @@ if __name__ == '__main__':
         else:
             return pygame.display.set_mode((width, height), pygame.RESIZABLE)
 
-    check_libs()
     screen_width = config.getint('display', 'width')
     screen_height = config.getint('display', 'height')
     fullscreen = config.getboolean('display', 'fullscreen')
@@ -56,12 +78,33 @@ if __name__ == '__main__':
 
     pygame.font.init()
 
+    profile.mark('display')
+
+    def show_progress(done, total, name):
+        width, height = screen.get_size()
+        bar = pygame.Rect(0, height - 4, width * done // total, 4)
+        screen.fill((255, 255, 255), bar)
+        pygame.display.flip()
+
     screen.fill((0, 0, 0))
-    for thing in resources.load():
+    for thing in resources.load(show_progress):
         pygame.event.get()
-        pygame.display.flip()
+
+    profile.mark('resources')
 
     game = Game()
+
+    def on_first_frame():
+        elapsed = profile.mark('first frame')
+        logger.info('first frame drawn after %.0f ms', elapsed * 1000)
+        check_libs()
+        if args.profile_startup:
+            profile.finish()
+            profile.write(args.profile_startup)
+            game.running = False
+
+    game.on_first_frame = on_first_frame
+
     try:
         game.run()
     except:
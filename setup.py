@@ -10,6 +10,7 @@ setup(name="Bats and Castles",
       author='bitcraft',
       packages=['castlebats'],
       install_requires=['pygame',
+                        'numpy',
                         'pymunk',
                         'pymunktmx',
                         'pytmx',
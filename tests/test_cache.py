@@ -0,0 +1,103 @@
+import unittest
+
+import pygame
+
+from castlebats.lib2.cache import LRUCache, SurfacePool
+
+
+class TestLRUCache(unittest.TestCase):
+    def test_least_recently_used_is_evicted(self):
+        cache = LRUCache(3)
+        for key in 'abc':
+            cache[key] = key.upper()
+        cache['a']              # now b is the oldest
+        cache['d'] = 'D'
+        self.assertEqual(list(cache), ['c', 'a', 'd'])
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_sizes(self):
+        cache = LRUCache(10, len)
+        cache['short'] = 'xx'
+        cache['long'] = 'xxxxxx'
+        self.assertEqual(cache.size, 8)
+
+        # replacing an item replaces its size
+        cache['short'] = 'xxxx'
+        self.assertEqual(cache.size, 10)
+        self.assertEqual(len(cache), 2)
+
+        cache['more'] = 'x'
+        self.assertEqual(list(cache), ['short', 'more'])
+        self.assertEqual(cache.size, 5)
+
+    def test_newest_item_is_kept_over_capacity(self):
+        cache = LRUCache(4, len)
+        cache['small'] = 'x'
+        cache['huge'] = 'x' * 100
+        self.assertEqual(list(cache), ['huge'])
+        self.assertEqual(cache.size, 100)
+
+    def test_trim_and_clear(self):
+        cache = LRUCache(5)
+        for i in range(5):
+            cache[i] = i
+        cache.trim(2)
+        self.assertEqual(list(cache), [3, 4])
+        self.assertEqual(cache.capacity, 5)
+
+        cache.clear()
+        self.assertEqual((len(cache), cache.size), (0, 0))
+
+    def test_hits_and_misses(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        self.assertEqual(cache.get('a'), 1)
+        self.assertIsNone(cache.get('b'))
+        with self.assertRaises(KeyError):
+            cache['c']
+        with self.assertRaises(KeyError):
+            del cache['c']
+
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+
+        # checking for a key does not count as using it
+        self.assertIn('a', cache)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+
+class TestSurfacePool(unittest.TestCase):
+    def test_released_surfaces_are_used_again(self):
+        pool = SurfacePool()
+        surface = pool.acquire((32, 16))
+        pool.release(surface)
+        self.assertEqual(len(pool), 1)
+        self.assertIs(pool.acquire((32, 16)), surface)
+        self.assertEqual(len(pool), 0)
+        self.assertEqual((pool.hits, pool.misses), (1, 1))
+
+    def test_size_and_alpha_must_match(self):
+        pool = SurfacePool()
+        pool.release(pygame.Surface((32, 16)))
+        pool.release(pygame.Surface((32, 16), pygame.SRCALPHA))
+
+        alpha = pool.acquire((32, 16), pygame.SRCALPHA)
+        self.assertTrue(alpha.get_flags() & pygame.SRCALPHA)
+        self.assertIsNot(pool.acquire((16, 32)), alpha)
+        self.assertEqual(len(pool), 1)
+
+        # sizes are made ints, so float sizes from scaling still match
+        self.assertEqual(pool.acquire((32.0, 16.0)).get_size(), (32, 16))
+        self.assertEqual(pool.hits, 2)
+
+    def test_oldest_released_are_dropped(self):
+        pool = SurfacePool(capacity=2)
+        first, second, third = [pygame.Surface((8, i)) for i in (1, 2, 3)]
+        for surface in (first, second, third):
+            pool.release(surface)
+        pool.release(None)
+
+        self.assertEqual(len(pool), 2)
+        self.assertIsNot(pool.acquire((8, 1)), first)
+        self.assertIs(pool.acquire((8, 3)), third)
@@ -0,0 +1,90 @@
+import math
+import random
+import unittest
+
+from castlebats.lib2.grid import SpatialGrid
+
+
+class TestSpatialGrid(unittest.TestCase):
+    def setUp(self):
+        rng = random.Random(7)
+        self.rng = rng
+        self.grid = SpatialGrid(64)
+        self.places = dict()
+        for thing in range(500):
+            self.place(thing, rng.uniform(-1000, 1000), rng.uniform(-400, 400))
+
+        # move some, and remove some, so the grid is updated incrementally
+        for thing in range(0, 500, 3):
+            x, y = self.places[thing]
+            self.move(thing, x + rng.uniform(-200, 200),
+                      y + rng.uniform(-200, 200))
+        for thing in range(0, 500, 7):
+            self.grid.remove(thing)
+            del self.places[thing]
+
+    def place(self, thing, x, y):
+        self.places[thing] = x, y
+        self.grid.insert(thing, x, y)
+
+    def move(self, thing, x, y):
+        self.places[thing] = x, y
+        self.grid.move(thing, x, y)
+
+    def distance(self, thing, x, y):
+        tx, ty = self.places[thing]
+        return math.hypot(tx - x, ty - y)
+
+    def queries(self):
+        rng = self.rng
+        for i in range(100):
+            yield (rng.uniform(-1200, 1200), rng.uniform(-600, 600),
+                   rng.uniform(0, 400))
+
+    def test_query_radius(self):
+        out = list()
+        for x, y, radius in self.queries():
+            expected = {thing for thing in self.places
+                        if self.distance(thing, x, y) <= radius}
+            self.assertEqual(set(self.grid.query_radius(x, y, radius, out)),
+                             expected)
+
+    def test_query_rect(self):
+        out = list()
+        for x, y, size in self.queries():
+            expected = {thing for thing, (tx, ty) in self.places.items()
+                        if x <= tx <= x + size and y <= ty <= y + size / 2}
+            found = self.grid.query_rect(x, y, x + size, y + size / 2, out)
+            self.assertEqual(set(found), expected)
+
+    def test_nearest(self):
+        out = list()
+        for x, y, radius in self.queries():
+            k = self.rng.randint(0, 12)
+            ordered = sorted(self.places, key=lambda i: self.distance(i, x, y))
+            self.assertEqual(self.grid.nearest(x, y, k, out), ordered[:k])
+
+            within = [i for i in ordered if self.distance(i, x, y) <= radius]
+            self.assertEqual(self.grid.nearest(x, y, k, out, radius),
+                             within[:k])
+
+    def test_nearest_more_than_there_are(self):
+        out = list()
+        found = self.grid.nearest(0, 0, 10000, out)
+        self.assertEqual(len(found), len(self.places))
+
+    def test_out_is_reused(self):
+        out = [None] * 3
+        result = self.grid.query_radius(5000, 5000, 10, out)
+        self.assertIs(result, out)
+        self.assertEqual(out, [])
+
+    def test_move_within_cell(self):
+        grid = SpatialGrid(100)
+        grid.insert('a', 10, 10)
+        grid.move('a', 20, 20)
+        self.assertEqual(grid.stats()['cells'], 1)
+        self.assertEqual(grid.query_radius(20, 20, 1, list()), ['a'])
+        grid.move('a', 250, 20)
+        self.assertEqual(grid.stats()['cells'], 1)
+        self.assertEqual(grid.query_radius(20, 20, 1, list()), [])
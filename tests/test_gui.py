@@ -0,0 +1,66 @@
+import unittest
+
+import pygame
+
+from castlebats.gui import GraphicBox
+
+# color of each tile of the border graphic, by column then row
+colors = {'nw': (10, 0, 0), 'w': (20, 0, 0), 'sw': (30, 0, 0),
+          'n': (40, 0, 0), 'c': (50, 0, 0), 's': (60, 0, 0),
+          'ne': (70, 0, 0), 'e': (80, 0, 0), 'se': (90, 0, 0)}
+
+
+def make_border(tile=4):
+    image = pygame.Surface((tile * 3, tile * 3))
+    names = iter("nw w sw n c s ne e se".split())
+    for x in range(3):
+        for y in range(3):
+            image.fill(colors[next(names)], (x * tile, y * tile, tile, tile))
+    return image
+
+
+class TestGraphicBox(unittest.TestCase):
+    def test_boxes_are_composed_once_per_size(self):
+        box = GraphicBox(make_border())
+        first = box.get_box((40, 20))
+        self.assertIs(box.get_box((40, 20)), first)
+        self.assertIsNot(box.get_box((40, 24)), first)
+        self.assertEqual(len(box.boxes), 2)
+
+    def test_cache_size(self):
+        box = GraphicBox(make_border(), cache_size=2)
+        for width in (20, 24, 28):
+            box.get_box((width, 20))
+        self.assertEqual(len(box.boxes), 2)
+        self.assertNotIn((20, 20), box.boxes)
+
+    def test_border_and_hollow_middle(self):
+        box = GraphicBox(make_border())
+        surface = pygame.Surface((40, 20))
+        surface.fill((255, 255, 255))
+        box.draw(surface)
+
+        self.assertEqual(surface.get_at((0, 0))[:3], colors['nw'])
+        self.assertEqual(surface.get_at((39, 19))[:3], colors['se'])
+        self.assertEqual(surface.get_at((20, 0))[:3], colors['n'])
+        self.assertEqual(surface.get_at((0, 10))[:3], colors['w'])
+        # the middle is the colorkey, so what was there is kept
+        self.assertEqual(surface.get_at((20, 10))[:3], (255, 255, 255))
+
+    def test_quantized_sizes_share_boxes(self):
+        box = GraphicBox(make_border(), quantize=4)
+        surface = pygame.Surface((200, 200))
+        drawn = [box.draw(surface, pygame.Rect(0, 0, width, 50))
+                 for width in (100, 101, 103)]
+        self.assertEqual(len(box.boxes), 1)
+
+        # the box is kept centered on the rect
+        rect = pygame.Rect(10, 10, 103, 50)
+        self.assertEqual(box.draw(surface, rect).center, (61, 35))
+        self.assertEqual(drawn[2].size, (100, 48))
+
+    def test_empty_rect_draws_nothing(self):
+        box = GraphicBox(make_border(), quantize=4)
+        surface = pygame.Surface((20, 20))
+        self.assertIsNone(box.draw(surface, (5, 5, 3, 3)))
+        self.assertEqual(len(box.boxes), 0)
@@ -0,0 +1,69 @@
+import unittest
+from types import SimpleNamespace
+
+import pygame
+
+from castlebats.hud import HUD, Bar
+
+red = (200, 0, 0)
+
+
+class TestHUD(unittest.TestCase):
+    def setUp(self):
+        self.player = SimpleNamespace(health=50, max_health=100)
+        self.bar = Bar(self.player, 'health', 'max_health', (10, 4, 102, 6),
+                       red)
+        self.hud = HUD((0, 0, 160, 16))
+        self.hud.add(self.bar)
+        self.screen = pygame.Surface((160, 120))
+
+    def draw(self):
+        self.hud.update()
+        return self.hud.draw(self.screen)
+
+    def test_unchanged_hud_is_not_blitted(self):
+        self.assertEqual(self.draw(), (0, 0, 160, 16))
+        self.assertIsNone(self.draw())
+        self.assertIsNone(self.draw())
+
+    def test_cover_blits_again(self):
+        self.draw()
+        self.screen.fill((255, 255, 255))
+        self.hud.cover()
+        self.assertIsNotNone(self.draw())
+        self.assertEqual(self.screen.get_at((0, 0))[:3], (0, 0, 0))
+        self.assertIsNone(self.draw())
+
+    def test_new_surface_blits_again(self):
+        self.draw()
+        self.screen = pygame.Surface((160, 120))
+        self.assertIsNotNone(self.draw())
+
+    def test_changed_value_redraws_widget(self):
+        self.draw()
+        # the bar is half full; the inside starts one pixel in
+        self.assertEqual(self.screen.get_at((11 + 49, 6))[:3], red)
+        self.assertNotEqual(self.screen.get_at((11 + 50, 6))[:3], red)
+
+        self.player.health = 100
+        self.assertIsNotNone(self.draw())
+        self.assertEqual(self.screen.get_at((11 + 99, 6))[:3], red)
+        self.assertEqual(self.bar.dirty, 0)
+
+        # the same value again is not a change
+        self.assertIsNone(self.draw())
+
+    def test_removed_widget_is_cleared(self):
+        self.draw()
+        self.hud.remove(self.bar)
+        self.assertIsNotNone(self.draw())
+        self.assertEqual(self.screen.get_at((11, 6))[:3], (0, 0, 0))
+
+    def test_set_rect_keeps_layer_of_same_size(self):
+        image = self.hud.image
+        self.hud.set_rect((0, 104, 160, 16))
+        self.assertIs(self.hud.image, image)
+        self.assertEqual(self.draw(), (0, 104, 160, 16))
+
+        self.hud.set_rect((0, 0, 320, 16))
+        self.assertIsNot(self.hud.image, image)
@@ -0,0 +1,106 @@
+"""
+Smoke test of the level: build level0 and step it with scripted input
+
+Needs pymunk 4 and pymunktmx, like the game.  It is skipped without them.
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+# no window or sound card is needed; read when pygame is initialized
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+try:
+    import pymunk
+    import pymunktmx
+except ImportError:
+    pymunk = None
+
+from castlebats import config
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.join(here, '..')
+
+features = ('streaming', 'snapshots', 'lighting', 'ai')
+
+# enough frames to go through the script of ScriptedInput twice, so the
+# hero walks, jumps, attacks, crouches and stands up again
+frames = 880
+
+
+@unittest.skipUnless(pymunk is not None and pymunk.version.startswith('4'),
+                     'needs pymunk 4 and pymunktmx')
+class TestLevel(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        from castlebats import benchmark
+
+        cls.cache_dir = tempfile.mkdtemp()
+        config.read(os.path.join(root, 'config', 'castlebats.ini'))
+        config.set('paths', 'resource-path', os.path.join(root, 'resources'))
+        config.set('paths', 'cache-path', cls.cache_dir)
+        config.set('replay', 'record', '')
+        benchmark.init_headless((config.getint('display', 'width'),
+                                 config.getint('display', 'height')))
+
+    @classmethod
+    def tearDownClass(cls):
+        import pygame
+
+        pygame.quit()
+        shutil.rmtree(cls.cache_dir)
+
+    def play(self, enabled):
+        """ Build the level with some features, and play the script
+        """
+        from castlebats import replay
+        from castlebats.benchmark import ScriptedInput
+        from castlebats.level_state import Level
+
+        for section in features:
+            config.set(section, 'enabled', str(int(section in enabled)))
+
+        level = Level()
+        self.addCleanup(level.shutdown)
+        played = replay.play(level, ScriptedInput(frames, level.timestep))
+        self.assertEqual(played, frames)
+
+        # every model in the level is in the grid, and nothing else is
+        self.assertEqual(len(level.models), len(level.grid))
+        for model in level.models:
+            self.assertIn(model, level.grid)
+        return level
+
+    def test_features_disabled(self):
+        level = self.play(())
+        self.assertIsNone(level.streamer)
+        self.assertIsNone(level.snapshots)
+        self.assertIsNone(level.tiers)
+        self.assertIsNone(level.vpgroup.lightmap)
+
+    def test_features_enabled(self):
+        level = self.play(features)
+        self.assertTrue(level.streamer.loaded)
+        self.assertTrue(len(level.snapshots))
+        self.assertIsNotNone(level.vpgroup.lightmap)
+
+        stats = level.tiers.stats()
+        self.assertGreater(stats['near_calls'], 0)
+        self.assertEqual(sum(stats[i] for i in ('near', 'mid', 'far')),
+                         len(level.models))
+
+    def test_hero_leaves_nothing_in_space(self):
+        level = self.play(())
+        hero = level.hero
+        if hero is None:
+            self.skipTest('the hero died in the last seconds of the script')
+
+        bodies = {hero.sprite.shape.body, hero.feet}
+        level.remove_model(hero)
+        for constraint in level.space.constraints:
+            self.assertNotIn(constraint.a, bodies)
+            self.assertNotIn(constraint.b, bodies)
+        for shape in level.space.shapes:
+            self.assertNotIn(shape.body, bodies)
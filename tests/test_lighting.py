@@ -0,0 +1,93 @@
+import unittest
+from types import SimpleNamespace
+
+import pygame
+
+from castlebats.lighting import Light, LightMap, LightRenderer, parse_color
+
+ambient = (20, 20, 40)
+
+
+class ObjectGroup(list):
+    def __init__(self, name, objects):
+        super().__init__(objects)
+        self.name = name
+
+
+def make_map(*lights):
+    """ Map data of 4 by 2 chunks of 64 pixels, with lights as tiled objects
+    """
+    return SimpleNamespace(width=16, height=8, tilewidth=16, tileheight=16,
+                           objectgroups=[ObjectGroup('Lights', lights)])
+
+
+def make_light(x, y, width, height, **properties):
+    return SimpleNamespace(x=x, y=y, width=width, height=height,
+                           properties=properties)
+
+
+class TestLightMap(unittest.TestCase):
+    def test_chunks_without_lights_are_ambient(self):
+        lightmap = LightMap(make_map(make_light(0, 0, 32, 32)), ambient, 64)
+        self.assertIsNone(lightmap.get_chunk(3, 1))
+
+        renderer = LightRenderer(lightmap)
+        renderer.set_size((64, 64))
+        surface = pygame.Surface((64, 64))
+        surface.fill((255, 255, 255))
+        renderer.draw(surface, surface.get_rect(), pygame.Rect(192, 64, 64, 64))
+        self.assertEqual(surface.get_at((10, 10))[:3], ambient)
+
+    def test_light_is_brightest_at_its_center(self):
+        lightmap = LightMap(make_map(make_light(0, 0, 32, 32)), ambient, 64)
+        chunk = lightmap.get_chunk(0, 0)
+        center = chunk.get_at((16, 16))
+        self.assertGreater(center[0], 200)
+        self.assertEqual(chunk.get_at((40, 40))[:3], ambient)
+
+    def test_intensity_and_color(self):
+        light = make_light(0, 0, 32, 32, color='200, 0, 0', intensity='.5')
+        lightmap = LightMap(make_map(light), (0, 0, 0), 64)
+        r, g, b = lightmap.get_chunk(0, 0).get_at((16, 16))[:3]
+        self.assertAlmostEqual(r, 100, delta=2)
+        self.assertEqual((g, b), (0, 0))
+
+    def test_lights_without_size_are_ignored(self):
+        lightmap = LightMap(make_map(make_light(10, 10, 0, 0)), ambient, 64)
+        self.assertEqual(lightmap.lights, [])
+
+    def test_forget_whole_chunks(self):
+        lightmap = LightMap(make_map(), ambient, 64)
+        lightmap.prerender()
+        self.assertEqual(len(lightmap._chunks), 8)
+
+        # only chunks wholly inside the rect are forgotten
+        lightmap.forget(pygame.Rect(0, 0, 100, 128))
+        self.assertEqual(sorted(lightmap._chunks),
+                         [(1, 0), (1, 1), (2, 0), (2, 1), (3, 0), (3, 1)])
+
+        # chunks are clipped to the map, so the edge of the map counts
+        lightmap.forget(pygame.Rect(192, 0, 1000, 1000))
+        self.assertNotIn((3, 1), lightmap._chunks)
+
+    def test_chunks_in_is_clipped_to_the_map(self):
+        lightmap = LightMap(make_map(), ambient, 64)
+        self.assertEqual(lightmap.chunks_in(pygame.Rect(-50, 100, 100, 100)),
+                         [(0, 1)])
+
+
+class TestLight(unittest.TestCase):
+    def test_images_are_shared(self):
+        first = Light(8, (255, 128, 0))
+        second = Light(8.0, [255, 128, 0], (50, 50))
+        self.assertIs(first.image, second.image)
+        self.assertEqual(first.image.get_size(), (16, 16))
+        self.assertEqual(first.image.get_at((0, 0))[:3], (0, 0, 0))
+
+    def test_follow_flips_the_physics_y_axis(self):
+        light = Light(8, (255, 255, 255))
+        light.follow(SimpleNamespace(position=(30, 100)), 400)
+        self.assertEqual(light.get_position(), (30, 300))
+
+    def test_parse_color(self):
+        self.assertEqual(parse_color(' 1, 2 ,3'), (1, 2, 3))
@@ -0,0 +1,48 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pytmx import TiledMap
+from pytmx.pytmx import default_image_loader
+
+from castlebats import mapcache
+
+here = os.path.dirname(os.path.abspath(__file__))
+map_path = os.path.join(here, '..', 'resources', 'maps', 'level0.tmx')
+
+
+def describe_objects(tmx_data):
+    return [(group.name, [(obj.id, obj.name, obj.type, obj.x, obj.y)
+                          for obj in group])
+            for group in tmx_data.objectgroups]
+
+
+class TestMapCache(unittest.TestCase):
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cache_dir)
+
+    def test_objects_survive_round_trip(self):
+        fresh = TiledMap(map_path, image_loader=default_image_loader)
+        mapcache.compile_map(fresh, map_path, self.cache_dir)
+        cached = mapcache.read_map(map_path, self.cache_dir,
+                                   default_image_loader)
+
+        self.assertIsNotNone(cached)
+        self.assertTrue(len(list(fresh.objects)))
+        self.assertEqual(len(list(cached.objects)), len(list(fresh.objects)))
+        self.assertEqual(describe_objects(cached), describe_objects(fresh))
+
+    def test_tiles_survive_round_trip(self):
+        fresh = TiledMap(map_path, image_loader=default_image_loader)
+        mapcache.compile_map(fresh, map_path, self.cache_dir)
+        cached = mapcache.read_map(map_path, self.cache_dir,
+                                   default_image_loader)
+
+        for a, b in zip(mapcache._tile_layers(fresh),
+                        mapcache._tile_layers(cached)):
+            self.assertEqual([list(row) for row in a.data],
+                             [list(row) for row in b.data])
@@ -0,0 +1,62 @@
+import unittest
+
+import pygame
+
+try:
+    import pymunk
+except ImportError:
+    pymunk = None
+
+
+@unittest.skipUnless(pymunk is not None, 'needs pymunk')
+class TestPhysicsOverlay(unittest.TestCase):
+    map_height = 1000
+
+    def setUp(self):
+        from castlebats.overlay import PhysicsOverlay
+
+        self.space = pymunk.Space()
+        # a floor near the top of the map, in the first column of chunks
+        floor = pymunk.Segment(self.space.static_body,
+                               (10, self.map_height - 10),
+                               (100, self.map_height - 10), 2)
+        self.space.add(floor)
+
+        self.overlay = PhysicsOverlay(self.space, self.map_height)
+        self.overlay.set_size((512, 256))
+        self.surface = pygame.Surface((512, 256))
+        self.camera = pygame.Rect(0, 0, 512, 256)
+
+    def test_static_shapes_are_cached(self):
+        overlay = self.overlay
+        overlay.draw(self.surface, self.camera, (0, 0))
+        chunk = overlay._chunks[0, 0]
+        self.assertEqual(chunk.get_at((50, 10))[:3], overlay.static_color)
+
+        # chunks without static shapes are remembered as empty
+        self.assertIsNone(overlay._chunks[1, 0])
+
+        overlay.draw(self.surface, self.camera, (0, 0))
+        self.assertIs(overlay._chunks[0, 0], chunk)
+
+    def test_invalidate_rect(self):
+        overlay = self.overlay
+        overlay.draw(self.surface, self.camera, (0, 0))
+
+        # a rect on the edge of a chunk does not reach the next one
+        overlay.invalidate(pygame.Rect(0, 0, 256, 256))
+        self.assertNotIn((0, 0), overlay._chunks)
+        self.assertIn((1, 0), overlay._chunks)
+
+        overlay.invalidate(pygame.Rect(300, 20, 10, 10))
+        self.assertNotIn((1, 0), overlay._chunks)
+
+        # forgotten chunks are drawn again when next seen
+        overlay.draw(self.surface, self.camera, (0, 0))
+        self.assertIsNotNone(overlay._chunks[0, 0])
+
+    def test_invalidate_all(self):
+        overlay = self.overlay
+        overlay.draw(self.surface, self.camera, (0, 0))
+        overlay.invalidate()
+        self.assertEqual(overlay._chunks, dict())
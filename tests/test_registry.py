@@ -0,0 +1,108 @@
+import unittest
+
+from castlebats.lib2.registry import Registry, handle_index, handle_generation
+
+
+class Entity:
+    def __init__(self, kind=None):
+        self.kind = kind
+
+
+class TestRegistry(unittest.TestCase):
+    def setUp(self):
+        self.added = list()
+        self.removed = list()
+        self.registry = Registry(self.added.append, self.removed.append)
+
+    def test_add_and_get(self):
+        entity = Entity()
+        handle = self.registry.add(entity)
+        self.assertEqual(entity.handle, handle)
+        self.assertIs(self.registry.get(handle), entity)
+        self.assertIn(entity, self.registry)
+        self.assertEqual(self.added, [entity])
+
+    def test_handle_reuse_and_generations(self):
+        registry = self.registry
+        first = Entity()
+        old = registry.add(first)
+        registry.remove(first)
+        self.assertIsNone(first.handle)
+        self.assertIsNone(registry.get(old))
+        self.assertNotIn(first, registry)
+
+        second = Entity()
+        new = registry.add(second)
+        self.assertEqual(handle_index(new), handle_index(old))
+        self.assertEqual(handle_generation(new), handle_generation(old) + 1)
+        self.assertIsNone(registry.get(old))
+        self.assertIs(registry.get(new), second)
+
+        # removing through a stale entity does nothing
+        registry.remove(first)
+        self.assertIn(second, registry)
+
+    def test_kinds(self):
+        registry = self.registry
+        enemies = [Entity('enemy') for i in range(5)]
+        things = [Entity('thing') for i in range(3)]
+        for entity in enemies + things:
+            registry.add(entity)
+        for entity in enemies[1:3]:
+            registry.remove(entity)
+
+        expected = enemies[:1] + enemies[3:]
+        self.assertCountEqual(registry.of_kind('enemy'), expected)
+        self.assertCountEqual(registry.of_kind('thing'), things)
+        self.assertEqual(registry.of_kind('bat'), [])
+        self.assertCountEqual(registry, expected + things)
+        self.assertEqual(len(registry), 6)
+
+    def test_defer_and_flush(self):
+        registry = self.registry
+        entities = [Entity() for i in range(10)]
+        for entity in entities:
+            registry.add(entity)
+
+        registry.defer()
+        late = Entity()
+        seen = list()
+        for entity in registry:
+            seen.append(entity)
+            if entities.index(entity) % 2:
+                registry.remove(entity)
+        registry.add(late)
+
+        # nothing changes until the flush
+        self.assertCountEqual(seen, entities)
+        self.assertEqual(len(registry), 10)
+        self.assertNotIn(late, list(registry))
+        self.assertIs(registry.get(late.handle), late)
+        self.assertEqual(self.removed, [])
+
+        registry.flush()
+        self.assertCountEqual(registry, entities[::2] + [late])
+        self.assertCountEqual(self.removed, entities[1::2])
+        self.assertFalse(registry.deferred)
+
+    def test_add_and_remove_while_deferred(self):
+        registry = self.registry
+        registry.defer()
+        entity = Entity()
+        registry.add(entity)
+        registry.remove(entity)
+        registry.remove(entity)
+        registry.flush()
+
+        self.assertEqual(len(registry), 0)
+        self.assertEqual(self.added, [entity])
+        self.assertEqual(self.removed, [entity])
+
+    def test_clear(self):
+        registry = self.registry
+        for i in range(4):
+            registry.add(Entity('enemy'))
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+        self.assertEqual(registry.of_kind('enemy'), [])
+        self.assertEqual(registry.stats()['free'], 4)
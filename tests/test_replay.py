@@ -0,0 +1,94 @@
+import os
+import tempfile
+import unittest
+
+from castlebats import buttons
+from castlebats.lib2.clock import Scheduler
+from castlebats.replay import Recorder, Replay, SimulationClock
+
+
+class TestRecording(unittest.TestCase):
+    timestep = 1 / 120.
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.folder.name, 'session.rec')
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def record(self, frames):
+        recorder = Recorder(self.path, self.timestep)
+        for commands in frames:
+            recorder.record(commands)
+        recorder.close()
+        return Replay.load(self.path)
+
+    def test_round_trip(self):
+        frames = [
+            [],
+            [(None, buttons.P1_RIGHT, buttons.BUTTONDOWN)],
+            [(None, buttons.P1_RIGHT, buttons.BUTTONHELD),
+             (None, buttons.P1_ACTION1, buttons.BUTTONDOWN)],
+            [(None, buttons.P1_RIGHT, buttons.BUTTONUP)],
+            [],
+        ]
+        replay = self.record(frames)
+        self.assertEqual(replay.timestep, self.timestep)
+        self.assertEqual(len(replay), len(frames))
+
+        played = [[command[1:] for command in commands]
+                  for commands in replay]
+        expected = [[command[1:] for command in commands]
+                    for commands in frames]
+        self.assertEqual(played, expected)
+
+        # commands are given as coming from the replay
+        for commands in replay:
+            for command in commands:
+                self.assertIs(command[0], Replay)
+
+    def test_idle_frame_is_one_byte(self):
+        self.record([])
+        empty = os.path.getsize(self.path)
+        self.record([[]] * 10)
+        self.assertEqual(os.path.getsize(self.path), empty + 10)
+
+    def test_too_many_commands(self):
+        recorder = Recorder(self.path, self.timestep)
+        command = (None, buttons.P1_LEFT, buttons.BUTTONHELD)
+        with self.assertRaises(ValueError):
+            recorder.record([command] * 256)
+        recorder.close()
+
+    def test_not_a_recording(self):
+        with open(self.path, 'wb') as fp:
+            fp.write(b'\x00' * 32)
+        with self.assertRaises(ValueError):
+            Replay.load(self.path)
+
+
+class TestSimulationClock(unittest.TestCase):
+    def run_steps(self, steps, timestep):
+        """ Return the steps a repeating function was called on
+        """
+        clock = SimulationClock()
+        scheduler = Scheduler(clock)
+        called = list()
+        step = [0]
+        scheduler.schedule(lambda dt: called.append(step[0]), .05, True)
+        for step[0] in range(steps):
+            clock.advance(timestep)
+            scheduler.tick()
+        return called
+
+    def test_only_moves_when_advanced(self):
+        clock = SimulationClock(2.0)
+        self.assertEqual(clock(), 2.0)
+        clock.advance(.5)
+        self.assertEqual(clock(), 2.5)
+
+    def test_scheduled_functions_repeat(self):
+        first = self.run_steps(120, 1 / 120.)
+        self.assertTrue(first)
+        self.assertEqual(self.run_steps(120, 1 / 120.), first)
@@ -0,0 +1,188 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+# no window or sound card is needed; read when pygame is initialized
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+from castlebats import config, resources
+
+here = os.path.dirname(os.path.abspath(__file__))
+root = os.path.join(here, '..')
+
+
+class TestLoad(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.cache_dir = tempfile.mkdtemp()
+        config.read(os.path.join(root, 'config', 'castlebats.ini'))
+        config.set('paths', 'resource-path', os.path.join(root, 'resources'))
+        config.set('paths', 'cache-path', cls.cache_dir)
+        pygame.mixer.init()
+        pygame.display.init()
+        pygame.display.set_mode((32, 32))
+
+        cls.progress = list()
+        cls.loaded = list(resources.load(
+            lambda *args: cls.progress.append(args)))
+
+    @classmethod
+    def tearDownClass(cls):
+        pygame.display.quit()
+        pygame.mixer.quit()
+        shutil.rmtree(cls.cache_dir)
+
+    def test_only_preloaded_images_are_loaded(self):
+        images = resources.images
+        for name in ('hero-spritesheet', 'zombie-spritesheet', 'hanging'):
+            self.assertTrue(images.is_loaded(name), name)
+        self.assertFalse(images.is_loaded('default-bg'))
+        self.assertFalse(images.is_loaded('dialog'))
+        self.assertEqual(images.stats()['loads'], 3)
+
+    def test_each_preload_is_loaded_once(self):
+        self.assertEqual(resources.maps.stats()['loads'], 1)
+        total = len(self.loaded)
+        self.assertEqual(len(self.progress), total)
+        self.assertEqual(self.progress[-1][:2], (total, total))
+
+    def test_progress_counts_each_resource(self):
+        done = [i[0] for i in self.progress]
+        names = [i[2] for i in self.progress]
+        self.assertEqual(done, list(range(1, len(done) + 1)))
+        self.assertEqual(len(set(names)), len(names))
+        for name in ('level0', 'hero-spritesheet', 'hanging'):
+            self.assertIn(name, names)
+
+    def test_preloaded_images_are_ready_for_the_display(self):
+        loads = resources.images.stats()['loads']
+        image = resources.images['hero-spritesheet']
+        self.assertTrue(image.get_flags() & pygame.SRCALPHA)
+        self.assertEqual(resources.images.stats()['loads'], loads)
+
+    def test_uncompressed_sounds_are_preloaded(self):
+        sounds = resources.sounds
+        uncompressed = sounds.uncompressed()
+        for name in uncompressed:
+            self.assertTrue(sounds.is_loaded(name), name)
+        self.assertEqual(sounds.stats()['loads'], len(uncompressed))
+
+    def test_maps_compare_by_identity(self):
+        images, maps = resources.images, resources.maps
+        self.assertEqual(images, images)
+        self.assertNotEqual(images, maps)
+        self.assertEqual(len({images, maps, images}), 2)
+        # comparing must not load anything
+        self.assertFalse(images.is_loaded('dialog'))
+
+
+class TestResourceMap(unittest.TestCase):
+    def setUp(self):
+        self.decoded = list()
+        paths = {'short': 'ab', 'long': 'abcdef', 'other': 'xyz'}
+        self.resource_map = resources.ResourceMap(
+            paths, self.decode, str.upper, 10, len)
+
+    def decode(self, path):
+        self.decoded.append(path)
+        return path
+
+    def test_loaded_when_first_used(self):
+        resource_map = self.resource_map
+        self.assertEqual(len(resource_map), 3)
+        self.assertIn('short', resource_map)
+        self.assertFalse(resource_map.is_loaded('short'))
+        self.assertEqual(self.decoded, [])
+
+        self.assertEqual(resource_map['short'], 'AB')
+        self.assertEqual(resource_map['short'], 'AB')
+        self.assertEqual(self.decoded, ['ab'])
+        self.assertTrue(resource_map.is_loaded('short'))
+        self.assertIn('short', resource_map.load_times)
+
+    def test_unknown_name(self):
+        with self.assertRaises(KeyError):
+            self.resource_map['missing']
+        self.assertNotIn('missing', self.resource_map)
+
+    def test_budget(self):
+        resource_map = self.resource_map
+        resource_map['long']
+        resource_map['short']
+        resource_map['other']      # 11 bytes: long is forgotten
+        self.assertFalse(resource_map.is_loaded('long'))
+        self.assertTrue(resource_map.is_loaded('short'))
+
+        # and loaded again when used
+        resource_map['long']
+        self.assertEqual(self.decoded, ['abcdef', 'ab', 'xyz', 'abcdef'])
+        stats = resource_map.stats()
+        self.assertEqual(stats['loads'], 4)
+        self.assertLessEqual(stats['size'], stats['capacity'])
+
+    def test_decode_and_finish_separately(self):
+        # as load does: decode in a thread, finish on the calling thread
+        decoded, seconds = self.resource_map.timed_decode('xyz')
+        self.assertGreaterEqual(seconds, 0)
+        self.assertFalse(self.resource_map.is_loaded('other'))
+        self.assertEqual(self.resource_map.add('other', decoded), 'XYZ')
+        self.assertEqual(self.resource_map['other'], 'XYZ')
+        self.assertEqual(self.resource_map.stats()['loads'], 1)
+
+    def test_clear(self):
+        self.resource_map['short']
+        self.resource_map.clear()
+        self.assertFalse(self.resource_map.is_loaded('short'))
+        self.assertEqual(len(self.resource_map), 3)
+
+
+class TestSoundBank(unittest.TestCase):
+    def setUp(self):
+        pygame.mixer.init()
+        self.folder = tempfile.mkdtemp()
+        sounds = os.path.join(root, 'resources', 'sounds')
+        os.mkdir(os.path.join(self.folder, 'OGG'))
+
+        # 'book' has a compressed copy next to it, 'sword' does not
+        for name in ('book.wav', 'sword.wav'):
+            shutil.copy(os.path.join(sounds, 'sword.wav'),
+                        os.path.join(self.folder, name))
+        shutil.copy(os.path.join(sounds, 'OGG', 'bookClose.ogg'),
+                    os.path.join(self.folder, 'OGG', 'book.ogg'))
+
+        paths = {name: os.path.join(self.folder, name + '.wav')
+                 for name in ('book', 'sword')}
+        self.bank = resources.SoundBank(paths, lambda sound: sound, 1 << 24)
+
+    def tearDown(self):
+        pygame.mixer.quit()
+        shutil.rmtree(self.folder)
+
+    def test_compressed_copies_are_used(self):
+        bank = self.bank
+        self.assertEqual(bank.paths['book'],
+                         os.path.join(self.folder, 'OGG', 'book.ogg'))
+        self.assertTrue(bank.is_compressed(bank.paths['book']))
+        self.assertEqual(bank.uncompressed(), ['sword'])
+
+    def test_compressed_files_are_kept_in_memory(self):
+        bank = self.bank
+        bank.read_files()
+        self.assertEqual(list(bank.files), [bank.paths['book']])
+        self.assertFalse(bank.is_loaded('book'))
+
+        # decoded from memory, even if the file is gone
+        os.remove(bank.paths['book'])
+        sound = bank['book']
+        self.assertGreater(sound.get_length(), 0)
+        self.assertTrue(bank.is_loaded('book'))
+        self.assertGreater(bank.stats()['compressed'], 0)
+
+    def test_uncompressed_sounds_are_decoded_from_disk(self):
+        self.bank.read_files()
+        self.assertGreater(self.bank['sword'].get_length(), 0)
+        self.assertNotIn(self.bank.paths['sword'], self.bank.files)
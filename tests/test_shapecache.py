@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pytmx import TiledMap
+from pytmx.pytmx import default_image_loader
+
+try:
+    import pymunk
+    import pymunktmx
+except ImportError:
+    pymunk = None
+
+here = os.path.dirname(os.path.abspath(__file__))
+maps = os.path.join(here, '..', 'resources', 'maps')
+
+
+def rounded(value):
+    """ Round the floats in a description, to compare them """
+    if isinstance(value, float):
+        return round(value, 6)
+    if isinstance(value, (list, tuple)):
+        return [rounded(i) for i in value]
+    if isinstance(value, dict):
+        return {k: rounded(v) for k, v in value.items()}
+    return value
+
+
+@unittest.skipUnless(pymunk is not None, 'needs pymunk and pymunktmx')
+class TestShapeCache(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.folder, 'cache')
+        for name in ('level0.tmx', 'objects.xml'):
+            shutil.copy(os.path.join(maps, name), self.folder)
+        self.tmx_path = os.path.join(self.folder, 'level0.tmx')
+        self.xml_path = os.path.join(self.folder, 'objects.xml')
+
+        # the map refers to its tilesets relative to itself
+        for name in os.listdir(maps):
+            if not name.endswith(('.tmx', '.xml')):
+                source = os.path.join(maps, name)
+                if os.path.isfile(source):
+                    shutil.copy(source, self.folder)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def load(self, prepare=None):
+        from castlebats.shapecache import load_descriptions
+
+        tmx_data = TiledMap(self.tmx_path, image_loader=default_image_loader)
+        return load_descriptions(tmx_data, self.xml_path, self.cache_dir,
+                                 prepare)
+
+    def cache_files(self):
+        return sorted(i for i in os.listdir(self.cache_dir)
+                      if i.endswith('.pickle'))
+
+    def test_cached_descriptions_are_used(self):
+        prepared = list()
+        first = self.load(lambda name, shape: prepared.append(name))
+        self.assertTrue(prepared)
+        self.assertEqual(len(self.cache_files()), 1)
+
+        del prepared[:]
+        self.assertEqual(self.load(lambda *a: prepared.append(a)), first)
+        self.assertEqual(prepared, [])
+
+    def test_changed_files_are_stale(self):
+        self.load()
+        for path in (self.tmx_path, self.xml_path):
+            with open(path, 'a') as fp:
+                fp.write('\n')
+            self.load()
+        self.assertEqual(len(self.cache_files()), 3)
+
+    def test_unreadable_cache_is_made_again(self):
+        first = self.load()
+        path = os.path.join(self.cache_dir, self.cache_files()[0])
+        with open(path, 'wb') as fp:
+            fp.write(b'not a pickle')
+        self.assertEqual(self.load(), first)
+
+    def test_built_shapes_describe_the_same(self):
+        from castlebats.shapecache import build_shapes, describe_shape
+
+        descriptions = self.load()
+        shapes = build_shapes(descriptions, pymunk.Space())
+        self.assertEqual(set(shapes), set(descriptions))
+        for name, shape in shapes.items():
+            self.assertEqual(rounded(describe_shape(shape)),
+                             rounded(descriptions[name]), name)
@@ -0,0 +1,135 @@
+import unittest
+from types import SimpleNamespace
+
+import numpy
+
+from castlebats.snapshot import Snapshot, SnapshotRing
+
+
+def make_snapshot(time):
+    return Snapshot(time, (), numpy.zeros((1, 6)), list())
+
+
+class Vec(SimpleNamespace):
+    def __iter__(self):
+        return iter((self.x, self.y))
+
+
+class Body:
+    """ Stands in for a pymunk body; restore sets tuples """
+
+    def __init__(self, x, y):
+        self.position = Vec(x=x, y=y)
+        self.velocity = Vec(x=0.0, y=0.0)
+        self.angle = 0.0
+        self.angular_velocity = 0.0
+
+
+class Model:
+    def __init__(self, body):
+        self.body = body
+        self.sprites = ()
+        self.alive = True
+
+    def gather_pymunk_objects(self):
+        yield self.body
+
+    def get_state(self):
+        return {'alive': self.alive}
+
+    def set_state(self, state):
+        self.alive = state['alive']
+
+
+class TestSnapshotRing(unittest.TestCase):
+    def test_capacity(self):
+        ring = SnapshotRing(3)
+        for time in range(5):
+            ring.push(make_snapshot(time))
+        self.assertEqual(len(ring), 3)
+        self.assertEqual(ring.latest().time, 4)
+        self.assertEqual([ring.pop().time for i in range(3)], [4, 3, 2])
+        self.assertIsNone(ring.latest())
+        self.assertRaises(IndexError, ring.pop)
+
+    def test_rewind_order(self):
+        ring = SnapshotRing(10)
+        for i in range(10):
+            ring.push(make_snapshot(i * .5))
+
+        # the newest snapshot at least this far before the newest is kept
+        snapshot = ring.rewind(1.75)
+        self.assertEqual(snapshot.time, 2.5)
+        self.assertEqual(len(ring), 6)
+
+        snapshot = ring.rewind(1.0)
+        self.assertEqual(snapshot.time, 1.5)
+        self.assertEqual([ring.pop().time for i in range(4)],
+                         [1.5, 1.0, .5, 0])
+
+    def test_rewind_keeps_oldest(self):
+        ring = SnapshotRing(4)
+        for time in range(6):
+            ring.push(make_snapshot(time))
+        snapshot = ring.rewind(100)
+        self.assertEqual(snapshot.time, 2)
+        self.assertEqual(len(ring), 1)
+
+    def test_rewind_empty(self):
+        self.assertIsNone(SnapshotRing(2).rewind(1))
+
+    def test_push_after_pop_and_clear(self):
+        ring = SnapshotRing(3)
+        for time in range(4):
+            ring.push(make_snapshot(time))
+        ring.pop()
+        ring.push(make_snapshot(9))
+        self.assertEqual([ring.pop().time for i in range(3)], [9, 2, 1])
+
+        ring.push(make_snapshot(1))
+        ring.clear()
+        self.assertEqual(len(ring), 0)
+        self.assertEqual(ring.stats()['bytes'], 0)
+
+    def test_stats(self):
+        ring = SnapshotRing(2)
+        ring.push(make_snapshot(0))
+        stats = ring.stats()
+        self.assertEqual(stats['snapshots'], 1)
+        self.assertEqual(stats['capacity'], 2)
+        self.assertEqual(stats['bytes'], 48)
+
+
+class TestRestore(unittest.TestCase):
+    def setUp(self):
+        self.hero = Model(Body(10, 20))
+        self.enemy = Model(Body(100, 20))
+        self.models = [self.hero, self.enemy]
+        self.space = SimpleNamespace(bodies=[self.hero.body, self.enemy.body])
+        self.snapshot = Snapshot.capture(0, self.space, self.models)
+
+        # the hero dies and the enemy walks away
+        self.hero.alive = False
+        self.hero.body.position = Vec(x=50, y=-300)
+        self.enemy.alive = False
+        self.enemy.body.position = Vec(x=400, y=20)
+
+    def test_restore_level(self):
+        self.snapshot.restore(self.space, self.models)
+        self.assertTrue(self.hero.alive)
+        self.assertEqual(tuple(self.hero.body.position), (10, 20))
+        self.assertTrue(self.enemy.alive)
+        self.assertEqual(tuple(self.enemy.body.position), (100, 20))
+
+    def test_restore_only_one_model(self):
+        self.snapshot.restore(self.space, self.models, self.hero)
+        self.assertTrue(self.hero.alive)
+        self.assertEqual(tuple(self.hero.body.position), (10, 20))
+        self.assertFalse(self.enemy.alive)
+        self.assertEqual(tuple(self.enemy.body.position), (400, 20))
+
+    def test_removed_models_stay_removed(self):
+        self.space.bodies.remove(self.enemy.body)
+        self.snapshot.restore(self.space, [self.hero])
+        self.assertFalse(self.enemy.alive)
+        self.assertEqual(tuple(self.enemy.body.position), (400, 20))
@@ -0,0 +1,77 @@
+import unittest
+
+from castlebats.streaming import ChunkStreamer
+
+
+class TestChunkStreamer(unittest.TestCase):
+    def setUp(self):
+        self.loaded = set()
+        self.streamer = ChunkStreamer(100, 150, 300,
+                                      self.loaded.update,
+                                      self.loaded.difference_update)
+
+    def test_load_within_distance(self):
+        streamer = self.streamer
+        streamer.add('near', 10, 20)
+        streamer.add('far', 510, 520)
+        streamer.update(50)
+        self.assertEqual(self.loaded, {'near'})
+        self.assertEqual(streamer.loaded, {0})
+
+    def test_add_to_loaded_chunk(self):
+        self.streamer.add('first', 10, 20)
+        self.streamer.update(50)
+        self.streamer.add('late', 30, 40)
+        self.assertEqual(self.loaded, {'first', 'late'})
+
+    def test_empty_chunks_are_not_loaded(self):
+        self.streamer.update(50)
+        self.streamer.add('late', 120, 130)
+        self.assertEqual(self.loaded, set())
+        self.streamer.update(50)
+        self.assertEqual(self.loaded, {'late'})
+
+    def test_unload_margin(self):
+        streamer = self.streamer
+        streamer.add('thing', 10, 20)
+        streamer.update(50)
+        self.assertTrue(streamer.is_loaded('thing'))
+
+        # past the load distance, but not the unload distance
+        streamer.update(350)
+        self.assertTrue(streamer.is_loaded('thing'))
+        self.assertEqual(self.loaded, {'thing'})
+
+        streamer.update(450)
+        self.assertFalse(streamer.is_loaded('thing'))
+        self.assertEqual(self.loaded, set())
+
+    def test_no_thrash_at_edge(self):
+        streamer = self.streamer
+        streamer.add('thing', 210, 220)
+        streamer.update(50)
+        loads = streamer.loads
+        for x in (60, 40, 60, 40):
+            streamer.update(x)
+        self.assertEqual(streamer.loads, loads)
+        self.assertEqual(streamer.unloads, 0)
+
+    def test_thing_spanning_chunks(self):
+        streamer = self.streamer
+        streamer.add('wide', 50, 450)
+        streamer.update(50)
+        self.assertEqual(streamer.loads, 1)
+
+        # still in a loaded chunk after the first is unloaded
+        streamer.update(600)
+        self.assertTrue(streamer.is_loaded('wide'))
+        streamer.update(2000)
+        self.assertFalse(streamer.is_loaded('wide'))
+        self.assertEqual(streamer.unloads, 1)
+
+    def test_unload_all(self):
+        self.streamer.add('thing', 10, 20)
+        self.streamer.update(50)
+        self.streamer.unload_all()
+        self.assertEqual(self.loaded, set())
+        self.assertEqual(self.streamer.stats()['chunks'], 0)
@@ -0,0 +1,96 @@
+import unittest
+
+import pygame
+
+from castlebats.gui import draw_text
+from castlebats.text import get_atlas, get_font
+
+white = (255, 255, 255)
+black = (0, 0, 0)
+
+
+def setUpModule():
+    pygame.font.init()
+
+
+class TestWrap(unittest.TestCase):
+    def setUp(self):
+        self.atlas = get_atlas(get_font(None, 16), white)
+
+    def lines(self, text, width):
+        return [text[start:end] for start, end in self.atlas.wrap(text, width)]
+
+    def test_break_at_last_space_that_fits(self):
+        text = 'one two three four'
+        width = self.atlas.width('one two th')
+        self.assertEqual(self.lines(text, width),
+                         ['one two', 'three four'])
+
+    def test_break_at_space_that_does_not_fit(self):
+        width = self.atlas.width('one two')
+        self.assertEqual(self.lines('one two three', width),
+                         ['one two', 'three'])
+
+    def test_newlines(self):
+        self.assertEqual(self.lines('one\n\ntwo', 1000), ['one', '', 'two'])
+
+    def test_long_words_are_broken_anywhere(self):
+        width = self.atlas.width('abcd')
+        lines = self.lines('abcdefghij', width)
+        self.assertEqual(''.join(lines), 'abcdefghij')
+        self.assertGreater(len(lines), 2)
+        for line in lines:
+            self.assertLessEqual(self.atlas.width(line), width)
+
+    def test_something_is_kept_on_each_line(self):
+        # even if one character is wider than the line
+        self.assertEqual(self.lines('ab', 1), ['a', 'b'])
+
+
+class TestGlyphAtlas(unittest.TestCase):
+    def test_atlases_are_shared(self):
+        font = get_font(None, 16)
+        self.assertIs(get_font(None, 16), font)
+        self.assertIs(get_atlas(font, white), get_atlas(font, [255, 255, 255]))
+        self.assertIsNot(get_atlas(font, white), get_atlas(font, black))
+
+    def test_draw_advances_by_glyph(self):
+        atlas = get_atlas(get_font(None, 16), white, black)
+        surface = pygame.Surface((200, 40))
+        rect = atlas.draw(surface, 'score 100', (5, 7))
+        self.assertEqual(rect, (5, 7, atlas.width('score 100'), atlas.height))
+        self.assertEqual(atlas.size(''), (0, atlas.height))
+
+    def test_glyphs_outside_ascii_are_added(self):
+        atlas = get_atlas(get_font(None, 16), white)
+        self.assertNotIn('é', atlas.glyphs)
+        atlas.render('café')
+        self.assertIn('é', atlas.glyphs)
+
+    def test_redraw_replaces_text(self):
+        atlas = get_atlas(get_font(None, 16), white)
+        image = atlas.render('88')
+        self.assertEqual(atlas.width('11'), atlas.width('88'))
+        atlas.redraw(image, '11')
+
+        expected = atlas.render('11')
+        for x in range(image.get_width()):
+            for y in range(image.get_height()):
+                self.assertEqual(image.get_at((x, y)), expected.get_at((x, y)))
+
+
+class TestDrawText(unittest.TestCase):
+    def test_text_that_does_not_fit_is_returned(self):
+        font = get_font(None, 16)
+        height = font.size('Tg')[1]
+        width = get_atlas(font, black).width('word word')
+        rect = pygame.Rect(0, 0, width, height)
+        width, rest = draw_text(None, 'word word word', rect, font)
+        self.assertEqual(rest, 'word')
+        self.assertLessEqual(width, rect.width)
+
+    def test_all_text_fits(self):
+        surface = pygame.Surface((300, 100))
+        width, rest = draw_text(surface, 'hello', (0, 0, 300, 100))
+        self.assertEqual(rest, '')
+        self.assertGreater(width, 0)
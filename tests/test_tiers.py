@@ -0,0 +1,131 @@
+import unittest
+
+from castlebats.lib2.grid import SpatialGrid
+from castlebats.tiers import TickTiers, NEAR, MID, FAR
+
+
+class Model:
+    kind = 'enemy'
+
+    def __init__(self, x, kind=None):
+        self.position = x, 0
+        self.alive = True
+        self.frames = list()
+        self.level = None
+        if kind is not None:
+            self.kind = kind
+
+    def physics_hook(self):
+        self.frames.append(self.level.frame)
+
+
+class Level:
+    """ The parts of castlebats.level_state.Level used by the tiers
+    """
+
+    def __init__(self):
+        self.grid = SpatialGrid(64)
+        self.camera = 0, 0
+        self.frame = 0
+
+    def get_camera_position(self):
+        return self.camera
+
+    def models_near(self, position, radius, out):
+        return self.grid.query_radius(position[0], position[1], radius, out)
+
+
+class TestTickTiers(unittest.TestCase):
+    def setUp(self):
+        self.level = Level()
+        self.tiers = TickTiers(self.level, 100, 300, (4, 20), tier_period=5)
+        self.models = list()
+
+    def add(self, x, kind=None):
+        model = Model(x, kind)
+        model.level = self.level
+        self.level.grid.insert(model, x, 0)
+        self.tiers.add(model)
+        self.models.append(model)
+        return model
+
+    def run_frames(self, frames):
+        # like Level.simulate: near hooks first, then the tiers
+        for i in range(frames):
+            for model in self.models:
+                if model in self.tiers.every_frame:
+                    model.physics_hook()
+            self.tiers.update()
+            self.level.frame += 1
+
+    def test_tiers_by_distance(self):
+        near = self.add(50)
+        mid = self.add(200)
+        far = self.add(1000)
+        hero = self.add(5000, 'hero')
+        self.run_frames(1)
+        tiers = self.tiers.tiers
+        self.assertEqual(tiers[near], NEAR)
+        self.assertEqual(tiers[mid], MID)
+        self.assertEqual(tiers[far], FAR)
+        self.assertEqual(tiers[hero], NEAR)
+
+    def test_periods(self):
+        near = self.add(50)
+        mid = self.add(200)
+        far = self.add(1000)
+        self.run_frames(81)
+
+        # all are near until the tiers are first chosen, after frame 0
+        self.assertEqual(len(near.frames), 81)
+        self.assertEqual(len(mid.frames), 1 + 80 // 4)
+        self.assertEqual(len(far.frames), 1 + 80 // 20)
+        for model, period in ((mid, 4), (far, 20)):
+            frames = model.frames[1:]
+            self.assertEqual({b - a for a, b in zip(frames, frames[1:])},
+                             {period})
+
+    def test_groups_are_staggered(self):
+        for i in range(8):
+            self.add(200 + i)
+        self.run_frames(41)
+        calls = [0] * 41
+        for model in self.models:
+            for frame in model.frames[1:]:
+                calls[frame] += 1
+        # two of the eight mid range models each frame
+        self.assertEqual(set(calls[1:]), {2})
+
+    def test_repeatable(self):
+        # tiers only count frames, so the same frames give the same calls
+        for x in (50, 200, 250, 1000, 1500):
+            self.add(x)
+        self.run_frames(60)
+        first = [list(m.frames) for m in self.models]
+
+        self.setUp()
+        for x in (50, 200, 250, 1000, 1500):
+            self.add(x)
+        self.run_frames(60)
+        self.assertEqual([m.frames for m in self.models], first)
+
+    def test_remove_and_move(self):
+        model = self.add(200)
+        self.run_frames(1)
+        self.assertEqual(self.tiers.tiers[model], MID)
+
+        self.level.camera = 200, 0
+        self.run_frames(5)
+        self.assertEqual(self.tiers.tiers[model], NEAR)
+
+        self.tiers.remove(model)
+        self.models.remove(model)
+        self.assertEqual(self.tiers.stats()['near'], 0)
+        self.assertEqual(self.tiers.places, dict())
+
+    def test_dead_models_are_not_called(self):
+        model = self.add(1000)
+        self.run_frames(1)
+        model.alive = False
+        self.run_frames(40)
+        self.assertEqual(model.frames, [0])
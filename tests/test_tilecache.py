@@ -0,0 +1,101 @@
+import os
+import unittest
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+import pyscroll
+from pytmx.util_pygame import load_pygame
+
+from castlebats.tilecache import TileChunkCache
+
+here = os.path.dirname(os.path.abspath(__file__))
+map_path = os.path.join(here, '..', 'resources', 'maps', 'level0.tmx')
+
+map_data = None
+
+
+def setUpModule():
+    global map_data
+    pygame.display.init()
+    pygame.display.set_mode((32, 32))
+    map_data = pyscroll.TiledMapData(load_pygame(map_path))
+
+
+def tearDownModule():
+    pygame.display.quit()
+
+
+# 16 tiles of 16 pixels on a side, with all three tile layers of level0
+chunk_bytes = 256 * 256 * 4
+layers = 3
+
+
+class TestTileChunkCache(unittest.TestCase):
+    def test_chunks_are_rendered_once(self):
+        cache = TileChunkCache(map_data, 16, capacity=10 * chunk_bytes)
+        chunk = cache.get_chunk(0, 0, 0)
+        self.assertEqual(chunk.get_size(), (256, 256))
+        self.assertIs(cache.get_chunk(0, 0, 0), chunk)
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 1))
+
+    def test_empty_chunks_cost_nothing(self):
+        cache = TileChunkCache(map_data, 16, capacity=chunk_bytes)
+        self.assertIsNone(cache.get_chunk(0, 0, 2))
+        self.assertIsNone(cache.get_chunk(0, 0, 3))
+        self.assertEqual(cache.stats()['size'], 0)
+
+        # and are remembered, not rendered again
+        cache.get_chunk(0, 0, 2)
+        self.assertEqual(cache.stats()['hits'], 1)
+
+    def test_capacity_follows_views(self):
+        cache = TileChunkCache(map_data, 16, screens=2)
+        # a view of one chunk can touch two in each direction
+        cache.fit_view('left', (256, 256))
+        one_view = 2 * 2 * 2 * layers * chunk_bytes
+        self.assertEqual(cache.stats()['capacity'], one_view)
+
+        cache.fit_view('right', (256, 256))
+        self.assertEqual(cache.stats()['capacity'], 2 * one_view)
+
+        # a view that changes size replaces what was kept for it
+        cache.fit_view('right', (512, 256))
+        self.assertEqual(cache.stats()['capacity'],
+                         one_view + 3 * 2 * 2 * layers * chunk_bytes)
+
+        cache.forget_view('right')
+        cache.forget_view('unknown')
+        self.assertEqual(cache.stats()['capacity'], one_view)
+
+    def test_forgetting_views_evicts_chunks(self):
+        cache = TileChunkCache(map_data, 16)
+        cache.fit_view('view', (256, 256))
+        for cx in range(4):
+            cache.get_chunk(0, cx, 0)
+        self.assertEqual(cache.stats()['items'], 4)
+
+        cache.forget_view('view')
+        stats = cache.stats()
+        self.assertEqual(stats['evictions'], 3)
+        # the newest chunk is kept, even over capacity
+        self.assertIsNotNone(cache._chunks.get((0, 3, 0)))
+
+    def test_fixed_capacity_ignores_views(self):
+        cache = TileChunkCache(map_data, 16, capacity=chunk_bytes)
+        cache.fit_view('view', (1920, 1080))
+        self.assertEqual(cache.stats()['capacity'], chunk_bytes)
+
+    def test_draw_layer_matches_chunks(self):
+        cache = TileChunkCache(map_data, 16, capacity=10 * chunk_bytes)
+        surface = pygame.Surface((128, 128), pygame.SRCALPHA)
+        surface.fill((0, 0, 0, 0))
+
+        # the view straddles chunks 0 and 1 of the first row
+        cache.draw_layer(surface, 0, pygame.Rect(200, 40, 128, 128),
+                         (-200, -40))
+        for x, y in ((0, 0), (55, 10), (56, 10), (127, 127)):
+            cx, px = divmod(200 + x, 256)
+            expected = cache.get_chunk(0, cx, 0).get_at((px, 40 + y))
+            self.assertEqual(surface.get_at((x, y)), expected)
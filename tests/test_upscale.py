@@ -0,0 +1,63 @@
+import unittest
+
+import pygame
+
+from castlebats.upscale import Upscaler
+
+
+def make_dest(width, height):
+    return pygame.Surface((width, height), 0, 32)
+
+
+class TestUpscaler(unittest.TestCase):
+    def test_source_is_kept_for_same_size(self):
+        scaler = Upscaler(make_dest(64, 48), 2)
+        source = scaler.source
+        self.assertEqual(source.get_size(), (32, 24))
+
+        scaler.set_dest(make_dest(64, 48))
+        self.assertIs(scaler.source, source)
+
+        scaler.set_dest(make_dest(128, 96))
+        self.assertIsNot(scaler.source, source)
+        self.assertEqual(scaler.source.get_size(), (64, 48))
+
+    def test_nearest_neighbor(self):
+        scaler = Upscaler(make_dest(8, 8), 2, smooth=False)
+        scaler.source.fill((0, 0, 0))
+        scaler.source.set_at((1, 2), (255, 0, 0))
+        scaler.scale()
+
+        dest = scaler.dest
+        for x, y in ((2, 4), (3, 4), (2, 5), (3, 5)):
+            self.assertEqual(dest.get_at((x, y))[:3], (255, 0, 0))
+        self.assertEqual(dest.get_at((4, 4))[:3], (0, 0, 0))
+        self.assertEqual(len(scaler.times), 1)
+
+    def test_scale2x_buffers(self):
+        # factor 2 is one pass straight to the display; 8 needs two buffers
+        for factor, buffers in ((2, 0), (4, 1), (8, 2)):
+            scaler = Upscaler(make_dest(16 * factor, 8 * factor), factor,
+                              'scale2x')
+            self.assertEqual(scaler._method, scaler._scale2x)
+            self.assertEqual(len(scaler._intermediates), buffers)
+
+            scaler.source.fill((0, 128, 0))
+            scaler.scale()
+            self.assertEqual(scaler.dest.get_at((0, 0))[:3], (0, 128, 0))
+            self.assertEqual(scaler.dest.get_at((16 * factor - 1, 0))[:3],
+                             (0, 128, 0))
+
+    def test_scale2x_needs_power_of_two(self):
+        scaler = Upscaler(make_dest(48, 48), 3, 'scale2x')
+        self.assertEqual(scaler._method, scaler._scale)
+
+    def test_non_integer_factor(self):
+        smooth = Upscaler(make_dest(100, 60), 1.5)
+        self.assertEqual(smooth._method, smooth._smoothscale)
+        nearest = Upscaler(make_dest(100, 60), 1.5, smooth=False)
+        self.assertEqual(nearest._method, nearest._scale)
+
+    def test_unknown_filter(self):
+        with self.assertRaises(ValueError):
+            Upscaler(make_dest(64, 48), 2, 'hq4x')